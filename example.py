@@ -1,10 +1,11 @@
+import asyncio
 import math
 from dataclasses import dataclass
-from typing import Annotated, NoReturn
+from typing import Annotated, NoReturn, Iterator
 
-from sypy import Server, RunConfig
+from sypy import Server, RunConfig, Cache, Compress
 from sypy.http import HTTPException, HTTPStatus, Headers
-from sypy.parameters import Body, Depends, Header
+from sypy.parameters import Body, Depends, Header, BodyStream
 
 server = Server()
 
@@ -14,6 +15,11 @@ def echo(stuff: Annotated[str, Body]) -> str:
     return stuff
 
 
+@server.post('/upload')
+def upload(stuff: Annotated[BodyStream, Body]) -> str:
+    return f"got {sum(len(chunk) for chunk in stuff)} bytes without holding onto any of them"
+
+
 @server.get('/faulty')
 def faulty_callback() -> None:
     0 / 0
@@ -30,11 +36,38 @@ def circle_area(radius: int = 4) -> float:
     return math.pi * radius*radius
 
 
-@server.get('/is_it')
+@server.get('/circle/{radius:int}', cache=Cache(ttl=300))
+def circle(radius: int) -> str:
+    return f"{circle_area(radius):.2f}"
+
+
+@server.get('/is_it', cache=Cache(ttl=10, size=64))
 def jection(is_it: Annotated[bool, Depends(checker)], area: Annotated[float, Depends(circle_area)]) -> str:
     return f"{"yes, it is actually it" if is_it else "my condolences, it is not"}; btw it is {area:.2f}"
 
 
+async def patience(patience: Annotated[int, Header] = 1) -> int:
+    await asyncio.sleep(0.1)
+    return patience
+
+
+@server.get('/later')
+async def later(waited: Annotated[int, Depends(patience)]) -> str:
+    await asyncio.sleep(waited)
+    return f"waited {waited}s and nobody else had to"
+
+
+@server.get('/squares', cache=Cache(ttl=60), compress=Compress())
+def squares(up_to: int = 1000) -> list:
+    return [{'n': n, 'square': n * n} for n in range(up_to)]
+
+
+@server.get('/count')
+def count(up_to: int = 10) -> Iterator[str]:
+    for i in range(up_to):
+        yield f"{i}\n"
+
+
 LOCATIONS = {
     'google': "https://www.google.com/",
     'youtube': "https://www.youtube.com/",
@@ -93,4 +126,4 @@ def message_send_kinda(message: Annotated[SomeMessage, Body]) -> UhhYeah:
 
 
 if __name__ == '__main__':
-    server.start(RunConfig(3000))
+    server.start(RunConfig(3000, metrics='/metrics'))
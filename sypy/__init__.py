@@ -1,29 +1,43 @@
 from __future__ import annotations
 
-import os
 import queue
+import selectors
 import threading
 import socket
 import logging
+import math
+import os
+import signal
+import time
 from dataclasses import dataclass
 from typing import Callable
 
+from ._config import RunConfig, Engine, Scheduling, JSONBackend, Overload, AccessFormat
 from ._dispatcher.callback import Calls
 from ._packet import Packet, PacketState
 from ._dispatcher import Dispatcher, DispatcherNotAllowed, DispatcherNotFound
-from ._packet import Packet, PacketState, Requester, IP
+from ._packet import Packet, PacketState, Requester, IP, Connection, BUFFER_SIZE
+from ._handling import handle, pipelines, overlaps
+from ._awaiter import Awaiter
+from ._supervisor import Supervisor
+from ._listener import open_listener
+from ._event_loop import EventLoop
+from ._cache import Cache
+from ._compression import Compress
+from ._static import StaticFiles
+from . import _codec
+from . import _metrics
+from . import _access
+from . import _tracing
+from ._tracing import Span, Stage
 from ._utils import autofilling_split
-from .http import HTTPRequest, HTTPResponse, HTTPStatus, HTTPException, Headers, Path, HTTPMethod, InvalidMethod, InvalidPath, EmptyPacket
+from .http import HTTPRequest, HTTPResponse, HTTPStatus, HTTPException, Headers, FileBody, Path, HTTPMethod, InvalidMethod, InvalidPath, EmptyPacket
 from ._logging import logger
 
 
-@dataclass
-class RunConfig:
-    port: int
-    workers: int = os.cpu_count() or 1
-    debug: bool = False
-    listen: bool = False
-    exposing: bool = True
+STEAL_INTERVAL = 0.01
+PAUSE_INTERVAL = 0.01
+LINGER_TIMEOUT = 1.0
 
 
 class _Processor:
@@ -34,18 +48,40 @@ class _Processor:
     incoming_queue: queue.Queue[Packet]
     _processed_queue: queue.Queue[Packet]
 
+    # every counter has a single writer, so they are read without any locking
+    busy: bool = False
+    processed: int = 0
+    sent: int = 0
+    stolen: int = 0
+    peak_depth: int = 0
+    # requests taken off a connection behind the one just handled, without going through the socket thread
+    pipelined: int = 0
+    peers: list[_Processor]
+
+    # async callbacks handed over to the awaiter, and the ones it is done with - that one written by the awaiter's loop
+    submitted: int = 0
+    completed: int = 0
+    _deadline: float = math.inf
+
     _sending_thread: threading.Thread
     _processing_thread: threading.Thread
 
     _run_config: RunConfig
+    _release: Callable[[Connection], None]
+    _execute: Callable[[Packet], None]
+    _awaiter: Awaiter
 
-    def __init__(self, run_config: RunConfig, shut_down: threading.Event, dispatcher: Dispatcher) -> None:
+    def __init__(self, run_config: RunConfig, shut_down: threading.Event, dispatcher: Dispatcher, release: Callable[[Connection], None], execute: Callable[[Packet], None], awaiter: Awaiter, incoming_queue: queue.Queue[Packet] | None = None) -> None:
         self._run_config = run_config
         self._shut_down = shut_down
         self._dispatcher = dispatcher
+        self._release = release
+        self._execute = execute
+        self._awaiter = awaiter
 
-        self.incoming_queue = queue.Queue()
+        self.incoming_queue = incoming_queue if incoming_queue is not None else queue.Queue()
         self._processed_queue = queue.Queue()
+        self.peers = []
 
         self._sending_thread = threading.Thread(target=self._sending_worker)
         self._processing_thread = threading.Thread(target=self._processing_worker)
@@ -55,49 +91,173 @@ class _Processor:
         self._processing_thread.start()
 
     def _sending_worker(self) -> None:
+        global logger
+
         for processed_packet in iter(self._processed_queue.get, None):
-            data = processed_packet.response_body
+            connection = processed_packet.connection
 
-            with processed_packet.connection as conn:
-                conn.sendall(data)
+            # whoever finishes the front one writes out the ones ready behind it too, the rest only leave theirs for them
+            packets = connection.pipeline.finish(processed_packet)
+            while packets:
+                self._send(packets)
 
-            processed_packet.mark(PacketState.Sent)
+                packets = connection.pipeline.written(packets)
 
-    def _processing_worker(self) -> None:
+            self.sent += 1
+
+            if packets is None:
+                # nothing is in flight on it anymore, it is up for its next request
+                if connection.keep_alive and not connection.pipeline.closed:
+                    self._release(connection)
+                else:
+                    connection.close()
+
+    def _send(self, packets: list[Packet]) -> None:
         global logger
 
-        for incoming_packet in iter(self.incoming_queue.get, None):
-            try:
-                try:
-                    request_http = incoming_packet.request_http
-                except (InvalidPath, InvalidMethod) as exc:
-                    logger.warning(f"{incoming_packet} - {exc}")
-                    raise HTTPException(HTTPStatus.BadRequest, str(exc)) from None
-                except EmptyPacket:
-                    raise HTTPException(HTTPStatus.BadRequest, "its empty bro")
+        connection = packets[0].connection
+
+        # whole responses are held back and written together with the ones right behind them, in as few syscalls as it takes
+        held: list[bytes | memoryview] = []
+        holding: list[Packet] = []
+
+        for packet in packets:
+            if connection.pipeline.closed:
+                break  # a response ahead of it already closed the connection
+
+            if (response := packet.response_http) is None:
+                pass
+            elif not response.streaming and not isinstance(response.body, FileBody):
+                for part in packet.response_parts():
+                    held.extend(part)
+
+                holding.append(packet)
+            else:
+                self._send_held(connection, held, holding)
 
                 try:
-                    callback = self._dispatcher.dispatch(request_http.path, request_http.method)
-                except DispatcherNotFound:
-                    raise HTTPException(HTTPStatus.NotFound) from None
-                except DispatcherNotAllowed:
-                    raise HTTPException(HTTPStatus.MethodNotAllowed) from None
-                else:
-                    try:
-                        response_http = callback(request_http, Calls(lambda: incoming_packet.mark(PacketState.Executing), lambda: incoming_packet.mark(PacketState.Executed)))
-                    except Exception as exc:
-                        # ignore HTTPExceptions
-                        if isinstance(exc, HTTPException):
-                            raise exc from exc.__context__
-
-                        raise HTTPException(HTTPStatus.InternalServerError, f"{type(exc).__name__}: {exc}" if self._run_config.exposing else "contact administration pls") from None
-                    else:
-                        incoming_packet.response_http = response_http
-            except HTTPException as http_exc:
-                incoming_packet.response_http = HTTPResponse(http_exc.status_code, http_exc.headers or Headers(), http_exc.body)
-            finally:
+                    # blocking sends, a streamed body is pulled only as fast as the client takes it
+                    for part in packet.response_parts():
+                        connection.send_all(part)
+                except OSError:
+                    connection.pipeline.close()
+                except Exception as exc:
+                    # the head is already out, all that is left is to cut the body short
+                    logger.warning(f"{packet} - response stream broke off: {exc!r}")
+                    connection.pipeline.close()
+
+                packet.mark(PacketState.Sent)
+
+            if packet.closes:
+                self._send_held(connection, held, holding)
+                connection.pipeline.close()
+
+        self._send_held(connection, held, holding)
+
+    @staticmethod
+    def _send_held(connection: Connection, held: list[bytes | memoryview], holding: list[Packet]) -> None:
+        if not holding or connection.pipeline.closed:
+            return
+
+        try:
+            connection.send_all(tuple(held))
+        except OSError:
+            connection.pipeline.close()
+
+        for packet in holding:
+            packet.mark(PacketState.Sent)
+
+        held.clear()
+        holding.clear()
+
+    @property
+    def depth(self) -> int:
+        return self.incoming_queue.qsize() + self.busy
+
+    def _next_packet(self) -> Packet | None:
+        if self._run_config.scheduling != Scheduling.WorkStealing:
+            return self.incoming_queue.get()
+
+        while True:
+            try:
+                return self.incoming_queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            if (packet := self._steal()) is not None:
+                return packet
+
+            try:
+                return self.incoming_queue.get(timeout=STEAL_INTERVAL)
+            except queue.Empty:
+                pass
+
+    def _steal(self) -> Packet | None:
+        # only from the ones stuck with something, idle ones will get to their packets soon enough themselves
+        for peer in sorted(self.peers, key=lambda p: p.incoming_queue.qsize(), reverse=True):
+            if not peer.busy or peer.incoming_queue.empty():
+                continue
+
+            try:
+                packet = peer.incoming_queue.get_nowait()
+            except queue.Empty:
+                continue
+
+            if packet is None:
+                # that's the peer being told to stop, not something to take over
+                peer.incoming_queue.put(None)
+                continue
+
+            self.stolen += 1
+            return packet
+
+        return None
+
+    def _processing_worker(self) -> None:
+        for incoming_packet in iter(self._next_packet, None):
+            self.busy = True
+
+            pending = handle(incoming_packet, self._dispatcher, self._run_config)
+            connection = incoming_packet.connection
+
+            # the request was read to its end, a safe one the client sent right behind it can be worked on in the meantime
+            if not self._shut_down.is_set() and pipelines(incoming_packet, self._run_config) and overlaps(connection):
+                (next_packet := Packet(connection, _req_body=connection.next_request())).mark(PacketState.Receiving)
+                connection.pipeline.push(next_packet)
+
+                self.pipelined += 1
+                self._execute(next_packet)
+
+            if pending is not None:
+                # async callbacks finish on the awaiter's loop, this thread moves on to the next packet
+                self.submitted += 1
+                self._awaiter.submit(pending, lambda packet=incoming_packet: self._done_awaiting(packet))
+            else:
                 self._processed_queue.put(incoming_packet)
 
+            self.processed += 1
+            self.busy = False
+
+        # the sending thread is told to stop only once whatever is still being awaited got to it
+        while self.completed < self.submitted and time.monotonic() < self._deadline:
+            time.sleep(STEAL_INTERVAL)
+
+        self._processed_queue.put(None)
+
+    def _done_awaiting(self, packet: Packet) -> None:
+        self._processed_queue.put(packet)
+        self.completed += 1
+
+    def stop(self, deadline: float) -> None:
+        self._deadline = deadline
+        self.incoming_queue.put(None)
+
+    def join(self, deadline: float) -> bool:
+        for thread in (self._processing_thread, self._sending_thread):
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+        return not self._processing_thread.is_alive() and not self._sending_thread.is_alive()
+
 
 class _Executor:
     _run_config: RunConfig
@@ -108,18 +268,56 @@ class _Executor:
     _processors: list[_Processor]
     _last_worked_worker: int
 
-    def __init__(self, run_config: RunConfig, shut_down: threading.Event, dispatcher: Dispatcher) -> None:
+    def __init__(self, run_config: RunConfig, shut_down: threading.Event, dispatcher: Dispatcher, release: Callable[[Connection], None], awaiter: Awaiter) -> None:
         self._shut_down = shut_down
         self._dispatcher = dispatcher
         self._run_config = run_config
 
         self._last_worked_worker = 0
 
-        self._processors = [_Processor(self._run_config, self._shut_down, self._dispatcher) for _ in range(self._run_config.workers)]
+        shared_queue = queue.Queue() if self._run_config.scheduling == Scheduling.Shared else None
+        self._processors = [_Processor(self._run_config, self._shut_down, self._dispatcher, release, self.execute, awaiter, shared_queue) for _ in range(self._run_config.workers)]
+
+        for processor in self._processors:
+            processor.peers = [peer for peer in self._processors if peer is not processor]
+
+    @property
+    def processors(self) -> list[_Processor]:
+        return self._processors
+
+    def stop(self, deadline: float) -> None:
+        # everything queued before the stops still gets processed, sharing a queue or not
+        for processor in self._processors:
+            processor.stop(deadline)
+
+    def join(self, deadline: float) -> bool:
+        return all([processor.join(deadline) for processor in self._processors])
+
+    @property
+    def depths(self) -> list[int]:
+        return [processor.depth for processor in self._processors]
+
+    @property
+    def sent(self) -> int:
+        return sum(processor.sent for processor in self._processors)
+
+    @property
+    def pipelined(self) -> int:
+        return sum(processor.pipelined for processor in self._processors)
 
     def execute(self, packet: Packet):
-        self._processors[self._last_worked_worker].incoming_queue.put(packet)
-        self._last_worked_worker = (self._last_worked_worker + 1) % self._run_config.workers
+        # called from the queue thread, and from the processors for pipelined requests - a race on the round robin only skews it a little
+        match self._run_config.scheduling:
+            case Scheduling.RoundRobin | Scheduling.WorkStealing:
+                processor = self._processors[self._last_worked_worker]
+                self._last_worked_worker = (self._last_worked_worker + 1) % self._run_config.workers
+            case Scheduling.Shared:
+                processor = self._processors[0]  # they all pull from the same queue anyway
+            case Scheduling.LeastLoaded:
+                processor = min(self._processors, key=lambda p: p.depth)
+
+        processor.incoming_queue.put(packet)
+        processor.peak_depth = max(processor.peak_depth, processor.depth)
 
 
 class _Socket:
@@ -131,43 +329,345 @@ class _Socket:
     _socket: socket.socket
     _socket_thread: threading.Thread
 
+    # nothing in the pipeline is bounded by its queues, it is bounded by admitting only so many requests at once
     _packet_queue: queue.Queue[Packet]
     _queue_thread: threading.Thread
 
-    def __init__(self, _run_config: RunConfig, shut_down: threading.Event, executor: _Executor) -> None:
+    _selector: selectors.BaseSelector
+    _idle: dict[Connection, float]
+    _released: queue.SimpleQueue[Connection]
+    _waker: tuple[socket.socket, socket.socket]
+
+    # shed connections, half-closed and read away until the client closes its side too
+    _lingering: dict[socket.socket, float]
+    _unavailable: bytes
+
+    # every counter is only written by the socket thread
+    admitted: int = 0
+    shed: int = 0
+    pauses: int = 0
+    _paused: bool = False
+    _overloaded: bool = False
+
+    _deadline: float = math.inf
+
+    def __init__(self, _run_config: RunConfig, shut_down: threading.Event, listener: socket.socket) -> None:
         self._run_config = _run_config
         self._shut_down = shut_down
-        self._executor = executor
 
-        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket = listener
         self._packet_queue = queue.Queue()
 
+        self._selector = selectors.DefaultSelector()
+        self._idle = {}
+        self._released = queue.SimpleQueue()
+        self._waker = socket.socketpair()
+        self._waker[1].setblocking(False)
+
+        self._lingering = {}
+        self._unavailable = HTTPResponse(HTTPStatus.ServiceUnavailable, Headers({'retry-after': str(self._run_config.retry_after), 'connection': 'close'}), b"too busy, come back later").to_bytes()
+
         self._socket_thread = threading.Thread(target=self._socket_worker)
         self._queue_thread = threading.Thread(target=self._queue_worker)
 
-    def start_the_machine(self):
+    def start_the_machine(self, executor: _Executor):
+        self._executor = executor
+
         self._socket_thread.start()
         self._queue_thread.start()
 
+    def release(self, connection: Connection) -> None:
+        if self._shut_down.is_set():
+            connection.close()  # no more requests are taken, not even on open connections
+            return
+
+        # called from the sending threads, the selector itself is only ever touched by the socket thread
+        self._released.put(connection)
+        self._wake()
+
+    def _wake(self) -> None:
+        try:
+            self._waker[1].send(b'\0')
+        except BlockingIOError:
+            pass  # it is already woken up enough
+        except OSError:
+            pass  # the socket thread is already gone
+
+    def stop(self, deadline: float) -> None:
+        """stops accepting, whatever was admitted already still gets processed and sent until the deadline"""
+
+        self._deadline = deadline
+        self._shut_down.set()
+        self._wake()
+
+    def join(self, deadline: float) -> bool:
+        self._socket_thread.join(max(0.0, deadline - time.monotonic()))
+        self._queue_thread.join(max(0.0, deadline - time.monotonic()))
+
+        done = not self._queue_thread.is_alive() and self._executor.join(deadline)
+
+        # released after the socket thread was done with them all
+        self._close_released()
+
+        return done
+
+    @property
+    def is_working(self) -> bool:
+        return self._socket_thread.is_alive() and not self._shut_down.is_set()
+
     def _socket_worker(self) -> None:
         global logger
 
-        host = ('0.0.0.0' if self._run_config.listen else '127.0.0.1', self._run_config.port)
+        # the listener is the server's, it outlives a generation of workers on a reload
+        s = self._socket
+
+        logger.info(f"launching socket worker on {':'.join(map(str, s.getsockname()))}")
+        self._selector.register(s, selectors.EVENT_READ)
+        self._selector.register(self._waker[0], selectors.EVENT_READ)
+
+        while not self._shut_down.is_set():
+            if self._paused and self._has_room():
+                self._paused = False
+                self._selector.register(s, selectors.EVENT_READ)
+
+            for key, _ in self._selector.select(self._idle_timeout()):
+                if key.fileobj is s:
+                    self._accept(s)
+                elif key.fileobj is self._waker[0]:
+                    self._wake_up()
+                elif key.fileobj in self._lingering:
+                    self._linger(key.fileobj)
+                else:
+                    self._resume(key.data)
+
+            self._expire_idle()
+
+        self._wind_down()
+
+    def _wind_down(self) -> None:
+        if not self._paused:
+            self._selector.unregister(self._socket)
+
+        # one last look, so requests already sent on connections still counted as idle make it in
+        for key, _ in self._selector.select(0):
+            if key.fileobj is self._waker[0]:
+                self._wake_up()
+            elif key.fileobj in self._lingering:
+                self._linger(key.fileobj)
+            else:
+                self._resume(key.data)
+
+        # idle connections have nothing in flight, they are closed right away
+        for connection in self._idle:
+            connection.close()
+        for conn in self._lingering:
+            conn.close()
+
+        self._close_released()
+
+        self._idle.clear()
+        self._lingering.clear()
+        self._selector.close()
+        self._waker[0].close()
+
+        # after everything already admitted, so all of it makes it to the processors before they are told to stop
+        self._packet_queue.put(None)
+
+    def _close_released(self) -> None:
+        while True:
+            try:
+                self._released.get_nowait().close()
+            except queue.Empty:
+                break
+
+    @property
+    def in_flight(self) -> int:
+        return self.admitted + self._executor.pipelined - self._executor.sent
+
+    def _has_room(self) -> bool:
+        return self.in_flight < self._run_config.queue_limit * self._run_config.workers
+
+    def _accept(self, s: socket.socket) -> None:
+        global logger
+
+        if self._run_config.overload == Overload.Pause and not self._has_room():
+            # the backlog holds whoever comes next, the connections already open carry on as usual
+            self._paused = True
+            self.pauses += 1
+            self._selector.unregister(s)
+            logger.warning(f"overloaded, not accepting for now - {self.in_flight} requests in flight")
+            return
+
+        try:
+            conn, addr = s.accept()
+        except BlockingIOError:
+            return
+
+        # reads are bounded by the idle timeout as well, so a silent client can't hold a processor forever
+        conn.settimeout(self._run_config.keep_alive_timeout)
+        # pipelined responses go out back to back, they shouldn't wait on the ack of the one before them
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        connection = Connection(conn, Requester(IP(tuple(map(int, addr[0].split('.')))), addr[1]), buffer_size=self._run_config.buffer_size, head_limit=self._run_config.head_limit, max_body_size=self._run_config.max_body_size)
+        self._admit(connection)
+
+    def _admit(self, connection: Connection) -> None:
+        global logger
+
+        if self._run_config.overload == Overload.Reject and not self._has_room():
+            if not self._overloaded:
+                self._overloaded = True
+                logger.warning(f"overloaded, shedding requests - {self.in_flight} in flight")
+
+            self._shed(connection)
+            return
+
+        if self._overloaded:
+            self._overloaded = False
+            logger.info(f"caught up, {self.shed} requests shed so far")
+
+        self.admitted += 1
+        (p := Packet(connection)).mark(PacketState.Receiving)
+        connection.pipeline.push(p)
+        self._packet_queue.put(p)
+
+    def _shed(self, connection: Connection) -> None:
+        self.shed += 1
+        conn = connection.socket
+
+        try:
+            conn.setblocking(False)
+            conn.send(self._unavailable)
+            conn.shutdown(socket.SHUT_WR)
+        except OSError:
+            connection.close()
+            return
+
+        # closing right away with the request still unread would reset the connection, 503 and all
+        self._lingering[conn] = time.monotonic() + LINGER_TIMEOUT
+        self._selector.register(conn, selectors.EVENT_READ)
+
+    def _linger(self, conn: socket.socket) -> None:
+        try:
+            if conn.recv(BUFFER_SIZE):
+                return
+        except OSError:
+            pass
+
+        self._selector.unregister(conn)
+        del self._lingering[conn]
+        conn.close()
+
+    def _wake_up(self) -> None:
+        self._waker[0].recv(BUFFER_SIZE)
+
+        deadline = time.monotonic() + self._run_config.keep_alive_timeout
+        while True:
+            try:
+                connection = self._released.get_nowait()
+            except queue.Empty:
+                break
+
+            if connection.pending:
+                # the next request came along with the last one, no point waiting for the selector
+                self._admit(connection)
+                continue
+
+            self._idle[connection] = deadline
+            self._selector.register(connection, selectors.EVENT_READ, connection)
+
+    def _resume(self, connection: Connection) -> None:
+        self._selector.unregister(connection)
+        del self._idle[connection]
+
+        try:
+            alive = connection.socket.recv(1, socket.MSG_PEEK) != b''
+        except OSError:
+            alive = False
 
-        logger.info(f"launching socket worker on {':'.join(map(str, host))}")
-        with self._socket as s:
-            s.bind(host)
-            s.listen(True)
+        if not alive:
+            connection.close()
+            return
 
-            while not self._shut_down.is_set():
-                conn, addr = s.accept()
-                (p := Packet(Requester(IP(tuple(map(int, addr[0].split('.')))), addr[1]), conn)).mark(PacketState.Receiving)
-                self._packet_queue.put(p)
+        self._admit(connection)
+
+    def _idle_timeout(self) -> float | None:
+        timeout = None
+
+        # both are in deadline order, only the front of each matters
+        for waiting in (self._idle, self._lingering):
+            for deadline in waiting.values():
+                timeout = min(timeout if timeout is not None else deadline, deadline)
+                break
+
+        if timeout is not None:
+            timeout = max(0.0, timeout - time.monotonic())
+
+        if self._paused:
+            # nothing wakes this thread up once there is room again, it has to look for itself
+            return PAUSE_INTERVAL if timeout is None else min(timeout, PAUSE_INTERVAL)
+
+        return timeout
+
+    def _expire_idle(self) -> None:
+        now = time.monotonic()
+
+        # connections are idling in the order they were released, so the oldest are at the front
+        while self._idle:
+            connection, deadline = next(iter(self._idle.items()))
+
+            if deadline > now:
+                break
+
+            self._selector.unregister(connection)
+            del self._idle[connection]
+            connection.close()
+
+        while self._lingering:
+            conn, deadline = next(iter(self._lingering.items()))
+
+            if deadline > now:
+                break
+
+            self._selector.unregister(conn)
+            del self._lingering[conn]
+            conn.close()
 
     def _queue_worker(self) -> None:
         for packet in iter(self._packet_queue.get, None):
             self._executor.execute(packet)
 
+        self._executor.stop(self._deadline)
+
+
+@dataclass(eq=False)
+class _Generation:
+    """one set of engine threads serving off the listener, a reload starts a new one before draining the old one"""
+
+    shut_down: threading.Event
+    awaiter: Awaiter
+
+    socket: _Socket | None = None
+    executor: _Executor | None = None
+    event_loop: EventLoop | None = None
+
+    @property
+    def is_working(self) -> bool:
+        return self.socket.is_working if self.socket is not None else self.event_loop.is_working
+
+    def drain(self, deadline: float) -> bool:
+        """stops accepting and lets whatever is in flight finish, until the deadline at most"""
+
+        if self.socket is not None:
+            self.socket.stop(deadline)
+            done = self.socket.join(deadline)
+        else:
+            self.event_loop.stop(deadline)
+            done = self.event_loop.join(deadline)
+
+        self.awaiter.stop(deadline)
+        return done
+
 
 class Server:
     dispatcher: Dispatcher
@@ -175,8 +675,9 @@ class Server:
     _run_config: RunConfig
     _shut_down: threading.Event
 
-    _socket: _Socket | None = None
-    _executor: _Executor | None = None
+    _listener: socket.socket | None = None
+    _generation: _Generation | None = None
+    _supervisor: Supervisor | None = None
 
     def __init__(self) -> None:
         self._shut_down = threading.Event()
@@ -184,7 +685,10 @@ class Server:
 
     @property
     def is_working(self) -> bool:
-        raise NotImplementedError("idfk")
+        if self._supervisor is not None and self._supervisor.supervising:
+            return self._supervisor.is_working
+
+        return self._generation is not None and self._generation.is_working
 
     def start(self, run_config: RunConfig) -> None:
         global logger
@@ -192,24 +696,162 @@ class Server:
         self._run_config = run_config
 
         logger.setLevel(logging.DEBUG if self._run_config.debug else logging.INFO)
+        _codec.use(self._run_config.json_backend)
+
+        if self._run_config.metrics is not None:
+            _metrics.enabled = True
+            self.dispatcher.register_callback(self._run_config.metrics, HTTPMethod.GET, self._scrape, raw=True)
+
+        if self._run_config.processes > 1:
+            self._supervisor = Supervisor(self._run_config, self._shut_down, self._serve, self._stop_serving)
+            self._supervisor.run()
+        else:
+            self._serve(open_listener(self._run_config))
+
+            # only the main thread can have signal handlers, it would be whoever started the server otherwise
+            if threading.current_thread() is threading.main_thread():
+                signal.signal(signal.SIGTERM, lambda *_: self.stop())
+                signal.signal(signal.SIGINT, self._interrupted)
+                if hasattr(signal, 'SIGHUP'):
+                    signal.signal(signal.SIGHUP, lambda *_: self.reload())
+
+    def _serve(self, listener: socket.socket) -> None:
+        self.dispatcher.compile()
+
+        self._listener = listener
+
+        # threads don't survive a fork, so every worker process starts its own writers
+        if self._run_config.access_log is not None and _access.writer is None:
+            _access.open_writer(self._run_config)
+        if self._run_config.profile is not None and _tracing.profiler is None:
+            _tracing.open_profiler(self._run_config)
+
+        # the threaded engine's workers block on callbacks themselves, it never offloads a thing
+        generation = _Generation(threading.Event(), Awaiter(self._run_config.offload_workers if self._run_config.engine == Engine.EventLoop else 0))
+        generation.awaiter.start()
+
+        match self._run_config.engine:
+            case Engine.Threaded:
+                generation.socket = _Socket(self._run_config, generation.shut_down, listener)
+                generation.executor = _Executor(self._run_config, generation.shut_down, self.dispatcher, generation.socket.release, generation.awaiter)
+
+                generation.socket.start_the_machine(generation.executor)
+            case Engine.EventLoop:
+                generation.event_loop = EventLoop(self._run_config, generation.shut_down, self.dispatcher, listener, generation.awaiter)
+                generation.event_loop.start()
+
+        self._generation = generation
+
+    def stop(self, timeout: float | None = None) -> None:
+        """stops accepting, waits up to the timeout for the requests in flight, then lets go of the port"""
+
+        timeout = timeout if timeout is not None else self._run_config.stop_timeout
+
+        if self._supervisor is not None and self._supervisor.supervising:
+            self._supervisor.stop(timeout)
+        else:
+            self._stop_serving(timeout)
+
+    def reload(self, timeout: float | None = None) -> None:
+        """starts a new generation of workers on the same listener, and drains the old one in the meantime"""
+
+        global logger
+
+        timeout = timeout if timeout is not None else self._run_config.stop_timeout
+
+        if self._supervisor is not None and self._supervisor.supervising:
+            self._supervisor.reload(timeout)
+            return
+
+        if self._generation is None or self._shut_down.is_set():
+            return
+
+        old = self._generation
+        self._serve(self._listener)
 
-        self._executor = _Executor(self._run_config, self._shut_down, self.dispatcher)
+        logger.info("reloaded, draining the previous workers")
+        if not old.drain(time.monotonic() + timeout):
+            logger.warning(f"the previous workers didn't finish within {timeout}s, left to finish on their own")
 
-        self._socket = _Socket(self._run_config, self._shut_down, self._executor)
-        self._socket.start_the_machine()
+    def _interrupted(self, *_) -> None:
+        if self._shut_down.is_set():
+            raise KeyboardInterrupt  # the second ctrl+c doesn't wait for anything
 
-    def stop(self) -> None:
-        raise NotImplementedError("you cant stop it")
+        self.stop()
+
+    def _stop_serving(self, timeout: float) -> None:
+        global logger
+
+        if self._shut_down.is_set():
+            return
+
+        self._shut_down.set()
+
+        if self._generation is not None and not self._generation.drain(time.monotonic() + timeout):
+            logger.warning(f"requests in flight didn't finish within {timeout}s, left to finish on their own")
+
+        if self._listener is not None:
+            self._listener.close()
+
+        if _access.writer is not None:
+            _access.writer.close()
+        _tracing.close_profiler()
+
+        logger.info("stopped")
+
+    def _scrape(self) -> HTTPResponse:
+        gauges: list[tuple[str, str, str, list[_metrics.Sample]]] = []
+
+        generation = self._generation
+
+        if generation is not None and generation.executor is not None:
+            processors = generation.executor.processors
+
+            gauges += [
+                ('sypy_in_flight', 'gauge', "requests admitted and not yet sent", [({}, generation.socket.in_flight)]),
+                ('sypy_queue_depth', 'gauge', "requests waiting for or being processed by each worker", [({'worker': str(i)}, processor.depth) for i, processor in enumerate(processors)]),
+                ('sypy_queue_peak_depth', 'gauge', "the deepest each worker's queue ever got", [({'worker': str(i)}, processor.peak_depth) for i, processor in enumerate(processors)]),
+                ('sypy_stolen_total', 'counter', "requests each worker took off the others' queues", [({'worker': str(i)}, processor.stolen) for i, processor in enumerate(processors)]),
+                ('sypy_shed_total', 'counter', "requests answered with 503 for being over the queue limit", [({}, generation.socket.shed)]),
+                ('sypy_accept_pauses_total', 'counter', "times accepting was paused for being over the queue limit", [({}, generation.socket.pauses)]),
+            ]
+        elif generation is not None:
+            gauges.append(('sypy_in_flight', 'gauge', "requests waiting on an async callback or a streamed body", [({}, generation.event_loop.in_flight)]))
+
+        return HTTPResponse(HTTPStatus.OK, Headers({'content-type': 'text/plain; version=0.0.4; charset=utf-8'}), _metrics.render(gauges).encode('utf-8'))
+
+    def tracer(self, hook: _tracing.Hook) -> _tracing.Hook:
+        """calls the hook with each request's spans once its response is out, on whichever thread sent it - keep it quick
+
+        every stage is timed from then on, nothing past the usual few is until there is a hook"""
+
+        _tracing.add_hook(hook)
+
+        return hook
+
+    def static(self, prefix: str, directory: str | os.PathLike, compress: Compress | None = None) -> None:
+        """serves the files under the directory at the prefix, straight from the disk with sendfile, with ranges and conditional requests
+
+        only the small files kept in memory get compressed, the rest always goes out as it is on the disk"""
+
+        files = StaticFiles(directory)
+        path = f"{prefix.removesuffix('/')}/{{path:path}}"
+
+        self.dispatcher.register_callback(path, HTTPMethod.GET, files.callback(head=False), raw=True, compress=compress)
+        self.dispatcher.register_callback(path, HTTPMethod.HEAD, files.callback(head=True), raw=True)
 
     @staticmethod
     def _callback_register(method: HTTPMethod) -> Callable[[str], Callable[[Callable], Callable]]:
-        def decorator(self, path: str) -> Callable[[Callable], Callable]:
+        def decorator(self, path: str, cache: Cache | None = None, compress: Compress | None = None) -> Callable[[Callable], Callable]:
             nonlocal method
 
+            if cache is not None and method not in (HTTPMethod.GET, HTTPMethod.HEAD):
+                raise TypeError(f"only GET and HEAD responses can be cached, not {method}")
+
             def register(callback: Callable) -> Callable:
                 nonlocal path, self, method
 
-                self.dispatcher.register_callback(Path(path), method, callback)
+                self.dispatcher.register_callback(path, method, callback, cache, compress=compress)
 
                 return callback
 
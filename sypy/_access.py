@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import atexit
+import collections
+import json
+import random
+import sys
+import threading
+import time
+from typing import BinaryIO, Callable, TYPE_CHECKING
+
+from ._config import RunConfig, AccessFormat
+
+if TYPE_CHECKING:
+    from ._packet import Packet, Requester
+    from .http import HTTPMethod, HTTPStatus, Path
+
+
+BATCH_SIZE = 512
+FLUSH_INTERVAL = 0.5
+
+# the writer's, once it is started in this process
+writer: AccessWriter | None = None
+
+
+# everything about a request worth a line, gathered without formatting a thing
+type AccessRecord = tuple[float, Requester, HTTPMethod | None, Path | None, HTTPStatus, float, float | None]
+
+
+def _text(record: AccessRecord) -> str:
+    at, requester, method, path, status, took, handled = record
+
+    return (f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(at))},{int(at % 1 * 1000):03d} "
+            f"{requester} - {method or 'N/A'} {path or 'N/A'} - {status} - "
+            f"{took * 1000:.2f}ms ({f'{handled * 1000:.2f}ms' if handled is not None else 'N/A'})\n")
+
+
+def _json(record: AccessRecord) -> str:
+    at, requester, method, path, status, took, handled = record
+
+    return json.dumps({
+        'time': at,
+        'ip': str(requester.ip),
+        'port': requester.port,
+        'method': method,
+        'path': str(path) if path is not None else None,
+        'status': status.value,
+        'took': took,
+        'handled': handled,
+    }) + '\n'
+
+
+_FORMATS = {
+    AccessFormat.Text: _text,
+    AccessFormat.JSON: _json,
+}
+
+
+class AccessWriter:
+    """keeps access records in memory, a background thread formats and writes them out in batches"""
+
+    _file: BinaryIO
+    _owns_file: bool
+    _format: Callable[[AccessRecord], str]
+    _sample: float
+
+    # appending and popping from either end are atomic, the request threads never take a lock for it
+    _records: collections.deque[AccessRecord]
+    _wake_up: threading.Event
+    _closed: bool
+
+    _thread: threading.Thread
+
+    def __init__(self, run_config: RunConfig) -> None:
+        if run_config.access_log == '-':
+            self._file, self._owns_file = sys.stdout.buffer, False
+        else:
+            # unbuffered, each batch is a single append no matter how many processes share the file
+            self._file, self._owns_file = open(run_config.access_log, 'ab', buffering=0), True
+
+        self._format = _FORMATS[run_config.access_log_format]
+        self._sample = run_config.access_log_sample
+
+        self._records = collections.deque()
+        self._wake_up = threading.Event()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._write, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, packet: Packet) -> None:
+        if self._sample < 1.0 and random.random() >= self._sample:
+            return
+
+        stats, request = packet.stats, packet.parsed and packet.request_http
+        self._records.append((
+            time.time(),
+            packet.requester,
+            request.method if request else None,
+            request.path if request else None,
+            packet.response_http.status,
+            stats.sent - stats.receiving,
+            stats.executed - stats.executing if stats.executed is not None else None,
+        ))
+
+        if len(self._records) >= BATCH_SIZE:
+            self._wake_up.set()
+
+    def _write(self) -> None:
+        while not self._closed:
+            self._wake_up.wait(FLUSH_INTERVAL)
+            self._wake_up.clear()
+            self._flush()
+
+    def _flush(self) -> None:
+        lines = []
+
+        try:
+            while True:
+                lines.append(self._format(self._records.popleft()))
+        except IndexError:
+            pass
+
+        if lines:
+            self._file.write(''.join(lines).encode('utf-8'))
+            self._file.flush()
+
+    def close(self) -> None:
+        """writes out whatever is left, the writer can't be started again after this"""
+
+        if self._closed:
+            return
+
+        self._closed = True
+        self._wake_up.set()
+        self._thread.join()
+
+        self._flush()
+
+        if self._owns_file:
+            self._file.close()
+
+
+def open_writer(run_config: RunConfig) -> None:
+    global writer
+
+    writer = AccessWriter(run_config)
+    writer.start()
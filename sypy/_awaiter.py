@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import time
+from typing import Callable, Coroutine, Any
+
+from ._logging import logger
+
+
+class Awaiter:
+    """runs async callbacks on a dedicated asyncio loop, so slow ones overlap instead of each holding a worker"""
+
+    _loop: asyncio.AbstractEventLoop
+    _loop_thread: threading.Thread
+
+    # asyncio's own executor can't start its threads once the main thread is done, these are started up front
+    _offloaded: queue.SimpleQueue[tuple[Callable[[], Coroutine[Any, Any, None] | None], Callable[[], None]]]
+    _offload_threads: list[threading.Thread]
+
+    def __init__(self, offload_workers: int = 0) -> None:
+        """none to offload to by default, only the event-loop engine has anything to offload"""
+
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever)
+
+        self._offloaded = queue.SimpleQueue()
+        self._offload_threads = [threading.Thread(target=self._offload_worker) for _ in range(offload_workers)]
+
+    def start(self) -> None:
+        self._loop_thread.start()
+
+        for offload_thread in self._offload_threads:
+            offload_thread.start()
+
+    def stop(self, deadline: float) -> None:
+        """whatever is still left running on the loop by the deadline is cut off"""
+
+        for _ in self._offload_threads:
+            self._offloaded.put(None)
+        for offload_thread in self._offload_threads:
+            offload_thread.join(max(0.0, deadline - time.monotonic()))
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join(max(0.0, deadline - time.monotonic()))
+
+        if not self._loop_thread.is_alive():
+            self._loop.close()
+
+    def submit(self, coroutine: Coroutine[Any, Any, None], done: Callable[[], None]) -> None:
+        asyncio.run_coroutine_threadsafe(coroutine, self._loop).add_done_callback(lambda _: done())
+
+    def offload(self, function: Callable[[], Coroutine[Any, Any, None] | None], done: Callable[[], None]) -> None:
+        """runs a blocking function on one of the offload threads, and the coroutine it might give back on the loop"""
+
+        self._offloaded.put((function, done))
+
+    def _offload_worker(self) -> None:
+        global logger
+
+        for function, done in iter(self._offloaded.get, None):
+            pending = None
+
+            try:
+                pending = function()
+            except Exception:
+                logger.exception("offloaded work failed")
+            finally:
+                if pending is not None:
+                    self.submit(pending, done)
+                else:
+                    done()
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import re
+from typing import Iterator, TYPE_CHECKING
+
+from .http import ContentTooLarge, MalformedChunk, IncompleteBody
+
+if TYPE_CHECKING:
+    from ._packet import Connection
+
+
+CHUNK_SIZE = 64 * 1024
+CHUNK_LINE_LIMIT = 4096
+
+# rfc 9112 section 7.1, hex digits and nothing else - int() would take a sign, 0x, underscores and whitespace too,
+# and a proxy in front reading those differently is how requests get smuggled
+_CHUNK_SIZE = re.compile(rb'[0-9A-Fa-f]{1,16}')
+
+
+class BodyStream:
+    """the request body read off the connection only as the callback asks for it, it can be read through once"""
+
+    _ready: memoryview
+    _connection: Connection | None
+    _limit: int
+
+    _chunked: bool
+    _done: bool
+
+    # bytes to go of the whole body, or of the current chunk if it is chunked
+    _left: int
+    _received: int
+
+    def __init__(self, ready: bytes | memoryview, connection: Connection | None, limit: int) -> None:
+        self._ready = memoryview(ready)
+        self._connection = connection
+        self._limit = limit
+
+        # no connection means the whole body is already in ready
+        self._chunked = connection is not None and connection.unread is None
+        self._done = connection is None
+        self._left = (connection.unread or 0) if connection is not None else 0
+        self._received = len(self._ready)
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            return b''.join(iter(lambda: self.read(CHUNK_SIZE), b''))
+
+        if self._ready:
+            data, self._ready = bytes(self._ready[:size]), self._ready[size:]
+            return data
+
+        if not self._left and not self._next_chunk():
+            return b''
+
+        if not (data := self._connection.read(min(size, self._left))):
+            raise IncompleteBody()
+
+        self._left -= len(data)
+
+        if not self._chunked:
+            self._connection.unread = self._left
+        elif not self._left and (line := self._connection.read_line(CHUNK_LINE_LIMIT)):
+            raise MalformedChunk(line.decode('latin-1'))  # there must be nothing between the data and its crlf
+
+        return data
+
+    def _next_chunk(self) -> bool:
+        if not self._chunked or self._done:
+            return False
+
+        line = self._connection.read_line(CHUNK_LINE_LIMIT)
+
+        # extensions after ';' are allowed and meaningless to us, only they may have whitespace before them
+        size_raw, extended, _ = line.partition(b';')
+        if extended:
+            size_raw = size_raw.rstrip(b' \t')
+
+        if _CHUNK_SIZE.fullmatch(size_raw) is None:
+            raise MalformedChunk(line.decode('latin-1'))
+
+        size = int(size_raw, 16)
+
+        if not size:
+            # trailers are of no interest either, skip to the empty line
+            while self._connection.read_line(CHUNK_LINE_LIMIT):
+                pass
+
+            self._done = True
+            self._connection.unread = 0
+            return False
+
+        self._received += size
+
+        if self._received > self._limit:
+            raise ContentTooLarge(self._limit)  # before the chunk itself is read
+
+        self._left = size
+        return True
+
+    def __iter__(self) -> Iterator[bytes]:
+        while data := self.read(CHUNK_SIZE):
+            yield data
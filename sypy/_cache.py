@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import collections
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, TYPE_CHECKING
+
+from .http import HTTPRequest, HTTPResponse, HTTPStatus, Headers, FileBody
+
+if TYPE_CHECKING:
+    from ._dispatcher.callback import Callback
+
+
+# what may be reused without the origin saying so explicitly, rfc 9110 section 15.1
+_CACHEABLE = {
+    HTTPStatus.OK, HTTPStatus.NonAuthoritativeInformation, HTTPStatus.NoContent, HTTPStatus.MultipleChoices,
+    HTTPStatus.MovedPermanently, HTTPStatus.PermanentRedirect, HTTPStatus.NotFound, HTTPStatus.MethodNotAllowed,
+    HTTPStatus.Gone, HTTPStatus.URITooLong, HTTPStatus.NotImplemented,
+}
+
+# decided per response by the engine, never stored
+_UNCACHED_HEADERS = {'connection', 'content-length', 'transfer-encoding'}
+
+
+@dataclass(frozen=True)
+class Cache:
+    """opts a GET/HEAD route into caching its responses for ttl seconds, at most size of them at once
+
+    they are told apart by path, the query and header params the callback and its dependencies declare, and the vary headers"""
+
+    ttl: float = 60.0
+    size: int = 1024
+    vary: tuple[str, ...] = ()
+
+
+type CacheKey = tuple[Any, ...]
+
+
+@dataclass(eq=False)
+class _Entry:
+    status: HTTPStatus
+    headers: Headers
+    body: bytes
+    etag: str
+    expires: float
+
+
+def _declared(callback: Callback, query: set[str], headers: set[str]) -> None:
+    query.update(name for _, name, *_ in callback.query_params)
+    headers.update(Headers._process_index(name) for _, name, *_ in callback.header_params)
+
+    for _, dependency, *_ in callback.dependent_params:
+        _declared(dependency, query, headers)
+
+
+def _matches(etag: str, if_none_match: str) -> bool:
+    if if_none_match == etag:
+        return True  # what browsers send back nearly every time
+
+    # weak comparison, the W/ prefix makes no difference for If-None-Match
+    return any(tag == '*' or tag.removeprefix('W/') == etag for tag in map(str.strip, if_none_match.split(',')))
+
+
+class ResponseCache:
+    config: Cache
+
+    _query: tuple[str, ...]
+    _headers: tuple[str, ...]
+    _vary: str | None
+
+    _entries: collections.OrderedDict[CacheKey, _Entry]
+    _lock: threading.Lock
+
+    def __init__(self, config: Cache, callback: Callback) -> None:
+        self.config = config
+
+        query, headers = set(), {Headers._process_index(name) for name in config.vary}
+        _declared(callback, query, headers)
+
+        self._query = tuple(sorted(query))
+        self._headers = tuple(sorted(headers))
+        self._vary = ', '.join(map(Headers._prepare_index, self._headers)) or None
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, request: HTTPRequest) -> CacheKey:
+        # the dicts are read directly, names are already processed the way the parser stores them
+        return (tuple(request.path.parts),
+                tuple(map(request.query_params.get, self._query)),
+                tuple(map(request.headers.get, self._headers)))
+
+    def respond(self, key: CacheKey, request: HTTPRequest) -> HTTPResponse | None:
+        """the stored response, or a 304 if the client already has it, or None if there is nothing fresh"""
+
+        with self._lock:
+            if (entry := self._entries.get(key)) is None:
+                return None
+            elif entry.expires <= time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+
+        return self._reply(entry, request)
+
+    def store(self, key: CacheKey, request: HTTPRequest, response: HTTPResponse) -> HTTPResponse:
+        """keeps the response if it can be reused, and returns what to actually send"""
+
+        if response.status not in _CACHEABLE or response.streaming or isinstance(response.body, FileBody):
+            return response
+
+        body = bytes(response.body)
+        headers = Headers({field: value for field, value in response.headers.items() if field not in _UNCACHED_HEADERS})
+
+        if self._vary is not None:
+            dict.__setitem__(headers, 'vary', self._vary)
+
+        # a hash of the body rather than a counter, so every worker and process comes up with the same one
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        dict.__setitem__(headers, 'etag', etag)
+
+        entry = _Entry(response.status, headers, body, etag, time.monotonic() + self.config.ttl)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.config.size:
+                self._entries.popitem(last=False)
+
+        return self._reply(entry, request)
+
+    @staticmethod
+    def _reply(entry: _Entry, request: HTTPRequest) -> HTTPResponse:
+        # always copies, connection negotiation writes into the headers of whatever is sent
+        if (if_none_match := request.headers.get('if-none-match')) is not None and _matches(entry.etag, if_none_match):
+            return HTTPResponse(HTTPStatus.NotModified, Headers(entry.headers), b'')
+
+        return HTTPResponse(entry.status, Headers(entry.headers), entry.body)
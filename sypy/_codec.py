@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import types
+import typing
+from dataclasses import dataclass
+from typing import Any, Callable, NoReturn
+
+from ._config import JSONBackend
+
+
+type Encoder = Callable[[Any], Any]
+type Decoder = Callable[[Any, str], Any]
+
+
+@dataclass
+class DecodeError(ValueError):
+    where: str
+    expected: str
+
+    def __str__(self) -> str:
+        return f"{self.where}: expected {self.expected}"
+
+
+def _fail(where: str, expected: str) -> NoReturn:
+    raise DecodeError(where, expected)
+
+
+def _stdlib() -> tuple[Callable[[Any], bytes], Callable[[bytes | str], Any]]:
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+    def loads(data: bytes | bytearray | memoryview | str) -> Any:
+        # json is utf-8 anyway, that spares json.loads guessing the encoding, and works for memoryviews too
+        return json.loads(data if isinstance(data, str) else str(data, 'utf-8'))
+
+    return lambda obj: encoder.encode(obj).encode('utf-8'), loads
+
+
+def _orjson() -> tuple[Callable[[Any], bytes], Callable[[bytes | str], Any]]:
+    try:
+        import orjson
+    except ImportError:
+        raise ImportError("orjson is not installed, install it or pick another json backend") from None
+
+    return orjson.dumps, orjson.loads
+
+
+_BACKENDS: dict[JSONBackend, Callable[[], tuple[Callable[[Any], bytes], Callable[[bytes | str], Any]]]] = {
+    JSONBackend.Stdlib: _stdlib,
+    JSONBackend.Orjson: _orjson,
+}
+
+# always looked up through the module, so switching the backend reaches every already compiled callback
+dumps, loads = _stdlib()
+
+
+def use(backend: JSONBackend) -> None:
+    global dumps, loads
+
+    dumps, loads = _BACKENDS[backend]()
+
+
+_AS_IS = (int, float, str, bool, types.NoneType)
+
+_encoders: dict[type, Encoder] = {}
+_decoders: dict[type, Decoder] = {}
+
+
+def _members(type_: Any) -> tuple[Any, tuple[Any, ...]]:
+    origin = typing.get_origin(type_)
+
+    if origin is types.UnionType:
+        origin = typing.Union
+
+    return origin, typing.get_args(type_)
+
+
+def _encode_any(value: Any) -> Any:
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return encoder(type(value))(value)
+    elif isinstance(value, (list, tuple)):
+        return [_encode_any(item) for item in value]
+    elif isinstance(value, dict):
+        return {key: _encode_any(item) for key, item in value.items()}
+
+    return value
+
+
+def _encoding(type_: Any) -> Encoder | None:
+    """None when values of the type already are what json wants"""
+
+    if type_ in _AS_IS or type_ is None:
+        return None
+    elif dataclasses.is_dataclass(type_):
+        return encoder(type_)
+
+    origin, args = _members(type_)
+
+    if origin in (list, tuple, set, frozenset) and (len(args) == 1 or len(args) == 2 and args[1] is Ellipsis):
+        if (encode_item := _encoding(args[0])) is None:
+            return None if origin in (list, tuple) else list
+
+        return lambda value: [encode_item(item) for item in value]
+    elif origin is dict and len(args) == 2:
+        if (encode_item := _encoding(args[1])) is None:
+            return None
+
+        return lambda value: {key: encode_item(item) for key, item in value.items()}
+    elif origin is typing.Union and all(_encoding(member) is None for member in args):
+        return None
+
+    return _encode_any
+
+
+def encoder(type_: type) -> Encoder:
+    """compiles a dataclass into a function making a json-ready dict out of it, once per dataclass"""
+
+    if (encode := _encoders.get(type_)) is not None:
+        return encode
+
+    # a dataclass containing itself runs into this while it is still being compiled
+    _encoders[type_] = lambda value: _encoders[type_](value)
+
+    hints = typing.get_type_hints(type_)
+    namespace: dict[str, Any] = {}
+    items = []
+
+    for i, field in enumerate(dataclasses.fields(type_)):
+        if (encode_field := _encoding(hints.get(field.name, Any))) is None:
+            items.append(f"{field.name!r}: value.{field.name}")
+        else:
+            namespace[f'_encode_{i}'] = encode_field
+            items.append(f"{field.name!r}: _encode_{i}(value.{field.name})")
+
+    exec(f"def encode(value):\n    return {{{', '.join(items)}}}\n", namespace)
+
+    _encoders[type_] = encode = namespace['encode']
+    return encode
+
+
+# expressions checking a value named v in place, without calling anything unless it is wrong
+_INLINE_CHECKS: dict[Any, str] = {
+    int: "v if type(v) is int else _fail({where}, 'int')",
+    float: "float(v) if type(v) is float or type(v) is int else _fail({where}, 'float')",
+    str: "v if type(v) is str else _fail({where}, 'str')",
+    bool: "v if type(v) is bool else _fail({where}, 'bool')",
+    types.NoneType: "v if v is None else _fail({where}, 'null')",
+    None: "v if v is None else _fail({where}, 'null')",
+}
+
+
+def _checking(expected: type, name: str) -> Decoder:
+    def decode(value: Any, where: str) -> Any:
+        if type(value) is not expected:
+            _fail(where, name)
+
+        return value
+
+    return decode
+
+
+def _decode_float(value: Any, where: str) -> float:
+    if type(value) is not float and type(value) is not int:
+        _fail(where, 'float')
+
+    return float(value)
+
+
+def _decode_none(value: Any, where: str) -> None:
+    if value is not None:
+        _fail(where, 'null')
+
+
+def _decode_any(value: Any, _: str) -> Any:
+    return value
+
+
+_DECODERS: dict[Any, Decoder] = {
+    int: _checking(int, 'int'),
+    float: _decode_float,
+    str: _checking(str, 'str'),
+    bool: _checking(bool, 'bool'),
+    types.NoneType: _decode_none,
+    None: _decode_none,
+    list: _checking(list, 'an array'),
+    dict: _checking(dict, 'an object'),
+}
+
+
+def decoder(type_: Any) -> Decoder:
+    """a function checking a parsed json value against the type and converting it, dataclasses are compiled once each"""
+
+    if (decode := _DECODERS.get(type_)) is not None:
+        return decode
+    elif dataclasses.is_dataclass(type_):
+        return _dataclass_decoder(type_)
+
+    origin, args = _members(type_)
+
+    if origin in (list, tuple, set, frozenset) and (len(args) == 1 or len(args) == 2 and args[1] is Ellipsis):
+        decode_item, container = decoder(args[0]), origin
+
+        def decode(value: Any, where: str) -> Any:
+            if type(value) is not list:
+                _fail(where, 'an array')
+
+            where = f"{where}[]"
+            items = [decode_item(item, where) for item in value]
+
+            return items if container is list else container(items)
+
+        return decode
+    elif origin is dict and len(args) == 2:
+        decode_item = decoder(args[1])
+
+        def decode(value: Any, where: str) -> Any:
+            if type(value) is not dict:
+                _fail(where, 'an object')
+
+            where = f"{where}[]"
+            return {key: decode_item(item, where) for key, item in value.items()}
+
+        return decode
+    elif origin is typing.Union:
+        members = [(member, decoder(member)) for member in args]
+
+        if len(members) == 2 and any(member in (None, types.NoneType) for member, _ in members):
+            decode_some = next(decode for member, decode in members if member not in (None, types.NoneType))
+            return lambda value, where: None if value is None else decode_some(value, where)
+
+        expected = ' or '.join(getattr(member, '__name__', str(member)) for member, _ in members)
+
+        def decode(value: Any, where: str) -> Any:
+            for _, decode_member in members:
+                try:
+                    return decode_member(value, where)
+                except DecodeError:
+                    pass
+
+            _fail(where, expected)
+
+        return decode
+
+    # no idea how to check it, it is taken as is
+    return _decode_any
+
+
+def _dataclass_decoder(type_: type) -> Decoder:
+    if (decode := _decoders.get(type_)) is not None:
+        return decode
+
+    # a dataclass containing itself runs into this while it is still being compiled
+    _decoders[type_] = lambda value, where: _decoders[type_](value, where)
+
+    hints = typing.get_type_hints(type_)
+    namespace: dict[str, Any] = {'_type': type_, '_fail': _fail, '_missing': dataclasses.MISSING}
+    lines = [
+        "def decode(value, where):",
+        "    if type(value) is not dict:",
+        "        _fail(where, 'an object')",
+        "    get = value.get",
+    ]
+    arguments = []
+
+    for i, field in enumerate(dataclasses.fields(type_)):
+        if not field.init:
+            continue
+
+        where = f"where + {f'.{field.name}'!r}"
+        hint = hints.get(field.name, Any)
+
+        if (check := _INLINE_CHECKS.get(hint)) is not None:
+            converted = check.format(where=where)
+        else:
+            namespace[f'_decode_{i}'] = decoder(hint)
+            converted = f"_decode_{i}(v, {where})"
+
+        if field.default is not dataclasses.MISSING:
+            namespace[f'_default_{i}'] = field.default
+            missing = f"_default_{i}"
+        elif field.default_factory is not dataclasses.MISSING:
+            namespace[f'_factory_{i}'] = field.default_factory
+            missing = f"_factory_{i}()"
+        else:
+            missing = f"_fail({where}, 'a value')"
+
+        lines += [
+            f"    v = get({field.name!r}, _missing)",
+            f"    f{i} = {missing} if v is _missing else {converted}",
+        ]
+        arguments.append(f"{field.name}=f{i}")
+
+    lines.append(f"    return _type({', '.join(arguments)})")
+    exec('\n'.join(lines) + '\n', namespace)
+
+    _decoders[type_] = decode = namespace['decode']
+    return decode
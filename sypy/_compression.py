@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import collections
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import Any
+
+from .http import HTTPRequest, HTTPResponse, HTTPStatus, Headers
+
+
+# wbits picking the container, 'deflate' in http means the zlib one rather than raw deflate
+_CODINGS = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'deflate': zlib.MAX_WBITS,
+}
+
+# already compressed, another go would only cost time
+_COMPRESSED_TYPES = ('image/', 'video/', 'audio/', 'font/woff', 'application/zip', 'application/gzip', 'application/x-gzip', 'application/zstd')
+_UNCOMPRESSED_TYPES = ('image/svg+xml', 'image/bmp')
+
+# partial content is a piece of the plain body, the rest of them have none to compress
+_SKIPPED = {HTTPStatus.PartialContent, HTTPStatus.NoContent, HTTPStatus.NotModified, HTTPStatus.RangeNotSatisfiable}
+
+
+@dataclass(frozen=True)
+class Compress:
+    """opts a route into gzip/deflate for clients asking for it, for bodies of at least min_size bytes
+
+    the compressed bodies of responses with an etag are kept, at most size of them at once, so they are compressed only once"""
+
+    level: int = 6
+    min_size: int = 1024
+    size: int = 256
+
+
+def _negotiate(accept_encoding: str) -> str | None:
+    """the coding to use, gzip if both are as welcome, None if neither is"""
+
+    weights: dict[str, float] = {}
+
+    for item in accept_encoding.split(','):
+        coding, *params = item.split(';')
+        q = 1.0
+
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+
+        weights[coding.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for coding in _CODINGS:
+        if (q := weights.get(coding, weights.get('*', 0.0))) > best_q:
+            best, best_q = coding, q
+
+    return best
+
+
+def _vary(headers: Headers) -> None:
+    if (vary := dict.get(headers, 'vary')) is None:
+        dict.__setitem__(headers, 'vary', 'Accept-Encoding')
+    elif 'accept-encoding' not in vary.lower() and vary != '*':
+        dict.__setitem__(headers, 'vary', f"{vary}, Accept-Encoding")
+
+
+type VariantKey = tuple[Any, ...]
+
+
+class Compressor:
+    config: Compress
+
+    # the compressed body, or None if compressing didn't make it any smaller
+    _variants: collections.OrderedDict[VariantKey, bytes | None]
+    _lock: threading.Lock
+
+    def __init__(self, config: Compress) -> None:
+        if not -1 <= config.level <= 9:
+            raise ValueError(f"compression level goes from 0 to 9, or -1 for zlib's default, not {config.level}")
+
+        self.config = config
+
+        self._variants = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def apply(self, request: HTTPRequest, response: HTTPResponse) -> HTTPResponse:
+        """the response as the client asked for it, compressed if that is worth it"""
+
+        if response.status == HTTPStatus.NotModified:
+            # says which representation it stands for just like the full response would
+            _vary(response.headers)
+            return response
+
+        if response.status in _SKIPPED or 'content-encoding' in response.headers:
+            return response
+
+        # written into, which is fine - every response is either freshly made or a copy already
+        headers = response.headers
+        # whether it's compressed or not, the route's responses depend on Accept-Encoding - a cache mustn't hand a small
+        # or a streamed one out as if they didn't
+        _vary(headers)
+
+        if not isinstance(body := response.body, (bytes, bytearray, memoryview)) or len(body) < self.config.min_size:
+            return response
+
+        content_type = headers.get('content-type', '')
+        if content_type.startswith(_COMPRESSED_TYPES) and not content_type.startswith(_UNCOMPRESSED_TYPES):
+            return response
+
+        if (coding := _negotiate(request.headers.get('accept-encoding', ''))) is None:
+            return response
+
+        # only an etag tells the same body apart from another cheaply, bodies without one are compressed every time
+        if (etag := dict.get(headers, 'etag')) is not None:
+            key = (tuple(request.path.parts), etag, coding)
+
+            with self._lock:
+                if (hit := key in self._variants):
+                    compressed = self._variants[key]
+                    self._variants.move_to_end(key)
+
+            if not hit:
+                compressed = self._compress(body, coding)
+
+                with self._lock:
+                    self._variants[key] = compressed
+
+                    while len(self._variants) > self.config.size:
+                        self._variants.popitem(last=False)
+        else:
+            compressed = self._compress(body, coding)
+
+        if compressed is None:
+            return response
+
+        dict.__setitem__(headers, 'content-encoding', coding)
+
+        if etag is not None and not etag.startswith('W/'):
+            # the same content, not the same bytes, If-None-Match compares them weakly anyway
+            dict.__setitem__(headers, 'etag', f"W/{etag}")
+
+        return HTTPResponse(response.status, headers, compressed)
+
+    def _compress(self, body: bytes | bytearray | memoryview, coding: str) -> bytes | None:
+        compressor = zlib.compressobj(self.config.level, zlib.DEFLATED, _CODINGS[coding])
+        compressed = compressor.compress(body) + compressor.flush()
+
+        return compressed if len(compressed) < len(body) else None
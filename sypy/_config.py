@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from enum import StrEnum
+
+
+class Engine(StrEnum):
+    Threaded = 'threaded'
+    EventLoop = 'event-loop'
+
+
+class Scheduling(StrEnum):
+    RoundRobin = 'round-robin'
+    Shared = 'shared'
+    LeastLoaded = 'least-loaded'
+    WorkStealing = 'work-stealing'
+
+
+class Overload(StrEnum):
+    # answer 503 with Retry-After right away and close
+    Reject = 'reject'
+    # stop accepting, new connections wait in the listen backlog
+    Pause = 'pause'
+
+
+class AccessFormat(StrEnum):
+    Text = 'text'
+    JSON = 'json'
+
+
+class JSONBackend(StrEnum):
+    Stdlib = 'json'
+    Orjson = 'orjson'
+
+
+@dataclass
+class RunConfig:
+    port: int
+    workers: int = os.cpu_count() or 1
+    processes: int = 1
+    debug: bool = False
+    listen: bool = False
+    exposing: bool = True
+    keep_alive: bool = True
+    keep_alive_timeout: float = 5.0
+    keep_alive_requests: int = 100
+    # requests of a single connection worked on at once when the client pipelines them, 1 takes them one after another
+    pipeline_depth: int = 16
+    engine: Engine = Engine.Threaded
+    # threads the event-loop engine runs callbacks on, so a blocking one doesn't stall its loop - at least one then, unused otherwise
+    offload_workers: int = 16
+    scheduling: Scheduling = Scheduling.RoundRobin
+    buffer_size: int = 4096
+    head_limit: int = 64 * 1024
+    max_body_size: int = 16 * 1024 * 1024
+    json_backend: JSONBackend = JSONBackend.Stdlib
+    # requests queued or in flight per worker before the overload policy kicks in
+    queue_limit: int = 256
+    overload: Overload = Overload.Reject
+    retry_after: int = 1
+    # where to serve prometheus metrics on, if anywhere
+    metrics: str | None = None
+    # a file to append to, '-' for stdout, None for no access log at all
+    access_log: str | None = '-'
+    access_log_format: AccessFormat = AccessFormat.Text
+    # the share of requests that make it into the access log
+    access_log_sample: float = 1.0
+    # a directory to dump a pstats file per profiled request into, None for no profiling
+    profile: str | None = None
+    # the share of requests profiled, of the profiled routes only if there are any
+    profile_sample: float = 0.01
+    profile_routes: tuple[str, ...] = ()
+    # how long a stop or a reload waits for the requests in flight before giving up on them
+    stop_timeout: float = 30.0
@@ -1,16 +1,17 @@
 from __future__ import annotations
 
-from collections import defaultdict
-from typing import Callable
+from dataclasses import dataclass, field
+from typing import Callable, Any
 
 from .callback import Callback
+from .._cache import Cache, ResponseCache
+from .._compression import Compress, Compressor
 from ..http._method import HTTPMethod
 from ..http.path import Path
-from .._utils import defaultdict_of_defaultdicts_factory
 
 
 type MethodTable = dict[HTTPMethod, Callback]
-type Endpoints = defaultdict[str, Endpoints | MethodTable]
+type Segment = str | tuple[str, Callable[[str], Any]]
 
 
 class DispatcherNotFound(LookupError):
@@ -21,41 +22,184 @@ class DispatcherNotAllowed(KeyError):
     pass
 
 
-class Dispatcher:
-    _endpoints: Endpoints
+def _str_segment(s: str) -> str:
+    if not s:
+        raise ValueError("empty path segment")
 
-    def __init__(self):
-        self._endpoints = defaultdict_of_defaultdicts_factory()
+    return s
+
+
+def _rest(s: str) -> str:
+    # never called on a single segment, a node takes everything left of the path for it itself
+    return s
+
+
+CONVERTERS: dict[str, Callable[[str], Any]] = {
+    'str': _str_segment,
+    'int': int,
+    'float': float,
+    'path': _rest,
+}
+
+_ANNOTATED_CONVERTERS: dict[type, Callable[[str], Any]] = {
+    str: _str_segment,
+    int: int,
+    float: float,
+}
+
+
+@dataclass
+class _Node:
+    children: dict[str, _Node] = field(default_factory=dict)
+    params: list[tuple[str, Callable[[str], Any], _Node]] = field(default_factory=list)
+    # a {name:path} param, matching whatever is left of the path, even nothing
+    rest: tuple[str, _Node] | None = None
+    method_table: MethodTable | None = None
+
+    def child(self, segment: Segment) -> _Node:
+        if isinstance(segment, str):
+            return self.children.setdefault(segment, _Node())
+
+        name, converter = segment
+
+        if converter is _rest:
+            if self.rest is None or self.rest[0] != name:
+                self.rest = name, _Node()
+
+            return self.rest[1]
 
-    def _lookup_method_table(self, path_parts: list[str], /, _search: Endpoints | None = None) -> MethodTable:
-        search = _search or self._endpoints
+        for param_name, param_converter, node in self.params:
+            if param_name == name and param_converter is converter:
+                return node
 
-        if len(path_parts) == 1:
-            if not (method_table := search[path_parts[0]]).keys():
-                raise KeyError("no method table was found for such path")
+        self.params.append((name, converter, node := _Node()))
+        return node
 
+    def match(self, parts: list[str], i: int, path_params: dict[str, Any], method: HTTPMethod | None = None) -> MethodTable | None:
+        """the table of the first route matching the path - of the first one taking the method too, if there is one"""
+
+        if i == len(parts):
+            if self.method_table is not None and (method is None or method in self.method_table):
+                return self.method_table
+
+            return self._match_rest(parts, i, path_params, method) if self.rest is not None else None
+
+        part = parts[i]
+
+        if (node := self.children.get(part)) is not None and (method_table := node.match(parts, i + 1, path_params, method)) is not None:
             return method_table
-        else:
-            if not (subtable := search[path_parts.pop(0)]).keys():
-                raise KeyError("no method table was found for such path")
 
-            return self._lookup_method_table(path_parts, _search=subtable)
+        for name, converter, node in self.params:
+            try:
+                value = converter(part)
+            except ValueError:
+                continue
+
+            if (method_table := node.match(parts, i + 1, path_params, method)) is not None:
+                path_params[name] = value
+                return method_table
+
+        return self._match_rest(parts, i, path_params, method) if self.rest is not None else None
+
+    def _match_rest(self, parts: list[str], i: int, path_params: dict[str, Any], method: HTTPMethod | None) -> MethodTable | None:
+        name, node = self.rest
+
+        if (method_table := node.method_table) is None or method is not None and method not in method_table:
+            return None
+
+        path_params[name] = '/'.join(parts[i:])
+        return method_table
+
+
+def _parse_template(path: str) -> tuple[list[str], list[tuple[int, str, str | None]]]:
+    literals: list[str] = []
+    params: list[tuple[int, str, str | None]] = []
 
-    def dispatch(self, path: Path, method: HTTPMethod) -> Callback:
-        try:
-            method_table = self._lookup_method_table(path.parts[:])
-        except KeyError:
-            raise DispatcherNotFound(f"method/callback table was not found for {path}") from None
-        
-        if method not in method_table:
-            raise DispatcherNotAllowed(f"method '{method}' is not allowed for {path}") from None
+    for i, part in enumerate(path.removesuffix('/').removeprefix('/').split('/')):
+        if part.startswith('{') and part.endswith('}'):
+            name, _, converter = part[1:-1].partition(':')
 
-        return method_table[method]
+            if not name.isidentifier():
+                raise ValueError(f"invalid path parameter name: {name!r}")
+            if converter and converter not in CONVERTERS:
+                raise ValueError(f"unknown path parameter converter: {converter!r}")
 
-    def register_callback(self, path: Path, method: HTTPMethod, callback: Callable, /, _endpoints: Endpoints | None = None) -> None:
-        endpoints = _endpoints or self._endpoints
+            if converter == 'path' and i != path.removesuffix('/').removeprefix('/').count('/'):
+                raise ValueError(f"a path parameter taking the rest of the path has to be the last one: {name!r}")
 
-        if len(path.parts) > 1:
-            self.register_callback(Path(path.parts[1:]), method, callback, _endpoints=endpoints[path.parts[0]])
+            params.append((i, name, converter or None))
+            literals.append('')
         else:
-            endpoints[path.parts[0]][method] = Callback(callback)
+            literals.append(part)
+
+    return literals, params
+
+
+class Dispatcher:
+    """routes are registered into a plain list, then compiled once into a dict of static paths and a segment trie"""
+
+    _routes: list[tuple[list[Segment], HTTPMethod, Callback]]
+
+    _compiled: tuple[dict[tuple[str, ...], MethodTable], _Node] | None = None
+
+    def __init__(self):
+        self._routes = []
+
+    def compile(self) -> None:
+        static: dict[tuple[str, ...], MethodTable] = {}
+        tree = _Node()
+
+        for segments, method, callback in self._routes:
+            if all(isinstance(segment, str) for segment in segments):
+                static.setdefault(tuple(segments), {})[method] = callback
+            else:
+                node = tree
+                for segment in segments:
+                    node = node.child(segment)
+
+                if node.method_table is None:
+                    node.method_table = {}
+
+                node.method_table[method] = callback
+
+        # published at once and never touched again, lookups of unknown paths can't grow anything
+        self._compiled = static, tree
+
+    def dispatch(self, path: Path, method: HTTPMethod) -> tuple[Callback, dict[str, Any]]:
+        if (compiled := self._compiled) is None:
+            self.compile()
+            compiled = self._compiled
+
+        static, tree = compiled
+        path_params: dict[str, Any] = {}
+
+        if (static_table := static.get(tuple(path.parts))) is not None and method in static_table:
+            return static_table[method], path_params
+
+        # a route with params may still take the method where a static one of the same path doesn't
+        if (method_table := tree.match(path.parts, 0, path_params, method)) is not None:
+            return method_table[method], path_params
+
+        if static_table is not None or tree.match(path.parts, 0, {}) is not None:
+            raise DispatcherNotAllowed(f"method '{method}' is not allowed for {path}")
+
+        raise DispatcherNotFound(f"method/callback table was not found for {path}")
+
+    def register_callback(self, path: str, method: HTTPMethod, callback: Callable, cache: Cache | None = None, raw: bool = False, compress: Compress | None = None) -> None:
+        literals, params = _parse_template(path)
+
+        compiled_callback = Callback(callback, raw=raw, path_params=[name for _, name, _ in params])
+        compiled_callback.route = path
+
+        if cache is not None:
+            compiled_callback.cache = ResponseCache(cache, compiled_callback)
+        if compress is not None:
+            compiled_callback.compressor = Compressor(compress)
+
+        segments: list[Segment] = Path(literals).parts
+        for i, name, converter in params:
+            annotated = next(type_ for _, param_name, type_ in compiled_callback.path_params if param_name == name)
+            segments[i] = name, CONVERTERS[converter] if converter is not None else _ANNOTATED_CONVERTERS.get(annotated, _str_segment)
+
+        self._routes.append((segments, method, compiled_callback))
+        self._compiled = None
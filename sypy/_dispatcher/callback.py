@@ -1,14 +1,21 @@
 from __future__ import annotations
 
+import asyncio
 import dataclasses
 import inspect
-import json
-from typing import Callable, Any, _AnnotatedAlias, get_args, NoReturn, Never
+import threading
+import collections.abc
+from typing import Callable, Coroutine, Iterable, Iterator, Any, _AnnotatedAlias, get_args, get_origin, NoReturn, Never, TYPE_CHECKING
 from dataclasses import dataclass
 
 from ..http import HTTPStatus, Headers, HTTPException, HTTPRequest, HTTPResponse
-from .._utils import isinstanceorclass, is_in, dataclass_from_dict
-from ..parameters import Body, Query, Header, Depends
+from .._utils import isinstanceorclass, is_in
+from .. import _codec
+from ..parameters import Body, Query, Header, Depends, Scope, BodyStream
+
+if TYPE_CHECKING:
+    from .._cache import ResponseCache
+    from .._compression import Compressor
 
 
 @dataclass
@@ -17,38 +24,228 @@ class Calls:
     post_call: Callable | None = None
 
 
-class _Nothing:
-    pass
+type Binder = Callable[[HTTPRequest, list[Any]], Any]
+
+
+_BOOLS = {'true': True, 'false': False}
+
+
+def _parse_bool(value: str) -> bool:
+    # XXX is there a better way?
+    try:
+        return _BOOLS[value.strip().lower()]
+    except KeyError:
+        raise HTTPException(HTTPStatus.UnprocessableContent, "invalid value for bool param") from None
+
+
+def _json_parser(type_: type, where: str) -> Callable[[str | bytes | memoryview], Any]:
+    decode = _codec.decoder(type_)
+
+    def parse(value: str | bytes | memoryview) -> Any:
+        try:
+            raw_json = _codec.loads(value)
+        except (TypeError, ValueError):
+            raise HTTPException(HTTPStatus.UnprocessableContent, "json is invalid") from None
+
+        if raw_json is None:
+            return None
+
+        try:
+            return decode(raw_json, where)
+        except _codec.DecodeError as exc:
+            raise HTTPException(HTTPStatus.UnprocessableContent, f"you forgor something in some json - {exc}") from None
+
+    return parse
+
+
+def _unsupported(_: str) -> NoReturn:
+    raise TypeError("implement yourself, not supported callback signature paramater's type")
+
+
+def _parser(type_: type, where: str) -> Callable[[str], Any]:
+    if type_ is int:
+        parse = int
+    elif type_ is str:
+        parse = str
+    elif type_ is bool:
+        parse = _parse_bool
+    elif type_ is bytes:
+        parse = lambda value: value.encode('ascii')
+    elif type_ is dict or dataclasses.is_dataclass(type_):
+        parse = _json_parser(type_, where)
+    else:
+        parse = _unsupported
+
+    def parse_nullable(value: str) -> Any:
+        if value.strip().lower() == 'null':
+            return None
+
+        return parse(value)
+
+    return parse_nullable
+
+
+def _chunks(chunks: Iterable[str | bytes]) -> Iterator[bytes]:
+    # lazy, nothing is produced before the engine asks for the next chunk
+    for chunk in chunks:
+        yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+
+def _source_binder(source: Callable[[HTTPRequest], dict[str, str]], name: str, type_: type, has_default: bool, default: Any) -> Binder:
+    parse = _parser(get_args(type_)[0] if isinstance(type_, _AnnotatedAlias) else type_, name)
+
+    def bind(request: HTTPRequest, _: list[Any]) -> Any:
+        # a plain dict lookup, optional params are missing often enough for a KeyError every time to show
+        if (value := dict.get(source(request), name, _UNSET)) is _UNSET:
+            if has_default:
+                return default
+
+            raise HTTPException(HTTPStatus.UnprocessableContent, "you forgor something")
+
+        return parse(value)
+
+    return bind
+
+
+_UNSET = object()
+
+_SCOPE_WIDTH = {Scope.Request: 0, Scope.Worker: 1, Scope.App: 2}
+
+# values of the dependencies outliving a request, by their function
+_app_values: dict[Callable, Any] = {}
+_app_lock = threading.Lock()
+_worker_values = threading.local()
+
+
+@dataclass(eq=False)
+class _Node:
+    dependency: Callback
+    scope: Scope
+    # where in the plan whatever it depends on itself is, in the order of its parameters
+    needs: list[int]
+    # how many coroutines have to be awaited before it can run, coroutines on the same level never need one another
+    level: int
+
+
+def _plan(dependency: Callback, scope: Scope, plan: list[_Node], planned: dict[Callable, int]) -> int:
+    """puts the dependency into the plan once, after everything it needs, and tells where"""
+
+    if (k := planned.get(dependency.callback)) is not None:
+        if plan[k].scope != scope:
+            raise TypeError(f"make up your mind, is {dependency.callback.__name__} {plan[k].scope} or {scope} scoped?")
+
+        return k
+
+    if scope != Scope.Request and (dependency.query_params or dependency.header_params or dependency.body_param is not None):
+        raise TypeError(f"{dependency.callback.__name__} is {scope} scoped, it can't take anything from a request")
+
+    needs = [_plan(sub, sub_scope, plan, planned) for _, sub, _, _, sub_scope in dependency.dependent_params]
+
+    if any(_SCOPE_WIDTH[plan[j].scope] < _SCOPE_WIDTH[scope] for j in needs):
+        raise TypeError(f"{dependency.callback.__name__} is {scope} scoped, it can't depend on something that lives shorter")
+
+    planned[dependency.callback] = len(plan)
+    plan.append(_Node(dependency, scope, needs, max((plan[j].level + plan[j].dependency.coroutine for j in needs), default=0)))
+
+    return len(plan) - 1
+
+
+def _scoped_values(scope: Scope) -> dict[Callable, Any]:
+    if scope == Scope.App:
+        return _app_values
+
+    try:
+        return _worker_values.values
+    except AttributeError:
+        _worker_values.values = {}
+        return _worker_values.values
+
+
+def _evaluate(node: _Node, request: HTTPRequest, results: list[Any]) -> Any:
+    if node.scope == Scope.Request:
+        return node.dependency.invoke(request, [results[k] for k in node.needs])
+
+    values, function = _scoped_values(node.scope), node.dependency.callback
+
+    if (value := values.get(function, _UNSET)) is _UNSET:
+        # only ever taken the first time around
+        with _app_lock:
+            if (value := values.get(function, _UNSET)) is _UNSET:
+                value = values[function] = node.dependency.invoke(request, [results[k] for k in node.needs])
+
+    return value
+
+
+async def _evaluate_async(node: _Node, request: HTTPRequest, results: list[Any]) -> Any:
+    if node.scope == Scope.Request:
+        return await node.dependency.invoke(request, [results[k] for k in node.needs])
+
+    values, function = _scoped_values(node.scope), node.dependency.callback
+
+    if (value := values.get(function, _UNSET)) is _UNSET:
+        # no lock can be held across the await, first requests racing may both make it, the first one made stays
+        value = values.setdefault(function, await node.dependency.invoke(request, [results[k] for k in node.needs]))
+
+    return value
+
+
+def _query(request: HTTPRequest) -> dict[str, str]:
+    return request.query_params
+
+
+def _headers(request: HTTPRequest) -> dict[str, str]:
+    return request.headers
 
 
 # P: T | Annotated[T, Body | Query | Header | Depends]
 class Callback[**T, **P, R: int | str | bytes | dict | list | tuple]:
+    path_params: list[tuple[int, str, type]]
     query_params: list[tuple[int, str, type, bool, Any]]
     header_params: list[tuple[int, str, type, bool, Any]]
     body_param: tuple[int, type] | None
-    dependent_params: list[tuple[int, Callback]]
+    dependent_params: list[tuple[int, Callback, bool, Any, Scope]]
 
     callback: Callable[[P], R]
-    converter: Callable[[R], bytes] | None
+    converter: Callable[[R], bytes | Iterator[bytes]] | None
+
+    _binders: list[Binder]
+
+    # every dependency down the line, each once, in an order where it comes after whatever it needs
+    _plan: list[_Node]
+    _levels: list[list[int]]
+    # where in the plan the callback's own dependencies are
+    _direct: list[int]
+
+    cache: ResponseCache | None = None
+    compressor: Compressor | None = None
+    route: str | None = None
 
     raw: bool = False
+    coroutine: bool = False
+    is_async: bool = False
+    streams_body: bool = False
 
-    def __init__(self, callback: Callable[[P], R], raw: bool = False) -> None:
+    def __init__(self, callback: Callable[[P], R], raw: bool = False, path_params: Iterable[str] = ()) -> None:
         self.callback = callback
         self.raw = raw
+        self.coroutine = inspect.iscoroutinefunction(callback)
 
+        self.path_params = []
         self.query_params = []
         self.header_params = []
         self.body_param = None
         self.dependent_params = []
 
-        signature = inspect.signature(callback)
+        signature = inspect.signature(callback, eval_str=True)
 
         for i, (name, param) in enumerate(signature.parameters.items()):
             if param == param.KEYWORD_ONLY:
                 raise TypeError("all arguments in a callback must be addressable by position")
 
-            if isinstance((type_ := param.annotation), _AnnotatedAlias):
+            if name in path_params:
+                # already converted by the dispatcher while matching the path
+                self.path_params.append((i, name, str if param.annotation is param.empty else param.annotation))
+            elif isinstance((type_ := param.annotation), _AnnotatedAlias):
                 annotated_type = type_.__metadata__[0]
 
                 if isinstanceorclass(annotated_type, Body):
@@ -61,7 +258,7 @@ class Callback[**T, **P, R: int | str | bytes | dict | list | tuple]:
                 elif isinstanceorclass(annotated_type, Header):
                     self.header_params.append((i, param.name, type_, param.default != param.empty, param.default))
                 elif isinstance(annotated_type, Depends):
-                    self.dependent_params.append((i, annotated_type.dependency, param.default != param.empty, param.default))
+                    self.dependent_params.append((i, annotated_type.dependency, param.default != param.empty, param.default, annotated_type.scope))
                 elif annotated_type is Depends:
                     raise TypeError("on what the hell does it depend on?")
                 else:
@@ -69,6 +266,45 @@ class Callback[**T, **P, R: int | str | bytes | dict | list | tuple]:
             else:
                 self.query_params.append((i, param.name, type_, param.default != param.empty, param.default))
 
+        if missing := set(path_params) - {name for _, name, _ in self.path_params}:
+            raise TypeError(f"path parameters are missing from the signature: {', '.join(sorted(missing))}")
+
+        # everything about how to get each argument out of a request is figured out once, right here
+        binders: list[tuple[int, Binder]] = []
+        for i, name, _ in self.path_params:
+            binders.append((i, lambda request, _, name=name: request.path_params[name]))
+        for i, name, type_, has_default, default in self.query_params:
+            binders.append((i, _source_binder(_query, name, type_, has_default, default)))
+        for i, name, type_, has_default, default in self.header_params:
+            binders.append((i, _source_binder(_headers, Headers._process_index(name), type_, has_default, default)))
+        for j, (i, *_) in enumerate(self.dependent_params):
+            binders.append((i, lambda _, dependencies, j=j: dependencies[j]))
+        if self.body_param is not None and get_args(self.body_param[1])[0] is BodyStream:
+            self.streams_body = True
+            binders.append((self.body_param[0], lambda request, _: request.body))
+        elif self.body_param is not None and ((body_type := get_args(self.body_param[1])[0]) is dict or dataclasses.is_dataclass(body_type)):
+            # straight from the bytes, the json backend decodes them itself
+            parse_body = _json_parser(body_type, 'body')
+            binders.append((self.body_param[0], lambda request, _: parse_body(request.body)))
+        elif self.body_param is not None:
+            parse_body = _parser(get_args(self.body_param[1])[0], 'body')
+            binders.append((self.body_param[0], lambda request, _: parse_body(str(request.body, 'ascii'))))
+
+        self._binders = [binder for _, binder in sorted(binders, key=lambda indexed: indexed[0])]
+
+        # the dependency graph is flattened right here, so a dependency shared by several others still runs once per request
+        self._plan, planned = [], {}
+        self._direct = [_plan(dependency, scope, self._plan, planned) for _, dependency, _, _, scope in self.dependent_params]
+        self._levels = [[] for _ in range(max((node.level + 1 for node in self._plan), default=0))]
+        for k, node in enumerate(self._plan):
+            self._levels[node.level].append(k)
+
+        # awaiting anything anywhere down the line makes the whole call awaitable
+        self.is_async = self.coroutine or any(node.dependency.coroutine for node in self._plan)
+
+        if self.streams_body and self.is_async:
+            raise TypeError("a streamed body is read blocking, it would stall every other async callback")
+
         if raw:
             self.converter = lambda d: d
         elif signature.return_annotation is int:
@@ -78,9 +314,12 @@ class Callback[**T, **P, R: int | str | bytes | dict | list | tuple]:
         elif signature.return_annotation is bytes:
             self.converter = lambda b: b
         elif is_in(signature.return_annotation, (dict, list, tuple)):
-            self.converter = lambda d: json.dumps(d).encode('utf-8')
+            self.converter = lambda d: _codec.dumps(d)
         elif dataclasses.is_dataclass(signature.return_annotation):
-            self.converter = lambda d: json.dumps(dataclasses.asdict(d)).encode('utf-8')
+            encode = _codec.encoder(signature.return_annotation)
+            self.converter = lambda d: _codec.dumps(encode(d))
+        elif is_in(get_origin(signature.return_annotation) or signature.return_annotation, (collections.abc.Iterator, collections.abc.Iterable, collections.abc.Generator)):
+            self.converter = _chunks
         elif signature.return_annotation is None:
             self.converter = lambda _: bytes()
         elif is_in(signature.return_annotation, (NoReturn, Never)):
@@ -88,78 +327,70 @@ class Callback[**T, **P, R: int | str | bytes | dict | list | tuple]:
         else:
             raise TypeError("not supported return type, buddy, not supported")
 
-    def __call__(self, request: HTTPRequest, callback_callbacks: Calls | None = None) -> HTTPResponse | R:
-        total_parameters = len(self.query_params) + len(self.header_params) + len(self.dependent_params) + (self.body_param is not None)
-        unprocessed_parameters: list[_Nothing | tuple[str, type | None]] = [_Nothing for _ in range(total_parameters)]
+    def __call__(self, request: HTTPRequest, callback_callbacks: Calls | None = None) -> HTTPResponse | R | Coroutine[Any, Any, HTTPResponse | R]:
+        if self.is_async:
+            return self._call_async(request, callback_callbacks)
 
-        def do_stuff(magic: tuple[int, str, type, bool, Any], params: dict) -> None:
-            nonlocal unprocessed_parameters
+        results = []
+        for node in self._plan:
+            results.append(_evaluate(node, request, results))
 
-            if magic[1] not in params:
-                if magic[3]:
-                    unprocessed_parameters[magic[0]] = magic[4], None
-            else:
-                unprocessed_parameters[magic[0]] = params[magic[1]], get_args(magic[2])[0] if isinstance(magic[2], _AnnotatedAlias) else magic[2]
-
-        for query_param in self.query_params:
-            do_stuff(query_param, request.query_params)
-        for header_param in self.header_params:
-            do_stuff(header_param, request.headers)
-        for depends_param in self.dependent_params:
-            unprocessed_parameters[depends_param[0]] = depends_param[1](request), None
-        if self.body_param is not None:
-            unprocessed_parameters[self.body_param[0]] = request.body.decode('ascii'), get_args(self.body_param[1])[0]
-
-        if _Nothing in unprocessed_parameters:
-            raise HTTPException(HTTPStatus.UnprocessableContent, "you forgor something")
+        parameters = self._bind(request, [results[k] for k in self._direct])
 
-        parameters: list[int | str | bool | bytes | dict | None] = []
-        for value, type_ in unprocessed_parameters:
-            if type_ is None:
-                parameters.append(value)
-            elif (v := value.strip().lower()) == 'null':
-                parameters.append(None)
-            elif type_ is int:
-                parameters.append(int(v))
-            elif type_ is str:
-                parameters.append(value)
-            elif type_ is bool:
-                # XXX is there a better way?
-                parsed: bool
-                if v == 'true':
-                    parsed = True
-                elif v == 'false':
-                    parsed = False
-                else:
-                    raise HTTPException(HTTPStatus.UnprocessableContent, "invalid value for bool param")
-
-                parameters.append(parsed)
-            elif type_ is bytes:
-                parameters.append(value.encode('ascii'))
-            elif type_ is dict:
-                parameters.append(json.loads(value))
-            elif dataclasses.is_dataclass(type_):
-                # TODO typechecking of values
-                try:
-                    raw_json = json.loads(value)
-                except TypeError:
-                    raise HTTPException(HTTPStatus.UnprocessableContent, "json is invalid") from None
+        if callback_callbacks is not None and callback_callbacks.pre_call is not None:
+            callback_callbacks.pre_call()
+
+        try:
+            result = self.callback(*parameters)
+        finally:
+            if callback_callbacks is not None and callback_callbacks.post_call is not None:
+                callback_callbacks.post_call()
+
+        # outside of the callback's time, turning it into a body is the server's
+        return self._respond(result)
+
+    async def _call_async(self, request: HTTPRequest, callback_callbacks: Calls | None = None) -> HTTPResponse | R:
+        results: list[Any] = [None] * len(self._plan)
+
+        for level in self._levels:
+            awaited = []
+
+            for k in level:
+                if self._plan[k].dependency.coroutine:
+                    awaited.append(k)
                 else:
-                    try:
-                        parameters.append(dataclass_from_dict(type_, raw_json))
-                    except TypeError:
-                        raise HTTPException(HTTPStatus.UnprocessableContent, "you forgor something in some json")
-            else:
-                raise TypeError("implement yourself, not supported callback signature paramater's type")
+                    results[k] = _evaluate(self._plan[k], request, results)
+
+            # the plain ones ran already in plan order, whatever the coroutines need is there, so they all wait at once
+            if len(awaited) == 1:
+                results[awaited[0]] = await _evaluate_async(self._plan[awaited[0]], request, results)
+            elif awaited:
+                for k, value in zip(awaited, await asyncio.gather(*(_evaluate_async(self._plan[k], request, results) for k in awaited))):
+                    results[k] = value
+
+        parameters = self._bind(request, [results[k] for k in self._direct])
 
         if callback_callbacks is not None and callback_callbacks.pre_call is not None:
             callback_callbacks.pre_call()
 
         try:
-            if self.raw:
-                return self.callback(*parameters)
-            else:
-                return HTTPResponse(HTTPStatus.OK, Headers(), self.converter(self.callback(*parameters)))
+            result = await self.callback(*parameters) if self.coroutine else self.callback(*parameters)
         finally:
             if callback_callbacks is not None and callback_callbacks.post_call is not None:
                 callback_callbacks.post_call()
+
+        return self._respond(result)
+
+    def invoke(self, request: HTTPRequest, dependencies: list[Any]) -> R | Coroutine[Any, Any, R]:
+        """just the callback itself, with its dependencies already resolved by whoever depends on it"""
+
+        return self.callback(*self._bind(request, dependencies))
+
+    def _respond(self, result: R) -> HTTPResponse | R:
+        if self.raw:
+            return result
+        else:
+            return HTTPResponse(HTTPStatus.OK, Headers(), self.converter(result))
+
+    def _bind(self, request: HTTPRequest, dependencies: list[Any]) -> list[int | str | bool | bytes | dict | None]:
+        return [bind(request, dependencies) for bind in self._binders]
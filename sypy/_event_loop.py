@@ -0,0 +1,481 @@
+from __future__ import annotations
+
+import collections
+import math
+import queue
+import selectors
+import socket
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from ._config import RunConfig
+from ._dispatcher import Dispatcher
+from ._handling import handle, pipelines, overlaps
+from ._awaiter import Awaiter
+from ._packet import Packet, PacketState, Requester, IP, Connection, BUFFER_SIZE
+from .http import InvalidHTTPPacket, HTTPRequest, FileBody
+from ._logging import logger
+
+
+FLUSH_BUDGET = 64 * 1024
+
+
+def _whole(packet: Packet) -> bool:
+    """the response is all in memory, or there is none to write at all"""
+
+    return (response := packet.response_http) is None or not (response.streaming or isinstance(response.body, FileBody))
+
+
+@dataclass(eq=False)
+class _Stream:
+    connection: Connection
+
+    # the responses up for writing, front first, and the ones already written that the pipeline doesn't know about yet
+    writing: collections.deque[Packet] = field(default_factory=collections.deque)
+    written: list[Packet] = field(default_factory=list)
+
+    # the whole responses all of whose bytes are in outgoing
+    gathered: list[Packet] = field(default_factory=list)
+
+    outgoing: list[memoryview] | FileBody | None = None
+    parts: Iterator[tuple[bytes | memoryview, ...] | FileBody] | None = None
+
+    # whether the callback of the request whose body is still arriving was already looked up
+    peeked: bool = False
+    # the socket is the awaiter's while it reads a body off it
+    offloaded: bool = False
+
+    def fileno(self) -> int:
+        return self.connection.fileno()
+
+
+class _Loop:
+    _run_config: RunConfig
+    _shut_down: threading.Event
+
+    _dispatcher: Dispatcher
+    _awaiter: Awaiter
+
+    _socket: socket.socket
+    _selector: selectors.BaseSelector
+    _idle: dict[_Stream, float]
+    _awaited: queue.SimpleQueue[tuple[_Stream, Packet]]
+    _waker: tuple[socket.socket, socket.socket]
+
+    # every open connection, including the ones handed off to the awaiter, so a stop knows what it is waiting for
+    _streams: set[_Stream]
+    _deadline: float = math.inf
+
+    # requests handed off to the awaiter and back again, both only written by this loop's thread
+    handed_off: int = 0
+    resumed: int = 0
+
+    def __init__(self, run_config: RunConfig, shut_down: threading.Event, dispatcher: Dispatcher, listener: socket.socket, awaiter: Awaiter) -> None:
+        self._run_config = run_config
+        self._shut_down = shut_down
+        self._dispatcher = dispatcher
+        self._awaiter = awaiter
+        self._socket = listener
+
+        self._selector = selectors.DefaultSelector()
+        self._idle = {}
+        self._awaited = queue.SimpleQueue()
+        self._waker = socket.socketpair()
+        self._waker[1].setblocking(False)
+
+        self._streams = set()
+
+    def run(self) -> None:
+        self._selector.register(self._socket, selectors.EVENT_READ)
+        self._selector.register(self._waker[0], selectors.EVENT_READ)
+
+        while not self._shut_down.is_set():
+            self._run_once(None)
+
+        # the listener is the server's, it outlives a generation of workers on a reload
+        self._selector.unregister(self._socket)
+
+        # one last look, so requests already sent on connections still counted as idle make it in
+        self._run_once(time.monotonic())
+
+        for stream in list(self._idle):
+            self._close(stream)
+
+        # draining, whatever is still open has a request in flight
+        while self._streams and time.monotonic() < self._deadline:
+            self._run_once(self._deadline)
+
+        for stream in list(self._streams):
+            self._close(stream)
+
+        self._selector.close()
+
+    def _run_once(self, deadline: float | None) -> None:
+        for deadline_ in self._idle.values():
+            deadline = min(deadline_, deadline) if deadline is not None else deadline_
+            break
+
+        for key, events in self._selector.select(max(0.0, deadline - time.monotonic()) if deadline is not None else None):
+            if key.fileobj is self._socket:
+                self._accept()
+            elif key.fileobj is self._waker[0]:
+                self._wake_up()
+            else:
+                self._process(key.data, events)
+
+        self._expire_idle()
+
+    def stop(self, deadline: float) -> None:
+        self._deadline = deadline
+        self._wake()
+
+    def _close(self, stream: _Stream) -> None:
+        self._idle.pop(stream, None)
+        self._streams.discard(stream)
+
+        try:
+            self._selector.unregister(stream)
+        except KeyError:
+            pass  # handed off to the awaiter
+
+        stream.connection.close()
+
+    def _accept(self) -> None:
+        try:
+            conn, addr = self._socket.accept()
+        except BlockingIOError:
+            return  # another loop got to it first
+
+        conn.setblocking(False)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        stream = _Stream(Connection(conn, Requester(IP(tuple(map(int, addr[0].split('.')))), addr[1]), buffer_size=self._run_config.buffer_size, head_limit=self._run_config.head_limit, max_body_size=self._run_config.max_body_size))
+        self._selector.register(stream, selectors.EVENT_READ, stream)
+        self._streams.add(stream)
+        self._idle[stream] = time.monotonic() + self._run_config.keep_alive_timeout
+
+    def _process(self, stream: _Stream, events: int) -> None:
+        self._idle.pop(stream, None)
+
+        try:
+            if events & selectors.EVENT_WRITE:
+                self._flush(stream)
+            elif events & selectors.EVENT_READ and not stream.connection.fill():
+                stream.connection.keep_alive = False
+
+            # requests that arrived back-to-back are already waiting in the buffer
+            self._serve(stream)
+        except (OSError, InvalidHTTPPacket):
+            self._abort(stream)
+
+        self._settle(stream)
+
+    def _abort(self, stream: _Stream) -> None:
+        stream.connection.keep_alive = False
+        stream.connection.pipeline.close()
+
+        stream.outgoing = stream.parts = None
+        stream.writing.clear()
+        stream.written.clear()
+        stream.gathered.clear()
+
+    def _settle(self, stream: _Stream) -> None:
+        connection = stream.connection
+
+        if connection.pipeline and not connection.pipeline.closed:
+            self._watch(stream)
+            return  # still being worked on, awaited or written
+
+        if not connection.keep_alive or connection.pipeline.closed or self._shut_down.is_set():
+            self._close(stream)
+        else:
+            # connections go idle in order, so the oldest deadlines stay at the front
+            self._idle[stream] = time.monotonic() + self._run_config.keep_alive_timeout
+            self._watch(stream)
+
+    def _watch(self, stream: _Stream) -> None:
+        """writes while a response is going out, reads while the connection takes more requests, neither while it only waits"""
+
+        if stream.offloaded:
+            return
+
+        connection = stream.connection
+
+        if stream.outgoing is not None or stream.parts is not None:
+            events = selectors.EVENT_WRITE
+        # a whole request left waiting in the buffer is enough, reading more behind it would only pile them up
+        elif connection.keep_alive and ((last := connection.pipeline.last) is None or (pipelines(last, self._run_config) and not connection.buffered)):
+            events = selectors.EVENT_READ
+        else:
+            events = 0
+
+        try:
+            registered = self._selector.get_key(stream).events
+        except KeyError:
+            registered = 0
+
+        if events == registered:
+            return
+        elif not events:
+            self._selector.unregister(stream)
+        elif not registered:
+            self._selector.register(stream, events, stream)
+        else:
+            self._selector.modify(stream, events, stream)
+
+    def _serve(self, stream: _Stream) -> None:
+        connection = stream.connection
+
+        while connection.keep_alive and not connection.pipeline.closed:
+            try:
+                if (last := connection.pipeline.last) is not None:
+                    # only whole requests of safe methods go past the ones in flight, anything else waits for them to be done
+                    if not pipelines(last, self._run_config) or not overlaps(connection):
+                        return
+
+                    request = connection.next_request()
+                elif (request := connection.next_request()) is None:
+                    if not connection.awaiting_body or stream.peeked:
+                        return
+
+                    stream.peeked = True
+
+                    if not self._streams_body(connection):
+                        return  # the body is waited for right here, in the buffer
+
+                    request = connection.next_request(partial=True)
+            except InvalidHTTPPacket:
+                request = None  # handle() runs into it again, and answers
+
+            (packet := Packet(connection, _req_body=request)).mark(PacketState.Receiving)
+            connection.pipeline.push(packet)
+            stream.peeked = False
+
+            if connection.unread != 0:
+                # the rest of the body gets read blocking, off this loop
+                self._selector.unregister(stream)
+                stream.offloaded = True
+                self.handed_off += 1
+                connection.socket.settimeout(self._run_config.keep_alive_timeout)
+                self._awaiter.offload(lambda: handle(packet, self._dispatcher, self._run_config), lambda: self._resume(stream, packet))
+                return
+
+            if (pending := handle(packet, self._dispatcher, self._run_config)) is not None:
+                # finishes on the awaiter's loop, the requests behind it carry on in the meantime if they can
+                self.handed_off += 1
+                self._awaiter.submit(pending, lambda packet=packet: self._resume(stream, packet))
+                continue
+
+            self._ready(stream, packet)
+
+    def _streams_body(self, connection: Connection) -> bool:
+        try:
+            request = HTTPRequest.from_bytes(connection.head())
+            callback, _ = self._dispatcher.dispatch(request.path, request.method)
+        except Exception:
+            return False  # whatever is wrong, handle() tells once the whole request is here
+
+        return callback.streams_body
+
+    def _ready(self, stream: _Stream, packet: Packet) -> None:
+        stream.writing.extend(stream.connection.pipeline.finish(packet))
+
+        if stream.outgoing is None and stream.parts is None:
+            self._flush(stream)
+
+    def _resume(self, stream: _Stream, packet: Packet) -> None:
+        # called from the awaiter's loop, the selector itself is only ever touched by this loop's thread
+        self._awaited.put((stream, packet))
+        self._wake()
+
+    def _wake(self) -> None:
+        try:
+            self._waker[1].send(b'\0')
+        except BlockingIOError:
+            pass  # it is already woken up enough
+        except OSError:
+            pass  # the loop is already gone
+
+    def _wake_up(self) -> None:
+        self._waker[0].recv(BUFFER_SIZE)
+
+        while True:
+            try:
+                stream, packet = self._awaited.get_nowait()
+            except queue.Empty:
+                break
+
+            self.resumed += 1
+
+            if stream not in self._streams:
+                continue  # a response ahead of it closed the connection in the meantime
+
+            if stream.offloaded:
+                stream.offloaded = False
+                stream.connection.socket.setblocking(False)
+
+            try:
+                self._ready(stream, packet)
+                self._serve(stream)
+            except (OSError, InvalidHTTPPacket):
+                self._abort(stream)
+
+            self._settle(stream)
+
+    def _flush(self, stream: _Stream) -> None:
+        global logger
+
+        connection = stream.connection
+        budget = FLUSH_BUDGET
+
+        while True:
+            if stream.outgoing is None:
+                if stream.parts is None:
+                    if not stream.writing:
+                        return
+
+                    if not self._gather(stream):
+                        stream.parts = stream.writing[0].response_parts()
+
+                if stream.parts is not None:
+                    try:
+                        part = next(stream.parts)
+                        stream.outgoing = part if isinstance(part, FileBody) else [memoryview(buffer) for buffer in part]
+                    except StopIteration:
+                        stream.parts = None
+                        self._sent(stream, stream.writing.popleft())
+                        self._next_up(stream)
+                        continue
+                    except Exception as exc:
+                        # the head is already out, all that is left is to cut the body short
+                        logger.warning(f"{stream.writing[0]} - response stream broke off: {exc!r}")
+                        stream.writing[0].mark(PacketState.Sent)
+                        raise ConnectionAbortedError() from exc
+
+            try:
+                if isinstance(stream.outgoing, FileBody):
+                    before = len(stream.outgoing)
+                    stream.outgoing = connection.send_file(stream.outgoing)
+                else:
+                    before = sum(map(len, stream.outgoing))
+                    # head and body, a chunk and its framing, or a run of whole responses in one syscall without gluing them together first
+                    stream.outgoing = connection.send(stream.outgoing)
+            except BlockingIOError:
+                pass
+
+            if stream.outgoing:
+                # the socket buffer is full, the next part is only pulled once it drains
+                return
+
+            stream.outgoing = None
+
+            if stream.gathered:
+                for packet in stream.gathered:
+                    self._sent(stream, packet)
+
+                stream.gathered = []
+                self._next_up(stream)
+
+            if (budget := budget - before) <= 0:
+                # a long stream gives the other connections their turn before going on
+                return
+
+    @staticmethod
+    def _gather(stream: _Stream) -> bool:
+        """puts the whole responses at the front up for writing all at once, False if the front one is streamed"""
+
+        buffers = []
+
+        while stream.writing and _whole(stream.writing[0]):
+            stream.gathered.append(packet := stream.writing.popleft())
+
+            for part in packet.response_parts():
+                buffers.extend(map(memoryview, part))
+
+            if packet.closes:
+                break
+
+        if not stream.gathered:
+            return False
+
+        stream.outgoing = buffers
+        return True
+
+    @staticmethod
+    def _sent(stream: _Stream, packet: Packet) -> None:
+        stream.written.append(packet)
+
+        if packet.response_http is not None:
+            packet.mark(PacketState.Sent)
+
+        if packet.closes:
+            # the client was told there is nothing more coming, whatever is behind it is dropped
+            stream.connection.keep_alive = False
+            stream.connection.pipeline.close()
+            stream.writing.clear()
+
+    @staticmethod
+    def _next_up(stream: _Stream) -> None:
+        if not stream.writing:
+            # whatever got ready behind the written ones in the meantime goes right after them
+            stream.writing.extend(stream.connection.pipeline.written(stream.written) or ())
+            stream.written = []
+
+    def _expire_idle(self) -> None:
+        now = time.monotonic()
+
+        while self._idle:
+            stream, deadline = next(iter(self._idle.items()))
+
+            if deadline > now:
+                break
+
+            self._close(stream)
+
+
+class EventLoop:
+    """accepts, reads, dispatches and writes on selector loops, one per worker, all sharing the same listener"""
+
+    _socket: socket.socket
+    _shut_down: threading.Event
+
+    _loops: list[_Loop]
+    _loop_threads: list[threading.Thread]
+
+    def __init__(self, run_config: RunConfig, shut_down: threading.Event, dispatcher: Dispatcher, listener: socket.socket, awaiter: Awaiter) -> None:
+        self._socket = listener
+        self._shut_down = shut_down
+
+        self._loops = [_Loop(run_config, shut_down, dispatcher, listener, awaiter) for _ in range(run_config.workers)]
+        self._loop_threads = [threading.Thread(target=loop.run) for loop in self._loops]
+
+    @property
+    def in_flight(self) -> int:
+        return sum(loop.handed_off - loop.resumed for loop in self._loops)
+
+    def start(self) -> None:
+        global logger
+
+        logger.info(f"launching {len(self._loop_threads)} event loop(s) on {':'.join(map(str, self._socket.getsockname()))}")
+        for loop_thread in self._loop_threads:
+            loop_thread.start()
+
+    def stop(self, deadline: float) -> None:
+        """stops accepting, the requests in flight still get their responses until the deadline"""
+
+        self._shut_down.set()
+
+        for loop in self._loops:
+            loop.stop(deadline)
+
+    def join(self, deadline: float) -> bool:
+        for loop_thread in self._loop_threads:
+            loop_thread.join(max(0.0, deadline - time.monotonic()))
+
+        return not any(loop_thread.is_alive() for loop_thread in self._loop_threads)
+
+    @property
+    def is_working(self) -> bool:
+        return any(loop_thread.is_alive() for loop_thread in self._loop_threads) and not self._shut_down.is_set()
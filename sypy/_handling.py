@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+from typing import Coroutine, Any
+
+from ._config import RunConfig
+from ._dispatcher import Dispatcher, DispatcherNotAllowed, DispatcherNotFound
+from ._dispatcher.callback import Calls
+from ._packet import Packet, PacketState, Connection
+from ._body import BodyStream
+from ._cache import ResponseCache, CacheKey
+from ._compression import Compressor
+from . import _tracing
+from .http import HTTPResponse, HTTPStatus, HTTPException, HTTPMethod, Headers, InvalidHTTPPacket, HeadTooLarge, ContentTooLarge, EmptyPacket
+from ._logging import logger
+
+
+# safe methods, pipelined requests are only worked on at once if they are all one of these - rfc 9112 section 9.3.2
+_OVERLAPPING = {HTTPMethod.GET, HTTPMethod.HEAD, HTTPMethod.OPTIONS}
+
+
+def handle(packet: Packet, dispatcher: Dispatcher, run_config: RunConfig) -> Coroutine[Any, Any, None] | None:
+    """fills in the packet's response, unless the callback is async - then the returned coroutine does it once awaited"""
+
+    global logger
+
+    pending = None
+    cache, key = None, None
+    compressor = None
+    profile = None
+
+    packet.mark(PacketState.Processing)
+
+    try:
+        try:
+            request_http = packet.request_http
+        except InvalidHTTPPacket as exc:
+            raise _rejection(packet, exc) from None
+        except OSError as exc:
+            # the client went away or idled for too long, there is no one to respond to
+            logger.debug(f"{packet} - dropped: {exc!r}")
+            return
+
+        try:
+            callback, request_http.path_params = dispatcher.dispatch(request_http.path, request_http.method)
+        except DispatcherNotFound:
+            raise HTTPException(HTTPStatus.NotFound) from None
+        except DispatcherNotAllowed:
+            raise HTTPException(HTTPStatus.MethodNotAllowed) from None
+        else:
+            packet.route = callback.route
+            compressor = callback.compressor
+            connection = packet.connection
+
+            if _tracing.enabled:
+                packet.mark(PacketState.Dispatched)
+            # async ones are left out, they run on the awaiter's loop along with everything else awaiting there
+            if _tracing.profiler is not None and not callback.is_async:
+                profile = _tracing.profiler.start(callback.route)
+
+            try:
+                if callback.streams_body:
+                    request_http.body = BodyStream(request_http.body, connection if connection.unread != 0 else None, run_config.max_body_size)
+                elif connection.unread != 0:
+                    # the head was handed out ahead of its body, the rest of it is read right here
+                    request_http.body = BodyStream(request_http.body, connection, run_config.max_body_size).read()
+            except InvalidHTTPPacket as exc:
+                raise _rejection(packet, exc) from None
+            except OSError as exc:
+                logger.debug(f"{packet} - dropped: {exc!r}")
+                return
+
+            if (cache := callback.cache) is not None:
+                key = cache.key(request_http)
+
+                if (cached := cache.respond(key, request_http)) is not None:
+                    # the callback is not called at all
+                    packet.response_http = cached
+                    return
+
+            try:
+                response_http = callback(request_http, Calls(lambda: packet.mark(PacketState.Executing), lambda: packet.mark(PacketState.Executed)))
+            except Exception as exc:
+                raise _to_http_exception(exc, run_config) from exc.__context__ if isinstance(exc, HTTPException) else None
+
+            if callback.is_async:
+                pending = _handle_async(packet, response_http, run_config, cache, key, compressor)
+            elif cache is not None:
+                packet.response_http = cache.store(key, request_http, response_http)
+            else:
+                packet.response_http = response_http
+    except HTTPException as http_exc:
+        packet.response_http = _from_http_exception(packet, http_exc, cache, key)
+    finally:
+        if pending is None:
+            _finish(packet, run_config, compressor)
+        if profile is not None:
+            _tracing.profiler.stop(profile, packet.route)
+
+    return pending
+
+
+async def _handle_async(packet: Packet, pending: Coroutine[Any, Any, HTTPResponse], run_config: RunConfig, cache: ResponseCache | None, key: CacheKey | None, compressor: Compressor | None) -> None:
+    try:
+        try:
+            response_http = await pending
+        except Exception as exc:
+            raise _to_http_exception(exc, run_config) from exc.__context__ if isinstance(exc, HTTPException) else None
+
+        packet.response_http = cache.store(key, packet.request_http, response_http) if cache is not None else response_http
+    except HTTPException as http_exc:
+        packet.response_http = _from_http_exception(packet, http_exc, cache, key)
+    finally:
+        _finish(packet, run_config, compressor)
+
+
+def _finish(packet: Packet, run_config: RunConfig, compressor: Compressor | None) -> None:
+    # after the cache, which keeps the plain body, every client gets it compressed its own way
+    if compressor is not None and packet.response_http is not None:
+        packet.response_http = compressor.apply(packet.request_http, packet.response_http)
+
+    negotiate_connection(packet, run_config)
+
+    if _tracing.enabled:
+        packet.mark(PacketState.Finished)
+
+
+def _from_http_exception(packet: Packet, http_exc: HTTPException, cache: ResponseCache | None, key: CacheKey | None) -> HTTPResponse:
+    response_http = HTTPResponse(http_exc.status_code, http_exc.headers or Headers(), http_exc.body)
+
+    # a raised 404 or redirect is as much the route's answer as a returned one
+    if cache is not None and key is not None:
+        return cache.store(key, packet.request_http, response_http)
+
+    return response_http
+
+
+def _rejection(packet: Packet, exc: InvalidHTTPPacket) -> HTTPException:
+    global logger
+
+    if isinstance(exc, EmptyPacket):
+        return HTTPException(HTTPStatus.BadRequest, "its empty bro")
+
+    logger.warning(f"{packet} - {exc}")
+
+    if isinstance(exc, HeadTooLarge):
+        return HTTPException(HTTPStatus.RequestHeaderFieldsTooLarge, str(exc))
+    elif isinstance(exc, ContentTooLarge):
+        return HTTPException(HTTPStatus.ContentTooLarge, str(exc))
+    else:
+        return HTTPException(HTTPStatus.BadRequest, str(exc))
+
+
+def _to_http_exception(exc: Exception, run_config: RunConfig) -> HTTPException:
+    # ignore HTTPExceptions
+    if isinstance(exc, HTTPException):
+        return exc
+
+    # a streamed body can turn out to be broken only once the callback reads it
+    if isinstance(exc, ContentTooLarge):
+        return HTTPException(HTTPStatus.ContentTooLarge, str(exc))
+    elif isinstance(exc, InvalidHTTPPacket):
+        return HTTPException(HTTPStatus.BadRequest, str(exc))
+
+    return HTTPException(HTTPStatus.InternalServerError, f"{type(exc).__name__}: {exc}" if run_config.exposing else "contact administration pls")
+
+
+def negotiate_connection(packet: Packet, run_config: RunConfig) -> None:
+    connection = packet.connection
+    connection.served += 1
+
+    if packet.response_http is None or not packet.parsed:
+        connection.keep_alive = False
+    else:
+        tokens = {token.strip().lower() for token in packet.request_http.headers.get('connection', '').split(',')}
+
+        # whatever of the body nobody read is still in the way of the next request
+        connection.keep_alive = (run_config.keep_alive
+                                 and connection.keep_alive
+                                 and connection.unread == 0
+                                 and 'close' not in tokens
+                                 and connection.served < run_config.keep_alive_requests)
+
+    if packet.response_http is not None:
+        packet.response_http.headers['connection'] = 'keep-alive' if connection.keep_alive else 'close'
+
+
+def pipelines(packet: Packet, run_config: RunConfig) -> bool:
+    """whether the next request on the packet's connection can be taken before the packet's response is out"""
+
+    connection = packet.connection
+
+    if (not packet.parsed
+            or packet.request_http.method not in _OVERLAPPING
+            or connection.unread != 0
+            or not connection.keep_alive
+            or len(connection.pipeline) >= run_config.pipeline_depth
+            # the ones in flight count towards the limit already, the connection is closed after them anyway
+            or connection.served + len(connection.pipeline) >= run_config.keep_alive_requests):
+        return False
+
+    return 'close' not in {token.strip().lower() for token in packet.request_http.headers.get('connection', '').split(',')}
+
+
+def overlaps(connection: Connection) -> bool:
+    """a whole request is waiting in the connection's buffer, and it is safe to start it alongside the ones in flight"""
+
+    if not connection.buffered:
+        return False
+
+    method, _, _ = connection.peek(len('OPTIONS ')).partition(b' ')
+    return method.decode('latin-1') in _OVERLAPPING
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import os
+import socket
+
+from ._config import RunConfig
+
+
+def open_listener(run_config: RunConfig, reuse_port: bool = False) -> socket.socket:
+    host = ('0.0.0.0' if run_config.listen else '127.0.0.1', run_config.port)
+
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+    if os.name != 'nt':
+        # server-side closes leave the port in TIME_WAIT, which would otherwise block restarts
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    if reuse_port:
+        # every worker process binds its own listener and the kernel spreads connections between them
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    s.bind(host)
+    s.listen()
+    s.setblocking(False)
+
+    return s
@@ -1,3 +1,4 @@
+import atexit
 import logging
 import logging.handlers
 import queue
@@ -14,4 +15,35 @@ _handler = logging.StreamHandler()
 _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s - %(message)s"))
 
 _queue_listener = logging.handlers.QueueListener(_logging_queue, _handler)
-_queue_listener.start()  # TODO make it stoppable, somehow
+_queue_listener.start()
+
+_listeners = [_queue_listener]
+
+
+def forward(queue_: queue.Queue) -> None:
+    """sends this (forked) process' records to a listener in another process instead"""
+    logger.removeHandler(_queue_handler)
+    logger.addHandler(logging.handlers.QueueHandler(queue_))
+
+
+def listen(queue_: queue.Queue) -> logging.handlers.QueueListener:
+    (listener := logging.handlers.QueueListener(queue_, _handler)).start()
+    _listeners.append(listener)
+    return listener
+
+
+def stop_listening(listener: logging.handlers.QueueListener) -> None:
+    # a multiprocessing queue can't be written to at exit anymore, it needs a thread for that
+    _listeners.remove(listener)
+    listener.stop()
+
+
+def shutdown() -> None:
+    """stops the listeners, what they still have queued is written out first"""
+
+    while _listeners:
+        _listeners.pop().stop()
+
+
+# the listener threads are daemons, without this whatever was logged last could just vanish
+atexit.register(shutdown)
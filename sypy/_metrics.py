@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import bisect
+import threading
+from dataclasses import dataclass, field
+from typing import Iterable, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ._packet import Packet
+
+
+# seconds, the usual prometheus ones with a finer start, most requests are done in well under a millisecond
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# route label of whatever didn't match any route
+UNMATCHED = '-'
+
+_STAGES = {
+    'sypy_request_queued_seconds': "time from the request being picked up off the socket to a worker getting to it",
+    'sypy_request_handler_seconds': "time spent in the callback itself",
+    'sypy_request_duration_seconds': "time from the request being picked up off the socket to the response being sent",
+}
+
+# flipped on by the server, recording costs nothing until then
+enabled = False
+
+
+@dataclass(eq=False)
+class _Shard:
+    """what one thread saw, only that thread ever writes to it"""
+
+    # (route, method, status) -> count
+    responses: dict[tuple[str, str, int], int] = field(default_factory=dict)
+    # (metric, route) -> a count per bucket, then the count over the last bucket, then the sum
+    histograms: dict[tuple[str, str], list[float]] = field(default_factory=dict)
+
+    def observe(self, metric: str, route: str, seconds: float) -> None:
+        if (histogram := self.histograms.get(key := (metric, route))) is None:
+            histogram = self.histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+
+        histogram[bisect.bisect_left(BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+
+
+_local = threading.local()
+_shards: list[_Shard] = []
+_shards_lock = threading.Lock()
+
+
+def _shard() -> _Shard:
+    try:
+        return _local.shard
+    except AttributeError:
+        _local.shard = shard = _Shard()
+
+        # once per thread, the only time a lock is taken
+        with _shards_lock:
+            _shards.append(shard)
+
+        return shard
+
+
+def record(packet: Packet) -> None:
+    stats, shard = packet.stats, _shard()
+    route = packet.route or UNMATCHED
+
+    key = (route, packet.request_http.method if packet.parsed else UNMATCHED, packet.response_http.status.value)
+    shard.responses[key] = shard.responses.get(key, 0) + 1
+
+    if stats.processing is not None:
+        shard.observe('sypy_request_queued_seconds', route, stats.processing - stats.receiving)
+    if stats.executed is not None:
+        shard.observe('sypy_request_handler_seconds', route, stats.executed - stats.executing)
+
+    shard.observe('sypy_request_duration_seconds', route, stats.sent - stats.receiving)
+
+
+type Sample = tuple[dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ''
+
+    return f"{{{','.join(f'{name}="{_escape(value)}"' for name, value in labels.items())}}}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def render(gauges: Iterable[tuple[str, str, str, list[Sample]]] = ()) -> str:
+    """everything recorded so far merged across threads, plus the given (name, type, help, samples), as prometheus text"""
+
+    responses: dict[tuple[str, str, int], int] = {}
+    histograms: dict[tuple[str, str], list[float]] = {}
+
+    with _shards_lock:
+        shards = list(_shards)
+
+    for shard in shards:
+        # copying a dict is a single step for the interpreter, the writing thread can't change it halfway through
+        for key, count in shard.responses.copy().items():
+            responses[key] = responses.get(key, 0) + count
+        for key, histogram in shard.histograms.copy().items():
+            merged = histograms.setdefault(key, [0] * len(histogram))
+            for i, value in enumerate(list(histogram)):
+                merged[i] += value
+
+    lines = [
+        "# HELP sypy_responses_total responses sent, by route, method and status",
+        "# TYPE sypy_responses_total counter",
+    ]
+    for (route, method, status), count in sorted(responses.items()):
+        lines.append(f"sypy_responses_total{_labels({'route': route, 'method': method, 'status': str(status)})} {count}")
+
+    for metric, description in _STAGES.items():
+        lines += [f"# HELP {metric} {description}", f"# TYPE {metric} histogram"]
+
+        for (_, route), histogram in sorted((key, histogram) for key, histogram in histograms.items() if key[0] == metric):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_labels({'route': route, 'le': repr(bound)})} {cumulative}")
+
+            cumulative += histogram[len(BUCKETS)]
+            lines += [
+                f"{metric}_bucket{_labels({'route': route, 'le': '+Inf'})} {cumulative}",
+                f"{metric}_sum{_labels({'route': route})} {histogram[-1]!r}",
+                f"{metric}_count{_labels({'route': route})} {cumulative}",
+            ]
+
+    for name, type_, description, samples in gauges:
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {type_}"]
+        lines += [f"{name}{_labels(labels)} {_number(value)}" for labels, value in samples]
+
+    return '\n'.join(lines) + '\n'
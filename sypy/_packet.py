@@ -1,26 +1,41 @@
 from __future__ import annotations
+import collections
+import os
+import re
 import socket
+import threading
 import time
 from dataclasses import dataclass, field
 from enum import StrEnum
-from typing import overload
+from typing import overload, Iterator
 
-from .http import HTTPResponse, HTTPRequest
-from ._logging import logger
+from .http import HTTPResponse, HTTPRequest, FileBody, InvalidHTTPPacket, InvalidContentLength, HeadTooLarge, ContentTooLarge, MalformedChunk, IncompleteBody
+from . import _metrics, _access, _tracing
 
 
 class PacketState(StrEnum):
     Receiving = 'receiving'
+    Processing = 'processing'
+    # these four only once there is something tracing the stages
+    Received = 'received'
+    Parsed = 'parsed'
+    Dispatched = 'dispatched'
     Executing = 'executing'
     Executed = 'executed'
+    Finished = 'finished'
     Sent = 'sent'
 
 
 @dataclass
 class PacketStats:
     receiving: float | None = None
+    processing: float | None = None
+    received: float | None = None
+    parsed: float | None = None
+    dispatched: float | None = None
     executing: float | None = None
     executed: float | None = None
+    finished: float | None = None
     sent: float | None = None
 
     def __str__(self) -> str:
@@ -56,15 +71,347 @@ class Requester:
 
 
 BUFFER_SIZE = 4096
+HEAD_LIMIT = 64 * 1024
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+# no sendmsg on windows, the buffers get joined there
+_SENDMSG = hasattr(socket.socket, 'sendmsg')
+# nor sendfile, the file is read in pieces there
+_SENDFILE = hasattr(os, 'sendfile')
+# the most buffers a single sendmsg takes, the usual limit on linux and the bsds
+_IOV_MAX = 1024
+# rfc 9110 section 8.6, digits only - no sign, no underscores, not a list of them
+_CONTENT_LENGTH = re.compile(rb'[0-9]+')
+
+
+def _framing(head: bytes | bytearray | memoryview) -> tuple[int, bool]:
+    """content-length and whether the body is chunked"""
+
+    length, chunked = None, False
+
+    for line in bytes(head).split(b'\r\n'):
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+
+        if name == b'content-length':
+            value = value.strip(b' \t')
+
+            # two that disagree leave it up to whoever reads them which one counts
+            if _CONTENT_LENGTH.fullmatch(value) is None or length is not None and int(value) != length:
+                raise InvalidContentLength(value.decode('latin-1'))
+
+            length = int(value)
+        elif name == b'transfer-encoding':
+            chunked = value.strip().lower().endswith(b'chunked')
+
+    # a chunked body says where it ends by itself, content-length is to be ignored then
+    return (0 if chunked or length is None else length), chunked
+
+
+class Pipeline:
+    """the requests taken off a connection whose responses are not out yet, in the order they came in
+
+    any number of them can be worked on at once, the responses are written strictly front to back"""
+
+    _packets: collections.deque[Packet]
+    _lock: threading.Lock
+
+    # whether someone is writing the front ones out right now, nobody else touches the socket then
+    _writing: bool
+    # a response told the client the connection is done for, the ones behind it are never written
+    closed: bool
+
+    def __init__(self) -> None:
+        self._packets = collections.deque()
+        self._lock = threading.Lock()
+        self._writing = False
+        self.closed = False
+
+    def __len__(self) -> int:
+        return len(self._packets)
+
+    @property
+    def last(self) -> Packet | None:
+        return self._packets[-1] if self._packets else None
+
+    def push(self, packet: Packet) -> None:
+        with self._lock:
+            if not self.closed:
+                self._packets.append(packet)
+
+    def finish(self, packet: Packet) -> list[Packet]:
+        """marks the packet's response as ready, gives back the ones now up for writing - none if someone is writing already"""
+
+        with self._lock:
+            packet.ready = True
+
+            if self._writing:
+                return []  # whoever is writing picks it up once they get to it
+
+            return self._up_next()
+
+    def written(self, packets: list[Packet]) -> list[Packet] | None:
+        """takes the written ones off the front, gives back the next ones up, or None if that was the last of them all"""
+
+        with self._lock:
+            for _ in packets:
+                if self._packets:
+                    self._packets.popleft()
+
+            if (up_next := self._up_next()) or self._packets:
+                return up_next
+
+            return None
+
+    def close(self) -> None:
+        with self._lock:
+            self.closed = True
+            self._packets.clear()
+
+    def _up_next(self) -> list[Packet]:
+        if self.closed:
+            self._writing = False
+            return []
+
+        up_next = []
+        for packet in self._packets:
+            if not packet.ready:
+                break
+            up_next.append(packet)
+
+        self._writing = bool(up_next)
+        return up_next
+
+
+@dataclass(eq=False)
+class Connection:
+    socket: socket.socket
+    requester: Requester
+
+    served: int = 0
+    keep_alive: bool = True
+    pipeline: Pipeline = field(default_factory=Pipeline)
+
+    buffer_size: int = BUFFER_SIZE
+    head_limit: int = HEAD_LIMIT
+    max_body_size: int = MAX_BODY_SIZE
+
+    # received bytes at the front of the buffer that were not handed out as a request yet
+    pending: int = 0
+    _buffer: bytearray | None = None
+
+    # body bytes of the last handed out request that are still on the wire, None while a chunked one is not decoded to its end
+    unread: int | None = 0
+
+    # how far the head terminator was already looked for, and where the body starts and the request ends once it was found
+    _scanned: int = 0
+    _start: int = 0
+    _end: int | None = None
+    _chunked: bool = False
+
+    def _request_end(self) -> int | None:
+        if self._end is not None:
+            return self._end
+
+        if (head_end := self._buffer.find(b'\r\n\r\n', max(0, self._scanned - 3), self.pending)) == -1:
+            if self.pending > self.head_limit:
+                raise HeadTooLarge(self.head_limit)
+
+            self._scanned = self.pending
+            return None
+
+        if head_end > self.head_limit:
+            raise HeadTooLarge(self.head_limit)
+
+        with memoryview(self._buffer) as view:
+            length, self._chunked = _framing(view[:head_end])
+
+        if length > self.max_body_size:
+            raise ContentTooLarge(self.max_body_size)  # not a byte of it was read yet
+
+        self._start = head_end + 4
+        self._end = self._start + length
+
+        return self._end
+
+    @property
+    def awaiting_body(self) -> bool:
+        """the head is all here, the body is still on its way"""
+
+        return self._end is not None and self._end > self.pending
+
+    @property
+    def buffered(self) -> bool:
+        """a whole request is waiting in the buffer, body and all, it can be taken without reading a thing"""
+
+        try:
+            return self._buffer is not None and (end := self._request_end()) is not None and end <= self.pending and not self._chunked
+        except InvalidHTTPPacket:
+            return True  # taken all the same, handle() answers it
+
+    def peek(self, size: int) -> bytes:
+        """up to size bytes of what is waiting in the buffer, without taking any of it"""
+
+        return bytes(self._buffer[:min(size, self.pending)]) if self._buffer is not None else b''
+
+    def head(self) -> bytes:
+        return bytes(self._buffer[:self._start])
+
+    def fill(self) -> int:
+        """does a single recv into the buffer, first only as far as the end of the head, then exactly as much as content-length says"""
+
+        if self._buffer is None:
+            self._buffer = bytearray(self.buffer_size)
+
+        if (end := self._request_end()) is not None and end > self.pending:
+            return self._recv(end)
+
+        return self._recv()
+
+    def _recv(self, wanted: int | None = None) -> int:
+        buffer, filled = self._buffer, self.pending
+
+        if wanted is None:
+            wanted = len(buffer) if filled < len(buffer) else filled + self.buffer_size
+
+        if wanted > len(buffer):
+            buffer.extend(bytes(wanted - len(buffer)))
+
+        with memoryview(buffer) as view:
+            received = self.socket.recv_into(view[filled:wanted])
+
+        self.pending += received
+        return received
+
+    def next_request(self, partial: bool = False) -> bytes | None:
+        """a whole request, or with partial, its head and whatever of the body is here as soon as the head is complete"""
+
+        if self._buffer is None or (end := self._request_end()) is None:
+            return None
+
+        if end > self.pending and not partial:
+            return None
+
+        chunked, taken = self._chunked, min(end, self.pending)
+        request = self._take(taken)
+        self.unread = None if chunked else end - taken
+
+        return request
+
+    def receive(self) -> bytes:
+        while (request := self.next_request(partial=True)) is None:
+            if not self.fill():
+                # the client is done talking, take whatever there is
+                request, self.unread = self._take(self.pending), 0
+                return request
+
+        return request
+
+    def read(self, size: int) -> bytes:
+        """up to size bytes past the last handed out request, only the buffered ones if there are any"""
+
+        if self.pending:
+            return self._take(min(size, self.pending))
+
+        return self.socket.recv(size)
+
+    def read_line(self, limit: int) -> bytes:
+        if self._buffer is None:
+            self._buffer = bytearray(self.buffer_size)
+
+        while (end := self._buffer.find(b'\r\n', 0, self.pending)) == -1:
+            if self.pending > limit:
+                raise MalformedChunk(bytes(self._buffer[:limit]).decode('latin-1'))
+            if not self._recv():
+                raise IncompleteBody()
+
+        return self._take(end + 2)[:-2]
+
+    def _take(self, end: int) -> bytes:
+        if self._buffer is None:
+            return bytes()
+
+        buffer, filled = self._buffer, self.pending
+
+        with memoryview(buffer) as view:
+            request = bytes(view[:end])
+
+        self.pending = filled - end
+        buffer[:self.pending] = buffer[end:filled]
+
+        self._scanned, self._end, self._chunked = 0, None, False
+
+        if len(buffer) > self.buffer_size and self.pending <= self.buffer_size:
+            # dont keep a huge upload's worth of memory around for an idle connection
+            del buffer[self.buffer_size:]
+
+        return request
+
+    def send(self, buffers: list[memoryview]) -> list[memoryview]:
+        """a single write of as much as the socket takes of all the buffers, gives back whats left of them"""
+
+        sent = self.socket.sendmsg(buffers[:_IOV_MAX]) if _SENDMSG else self.socket.send(b''.join(buffers))
+
+        for i, buffer in enumerate(buffers):
+            if sent < len(buffer):
+                return [buffer[sent:], *buffers[i + 1:]]
+
+            sent -= len(buffer)
+
+        return []
+
+    def send_file(self, body: FileBody) -> FileBody:
+        """a single write of as much of the file as the socket takes, what is left of it stays in the body"""
+
+        if _SENDFILE:
+            sent = os.sendfile(self.socket.fileno(), body.file.fileno(), body.offset, body.count)
+        else:
+            body.file.seek(body.offset)
+            sent = self.socket.send(body.file.read(min(body.count, self.buffer_size)))
+
+        if sent == 0:
+            raise ConnectionAbortedError("the file got shorter while it was being sent")
+
+        body.offset += sent
+        body.count -= sent
+
+        return body
+
+    def send_all(self, part: tuple[bytes | memoryview, ...] | FileBody) -> None:
+        if isinstance(part, FileBody):
+            # blocking with a timeout, which socket.sendfile waits out by itself
+            if self.socket.sendfile(part.file, part.offset, part.count) < part.count:
+                raise ConnectionAbortedError("the file got shorter while it was being sent")
+
+            return
+
+        buffers = [memoryview(buffer) for buffer in part]
+
+        while buffers:
+            buffers = self.send(buffers)
+
+    def fileno(self) -> int:
+        return self.socket.fileno()
+
+    def close(self) -> None:
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+        self.socket.close()
 
 
 @dataclass
 class Packet:
-    requester: Requester
-    connection: socket.socket
+    connection: Connection
     stats: PacketStats = field(default_factory=PacketStats)
 
     response_http: HTTPResponse | None = None
+    # the template of the route it went to, if any
+    route: str | None = None
+    # the response is all there, it only waits for the ones ahead of it to go out
+    ready: bool = False
 
     _req_http: HTTPRequest | None = None
     _res_body: bytes | None = None
@@ -73,24 +420,29 @@ class Packet:
     @property
     def request_body(self) -> bytes:
         if self._req_body is None:
-            buffer: list[bytes] = []
+            self._req_body = self.connection.receive()
 
-            while True:
-                if data := self.connection.recv(BUFFER_SIZE):
-                    buffer.append(data)
+            if _tracing.enabled:
+                self.mark(PacketState.Received)
 
-                if len(data) < BUFFER_SIZE:
-                    break
+        return self._req_body
 
-            self._req_body = bytes([byte for bytes_ in buffer for byte in bytes_])
+    @property
+    def parsed(self) -> bool:
+        return self._req_http is not None
 
-        return self._req_body
+    @property
+    def requester(self) -> Requester:
+        return self.connection.requester
 
     @property
     def request_http(self) -> HTTPRequest:
         if self._req_http is None:
             self._req_http = HTTPRequest.from_bytes(self.request_body)
 
+            if _tracing.enabled:
+                self.mark(PacketState.Parsed)
+
         return self._req_http
 
     @property
@@ -103,16 +455,31 @@ class Packet:
 
         return self._res_body
 
-    def mark(self, state: PacketState) -> None:
-        global logger        
+    @property
+    def closes(self) -> bool:
+        """whether the connection is done for once this one's response is out"""
 
+        return self.response_http is None or self.response_http.headers.get('connection') == 'close'
+
+    def response_parts(self) -> Iterator[tuple[bytes | memoryview, ...]]:
+        if self.response_http is None:
+            return iter(())
+
+        return self.response_http.parts()
+
+    def mark(self, state: PacketState) -> None:
         if getattr(self.stats, state) is not None:
             raise RuntimeError("packet was already marked as receiving")
 
         setattr(self.stats, state, time.perf_counter())
 
         if state == PacketState.Sent:
-            logger.info(f"{self} - {self.stats}")
+            if _access.writer is not None:
+                _access.writer.record(self)
+            if _metrics.enabled:
+                _metrics.record(self)
+            if _tracing.enabled:
+                _tracing.record(self)
 
     def __str__(self) -> str:
         return (f"{self.requester} - "
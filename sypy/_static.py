@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import collections
+import email.utils
+import mimetypes
+import os
+import stat
+import threading
+import time
+from dataclasses import dataclass
+from typing import Annotated, Callable
+
+from ._cache import _matches
+from .http import HTTPResponse, HTTPStatus, HTTPException, Headers, FileBody
+from .parameters import Header
+
+
+# files up to this big are kept in memory whole, the rest is sent off the disk every time
+SMALL_FILE = 64 * 1024
+# at most this many files are remembered at once, the small ones with their contents
+CACHE_SIZE = 1024
+# seconds a stat result is trusted for, changes on the disk show up at most this late
+STAT_TTL = 1.0
+
+
+@dataclass(eq=False)
+class _File:
+    path: str
+    size: int
+    etag: str
+    mtime: int
+    last_modified: str
+    # what every response about it carries, copied for each of them
+    headers: Headers
+    # the whole file, if it is small enough
+    contents: bytes | None
+    expires: float
+
+
+def _segments(path: str) -> list[str] | None:
+    """None if the path tries to get out of the directory, or at something it shouldn't - no segments at all for the root itself"""
+
+    if not path:
+        return []
+
+    segments = path.split('/')
+
+    if any(segment in ('', '.', '..') or '\0' in segment or os.sep in segment or (os.altsep and os.altsep in segment) for segment in segments):
+        return None
+
+    return segments
+
+
+def _range(header: str, size: int) -> tuple[int, int] | None:
+    """the first and last byte of a single range, None for anything else - which means the whole file"""
+
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None  # multiple ranges would need a multipart body, the whole file will do just as well
+
+    first, separated, last = spec.strip().partition('-')
+
+    # digits only, int() would take a sign or whitespace too
+    if not separated or not (first or last) or not all(part.isascii() and part.isdigit() for part in (first, last) if part):
+        return None
+
+    if not first:
+        # the last n bytes, a suffix of none of them can't be satisfied rather than being invalid
+        return max(0, size - int(last)), size - 1
+
+    if last and int(last) < int(first):
+        return None  # invalid, and an invalid range is ignored rather than refused - rfc 9110 section 14.1.1
+
+    # one starting past the end is valid, only it can't be satisfied
+    return int(first), min(int(last), size - 1) if last else size - 1
+
+
+class StaticFiles:
+    """serves the files of a directory, a bounded cache keeps their stat results and the small ones' contents"""
+
+    _root: str
+
+    _files: collections.OrderedDict[str, _File]
+    _lock: threading.Lock
+
+    def __init__(self, directory: str | os.PathLike) -> None:
+        self._root = os.path.realpath(directory)
+
+        if not os.path.isdir(self._root):
+            raise ValueError(f"not a directory: {directory}")
+
+        self._files = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, path: str) -> _File:
+        with self._lock:
+            if (file := self._files.get(path)) is not None and file.expires > time.monotonic():
+                self._files.move_to_end(path)
+                return file
+
+        if (segments := _segments(path)) is None:
+            raise HTTPException(HTTPStatus.NotFound)
+
+        full_path = os.path.join(self._root, *segments)
+
+        try:
+            info = os.stat(full_path)
+
+            if stat.S_ISDIR(info.st_mode):
+                info = os.stat(full_path := os.path.join(full_path, 'index.html'))
+            if not stat.S_ISREG(info.st_mode):
+                raise FileNotFoundError(full_path)
+
+            # symlinks are followed only as long as they stay inside the directory
+            if not os.path.realpath(full_path).startswith(os.path.join(self._root, '')):
+                raise FileNotFoundError(full_path)
+
+            contents = None
+            if file is not None and file.etag == f'"{info.st_size:x}-{info.st_mtime_ns:x}"':
+                contents = file.contents  # unchanged, no need to read it again
+            elif info.st_size <= SMALL_FILE:
+                with open(full_path, 'rb') as f:
+                    contents = f.read()
+        except OSError:
+            with self._lock:
+                self._files.pop(path, None)
+
+            raise HTTPException(HTTPStatus.NotFound) from None
+
+        etag, last_modified = f'"{info.st_size:x}-{info.st_mtime_ns:x}"', email.utils.formatdate(info.st_mtime, usegmt=True)
+
+        file = _File(full_path, info.st_size, etag, int(info.st_mtime), last_modified, Headers({
+            'content-type': mimetypes.guess_type(full_path)[0] or 'application/octet-stream',
+            'etag': etag,
+            'last-modified': last_modified,
+            'accept-ranges': 'bytes',
+        }), contents, time.monotonic() + STAT_TTL)
+
+        with self._lock:
+            self._files[path] = file
+            self._files.move_to_end(path)
+
+            while len(self._files) > CACHE_SIZE:
+                self._files.popitem(last=False)
+
+        return file
+
+    def serve(self, path: str, head: bool, range_: str | None, if_none_match: str | None, if_modified_since: str | None, if_range: str | None) -> HTTPResponse:
+        file = self._lookup(path)
+
+        # always a copy, connection negotiation writes into the headers of whatever is sent
+        headers = Headers(file.headers)
+
+        # If-None-Match wins over If-Modified-Since when both are there, rfc 9110 section 13.1.3
+        if if_none_match is not None:
+            if _matches(file.etag, if_none_match):
+                return HTTPResponse(HTTPStatus.NotModified, headers, b'')
+        elif if_modified_since is not None:
+            try:
+                if file.mtime <= email.utils.parsedate_to_datetime(if_modified_since).timestamp():
+                    return HTTPResponse(HTTPStatus.NotModified, headers, b'')
+            except (TypeError, ValueError):
+                pass  # not a date, as if it wasn't there at all
+
+        first, last, status = 0, file.size - 1, HTTPStatus.OK
+
+        # a stale If-Range means the client wants the whole new file instead of a piece of it
+        if range_ is not None and (if_range is None or if_range in (file.etag, file.last_modified)):
+            if (byte_range := _range(range_, file.size)) is not None:
+                first, last = byte_range
+
+                if first >= file.size:
+                    dict.__setitem__(headers, 'content-range', f"bytes */{file.size}")
+                    return HTTPResponse(HTTPStatus.RangeNotSatisfiable, headers, b'')
+
+                dict.__setitem__(headers, 'content-range', f"bytes {first}-{last}/{file.size}")
+                status = HTTPStatus.PartialContent
+
+        if head:
+            return HTTPResponse(status, headers, FileBody(None, first, last + 1 - first))
+        elif file.contents is not None:
+            return HTTPResponse(status, headers, memoryview(file.contents)[first:last + 1])
+
+        try:
+            opened = open(file.path, 'rb')
+        except OSError:
+            with self._lock:
+                self._files.pop(path, None)
+
+            raise HTTPException(HTTPStatus.NotFound) from None
+
+        return HTTPResponse(status, headers, FileBody(opened, first, last + 1 - first))
+
+    def callback(self, head: bool) -> Callable[..., HTTPResponse]:
+        """a raw callback for the dispatcher, the conditional headers come in as header params"""
+
+        def serve_file(path: str,
+                       range: Annotated[str, Header] = None,
+                       if_none_match: Annotated[str, Header] = None,
+                       if_modified_since: Annotated[str, Header] = None,
+                       if_range: Annotated[str, Header] = None) -> HTTPResponse:
+            return self.serve(path, head, range, if_none_match, if_modified_since, if_range)
+
+        return serve_file
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import multiprocessing
+import multiprocessing.connection
+import multiprocessing.context
+import signal
+import socket
+import threading
+import time
+from typing import Callable
+
+from ._config import RunConfig
+from ._listener import open_listener
+from ._logging import logger, forward, listen, stop_listening
+
+
+RESPAWN_BACKOFF = 1.0
+
+
+class Supervisor:
+    """pre-forks worker processes, each running the whole engine, and respawns the ones that die"""
+
+    _run_config: RunConfig
+    _shut_down: threading.Event
+
+    _serve: Callable[[socket.socket], None]
+    _stop_serving: Callable[[float], None]
+
+    _context: multiprocessing.context.ForkContext
+    _log_queue: multiprocessing.Queue
+    _listener: socket.socket | None
+
+    _processes: list[multiprocessing.Process]
+    _spawned: list[float]
+    # the previous generation after a reload, draining until their deadline
+    _retiring: list[tuple[multiprocessing.Process, float]]
+
+    # stops and reloads asked for from signal handlers or other threads, done by the supervising thread itself
+    _requests: list[tuple[str, float]]
+    _waker: tuple[socket.socket, socket.socket]
+
+    # false in the worker processes, they have their copy of the supervisor too
+    supervising: bool = True
+    stopped: threading.Event
+
+    def __init__(self, run_config: RunConfig, shut_down: threading.Event, serve: Callable[[socket.socket], None], stop_serving: Callable[[float], None]) -> None:
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise NotImplementedError("no fork, no worker processes, sorry")
+
+        self._run_config = run_config
+        self._shut_down = shut_down
+        self._serve = serve
+        self._stop_serving = stop_serving
+
+        self._context = multiprocessing.get_context('fork')
+        self._log_queue = self._context.Queue()
+
+        # without SO_REUSEPORT all the workers accept from one listener inherited through fork
+        self._listener = None if hasattr(socket, 'SO_REUSEPORT') else open_listener(self._run_config)
+
+        self._processes = []
+        self._spawned = []
+        self._retiring = []
+
+        self._requests = []
+        self._waker = socket.socketpair()
+        # both ends, the supervising thread drains it after every wake up, most of which are a worker dying instead
+        for end in self._waker:
+            end.setblocking(False)
+        self.stopped = threading.Event()
+
+    @property
+    def is_working(self) -> bool:
+        return not self._shut_down.is_set() and any(process.is_alive() for process in self._processes)
+
+    def run(self) -> None:
+        global logger
+
+        log_listener = listen(self._log_queue)
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: self.stop(self._run_config.stop_timeout))
+            signal.signal(signal.SIGINT, lambda *_: self.stop(self._run_config.stop_timeout))
+            signal.signal(signal.SIGHUP, lambda *_: self.reload(self._run_config.stop_timeout))
+
+        logger.info(f"pre-forking {self._run_config.processes} worker processes")
+        for _ in range(self._run_config.processes):
+            self._processes.append(self._spawn())
+            self._spawned.append(time.monotonic())
+
+        # python refuses to fork once the main thread is done, so it stays here supervising
+        self._supervise()
+
+        stop_listening(log_listener)
+
+    def stop(self, timeout: float) -> None:
+        self._request('stop', timeout)
+
+        # signal handlers run on the supervising thread itself, it can't wait for itself
+        if threading.current_thread() is not threading.main_thread():
+            self.stopped.wait()
+
+    def reload(self, timeout: float) -> None:
+        self._request('reload', timeout)
+
+    def _request(self, what: str, timeout: float) -> None:
+        self._requests.append((what, timeout))
+
+        try:
+            self._waker[1].send(b'\0')
+        except BlockingIOError:
+            pass  # it is already woken up enough
+
+    def _spawn(self) -> multiprocessing.Process:
+        (process := self._context.Process(target=self._worker)).start()
+        return process
+
+    def _worker(self) -> None:
+        self.supervising = False
+        forward(self._log_queue)
+
+        stop = threading.Event()
+
+        # ctrl+c reaches the whole process group, it is up to the supervisor what happens then
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+        self._serve(self._listener or open_listener(self._run_config, reuse_port=True))
+
+        stop.wait()
+        self._stop_serving(self._run_config.stop_timeout)
+
+    def _supervise(self) -> None:
+        global logger
+
+        while not self._shut_down.is_set():
+            # until the first of the retiring ones is due, if there are any
+            timeout = max(0.0, min(deadline for _, deadline in self._retiring) - time.monotonic()) if self._retiring else None
+
+            multiprocessing.connection.wait([process.sentinel for process in self._processes] + [process.sentinel for process, _ in self._retiring] + [self._waker[0]], timeout)
+
+            self._handle_requests()
+            self._reap()
+
+            if self._shut_down.is_set():
+                break
+
+            for i, process in enumerate(self._processes):
+                if process.is_alive():
+                    continue
+
+                logger.warning(f"worker process {process.pid} died with exit code {process.exitcode}, respawning")
+
+                # a worker that dies right away would die again, dont turn it into a fork bomb
+                if (lived := time.monotonic() - self._spawned[i]) < RESPAWN_BACKOFF:
+                    time.sleep(RESPAWN_BACKOFF - lived)
+
+                self._processes[i] = self._spawn()
+                self._spawned[i] = time.monotonic()
+
+        self.stopped.set()
+
+    def _handle_requests(self) -> None:
+        global logger
+
+        try:
+            self._waker[0].recv(4096)
+        except BlockingIOError:
+            pass
+
+        while self._requests:
+            what, timeout = self._requests.pop(0)
+
+            if what == 'reload':
+                # the new ones are up before the old ones stop accepting, so there is always someone to take connections
+                logger.info(f"reloading, pre-forking {self._run_config.processes} new worker processes")
+                retiring, self._processes = self._processes, [self._spawn() for _ in range(self._run_config.processes)]
+                self._spawned = [time.monotonic()] * len(self._processes)
+
+                for process in retiring:
+                    process.terminate()
+                    self._retiring.append((process, time.monotonic() + timeout))
+            elif what == 'stop' and not self._shut_down.is_set():
+                logger.info("stopping, draining the worker processes")
+                self._shut_down.set()
+
+                for process in self._processes:
+                    process.terminate()
+                    self._retiring.append((process, time.monotonic() + timeout))
+
+                self._processes = []
+
+                while self._retiring:
+                    multiprocessing.connection.wait([process.sentinel for process, _ in self._retiring], max(0.0, min(deadline for _, deadline in self._retiring) - time.monotonic()))
+                    self._reap()
+
+                logger.info("stopped")
+
+    def _reap(self) -> None:
+        global logger
+
+        for process, deadline in list(self._retiring):
+            if process.is_alive() and time.monotonic() < deadline:
+                continue
+
+            if process.is_alive():
+                logger.warning(f"worker process {process.pid} didn't finish in time, killing it")
+                process.kill()
+
+            process.join()
+            self._retiring.remove((process, deadline))
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import atexit
+import collections
+import cProfile
+import itertools
+import os
+import random
+import re
+import threading
+from dataclasses import dataclass, field
+from enum import StrEnum
+from typing import Callable, TYPE_CHECKING
+
+from ._logging import logger
+
+if TYPE_CHECKING:
+    from ._config import RunConfig
+    from ._packet import Packet
+
+
+class Stage(StrEnum):
+    # picked up off the socket, waiting for a worker
+    Queued = 'queued'
+    # the rest of the request read off the socket, nothing left to read for the ones read whole ahead of time
+    Receive = 'receive'
+    Parse = 'parse'
+    Dispatch = 'dispatch'
+    # the rest of the body, the cache lookup, dependencies and the parameters
+    Bind = 'bind'
+    Handler = 'handler'
+    # the return value into a body, the cache, compression and the connection's headers
+    Serialize = 'serialize'
+    # waiting for the ones ahead of it, and the writing itself
+    Send = 'send'
+
+
+# the packet stat each stage ends on, in order - every stage starts where the one before it ended
+_ENDS = (
+    (Stage.Queued, 'processing'),
+    (Stage.Receive, 'received'),
+    (Stage.Parse, 'parsed'),
+    (Stage.Dispatch, 'dispatched'),
+    (Stage.Bind, 'executing'),
+    (Stage.Handler, 'executed'),
+    (Stage.Serialize, 'finished'),
+    (Stage.Send, 'sent'),
+)
+
+
+@dataclass(frozen=True)
+class Span:
+    stage: Stage
+    # perf_counter, comparable to each other and not much else
+    start: float
+    end: float
+
+    @property
+    def seconds(self) -> float:
+        return self.end - self.start
+
+
+type Hook = Callable[[Packet, list[Span]], None]
+
+hooks: list[Hook] = []
+
+# flipped on once there is a hook, the stages past the usual ones aren't even timed until then
+enabled = False
+
+
+def add_hook(hook: Hook) -> None:
+    global enabled
+
+    hooks.append(hook)
+    enabled = True
+
+
+def spans(packet: Packet) -> list[Span]:
+    """a stage a request didn't go through (a cache hit isn't handled, a bad one isn't dispatched) is part of the next one it did"""
+
+    stats = packet.stats
+    result, start = [], stats.receiving
+
+    for stage, attribute in _ENDS:
+        if (end := getattr(stats, attribute)) is not None:
+            result.append(Span(stage, start, end))
+            start = end
+
+    return result
+
+
+def record(packet: Packet) -> None:
+    global logger
+
+    traced = spans(packet)
+
+    for hook in hooks:
+        try:
+            hook(packet, traced)
+        except Exception as exc:
+            logger.warning(f"{packet} - tracing hook {hook!r} failed: {exc!r}")
+
+
+# the profiler's, once the server is started with a profile directory
+profiler: Profiler | None = None
+
+
+@dataclass(eq=False)
+class Profiler:
+    """profiles a share of requests, one at a time - cprofile can't run twice at once, and sees every thread while it runs
+
+    a background thread writes the profiles out, the request they were taken of doesn't wait for that"""
+
+    directory: str
+    sample: float
+    # route templates, any route if empty
+    routes: frozenset[str]
+
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+    _taken: itertools.count = field(default_factory=itertools.count)
+
+    # appending and popping from either end are atomic, like the access writer's records
+    _profiles: collections.deque[tuple[cProfile.Profile, str]] = field(default_factory=collections.deque)
+    _wake_up: threading.Event = field(default_factory=threading.Event)
+    _closed: bool = False
+    _thread: threading.Thread | None = None
+
+    def start(self, route: str) -> cProfile.Profile | None:
+        if self.routes and route not in self.routes or random.random() >= self.sample:
+            return None
+
+        if not self._lock.acquire(blocking=False):
+            return None  # another one is being profiled, this one goes without
+
+        profile = cProfile.Profile()
+
+        try:
+            profile.enable()
+        except ValueError:
+            # someone else's profiler is on already
+            self._lock.release()
+            return None
+
+        return profile
+
+    def stop(self, profile: cProfile.Profile, route: str) -> None:
+        profile.disable()
+        self._lock.release()
+
+        name = re.sub(r'[^\w.-]+', '_', route).strip('_') or 'root'
+        self._profiles.append((profile, os.path.join(self.directory, f"{name}-{os.getpid()}-{next(self._taken)}.pstats")))
+        self._wake_up.set()
+
+    def start_writer(self) -> None:
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _write(self) -> None:
+        while not self._closed:
+            self._wake_up.wait()
+            self._wake_up.clear()
+            self._flush()
+
+    def _flush(self) -> None:
+        global logger
+
+        try:
+            while True:
+                profile, path = self._profiles.popleft()
+
+                try:
+                    profile.dump_stats(path)
+                except OSError as exc:
+                    logger.warning(f"couldn't write the profile {path}: {exc!r}")
+        except IndexError:
+            pass
+
+    def close(self) -> None:
+        """writes out whatever is left, the writer can't be started again after this"""
+
+        if self._closed:
+            return
+
+        self._closed = True
+        self._wake_up.set()
+        if self._thread is not None:
+            self._thread.join()
+
+        self._flush()
+
+
+def open_profiler(run_config: RunConfig) -> None:
+    global profiler
+
+    os.makedirs(run_config.profile, exist_ok=True)
+    profiler = Profiler(run_config.profile, run_config.profile_sample, frozenset(run_config.profile_routes))
+    profiler.start_writer()
+
+
+def close_profiler() -> None:
+    global profiler
+
+    if profiler is not None:
+        profiler.close()
+        profiler = None
@@ -1,4 +1,3 @@
-from collections import defaultdict
 from typing import Iterable, Sequence
 
 
@@ -17,16 +16,3 @@ def isinstanceorclass(obj: object, class_: type) -> bool:
 def is_in(obj, iterable: Iterable) -> bool:
     return any(obj is item for item in iterable)
 
-
-def defaultdict_of_defaultdicts_factory[K, V]() -> defaultdict[K, V]:
-    return defaultdict(defaultdict_of_defaultdicts_factory)
-
-
-def dataclass_from_dict[T](dataclass: type[T], dict_: dict) -> T:
-    try:
-        fieldtypes = dataclass.__annotations__  # TODO make use of something else then annotations for fields
-        return dataclass(**{f: dataclass_from_dict(fieldtypes[f], dict_[f]) for f in dict_})
-    except AttributeError:
-        if isinstance(dict_, (tuple, list)):
-            return [dataclass_from_dict(dataclass.__args__[0], f) for f in dict_]
-        return dict_
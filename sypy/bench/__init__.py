@@ -0,0 +1,4 @@
+from ._scenarios import Scenario, SCENARIOS
+from ._load import run_load
+from ._micro import run_micro
+from ._results import LoadResult, MicroResult, percentile, save, load, compare
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import argparse
+import importlib
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from .. import Server, RunConfig, Engine
+from ._scenarios import SCENARIOS
+from ._load import run_load
+from ._micro import run_micro
+from ._results import save, load, compare
+
+
+# how long a server started for the run gets to start listening
+STARTUP_TIMEOUT = 10.0
+
+
+def _server(app: str) -> Server:
+    """'example:server' - the module is imported from the working directory, like the app would be run"""
+
+    module, _, attribute = app.partition(':')
+    sys.path.insert(0, '')
+
+    return getattr(importlib.import_module(module), attribute or 'server')
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _start(args: argparse.Namespace, port: int) -> subprocess.Popen:
+    """in a process of its own, so the load generator doesn't take time away from it under the gil"""
+
+    child = subprocess.Popen([
+        sys.executable, '-m', 'sypy.bench', 'serve', args.app, str(port),
+        '--engine', args.engine, '--workers', str(args.workers), '--processes', str(args.processes),
+    ])
+
+    until = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < until:
+        if child.poll() is not None:
+            raise SystemExit(f"the server exited with {child.returncode} before listening")
+
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return child
+        except OSError:
+            time.sleep(0.05)
+
+    child.kill()
+    raise SystemExit(f"the server didn't start listening within {STARTUP_TIMEOUT}s")
+
+
+def _serve(args: argparse.Namespace) -> None:
+    _server(args.app).start(RunConfig(args.port, workers=args.workers, processes=args.processes, engine=Engine(args.engine), access_log=None))
+
+
+def _load(args: argparse.Namespace) -> None:
+    if args.url is None and args.app is None:
+        raise SystemExit("either --app or --url")
+
+    scenarios = [SCENARIOS[name] for name in args.scenario or SCENARIOS]
+
+    if args.url is not None:
+        host, _, port = args.url.rpartition(':')
+        address, child = (host or '127.0.0.1', int(port)), None
+    else:
+        address = ('127.0.0.1', _free_port())
+        child = _start(args, address[1])
+
+    results = []
+    try:
+        for scenario in scenarios:
+            results.append(result := run_load(
+                address, scenario, args.engine if child else '-', args.connections, args.depth,
+                args.warmup, args.duration, args.timeout, args.load_processes,
+            ))
+            print(result, flush=True)
+    finally:
+        if child is not None:
+            child.send_signal(signal.SIGTERM)
+            child.wait()
+
+    if args.out:
+        save(args.out, results, app=args.app, url=args.url, workers=args.workers, processes=args.processes)
+
+
+def _micro(args: argparse.Namespace) -> None:
+    server = _server(args.app) if args.app else None
+    scenarios = [SCENARIOS[name] for name in args.scenario or SCENARIOS]
+
+    results = []
+    for result in run_micro(server, scenarios):
+        results.append(result)
+        print(result, flush=True)
+
+    if args.out:
+        save(args.out, results, app=args.app)
+
+
+def _compare(args: argparse.Namespace) -> None:
+    lines, regressions = compare(load(args.before), load(args.after), args.threshold)
+    print('\n'.join(lines))
+
+    if regressions:
+        raise SystemExit(f"{regressions} measures got worse by more than {args.threshold:.0%}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m sypy.bench')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def served(command: argparse.ArgumentParser) -> None:
+        command.add_argument('--engine', choices=[engine.value for engine in Engine], default=Engine.Threaded.value)
+        command.add_argument('--workers', type=int, default=RunConfig.workers)
+        command.add_argument('--processes', type=int, default=1)
+
+    load_command = commands.add_parser('load', help="throughput and latency percentiles of each scenario")
+    load_command.add_argument('--app', help="module:server to start for the run, e.g. example:server")
+    load_command.add_argument('--url', help="host:port of one running already")
+    served(load_command)
+    load_command.add_argument('--scenario', action='append', choices=list(SCENARIOS))
+    load_command.add_argument('--connections', type=int, default=16)
+    load_command.add_argument('--depth', type=int, default=1, help="requests pipelined on each connection")
+    load_command.add_argument('--warmup', type=float, default=1.0)
+    load_command.add_argument('--duration', type=float, default=5.0)
+    load_command.add_argument('--timeout', type=float, default=5.0)
+    load_command.add_argument('--load-processes', type=int, default=1)
+    load_command.add_argument('--out', help="where to save the results as json")
+    load_command.set_defaults(run=_load)
+
+    micro_command = commands.add_parser('micro', help="the parser, router and handling without any sockets")
+    micro_command.add_argument('--app', help="module:server whose routes to go through, just the parser without it")
+    micro_command.add_argument('--scenario', action='append', choices=list(SCENARIOS))
+    micro_command.add_argument('--out')
+    micro_command.set_defaults(run=_micro)
+
+    compare_command = commands.add_parser('compare', help="exits with an error if anything got worse by more than the threshold")
+    compare_command.add_argument('before')
+    compare_command.add_argument('after')
+    compare_command.add_argument('--threshold', type=float, default=0.1)
+    compare_command.set_defaults(run=_compare)
+
+    serve_command = commands.add_parser('serve')
+    serve_command.add_argument('app')
+    serve_command.add_argument('port', type=int)
+    served(serve_command)
+    serve_command.set_defaults(run=_serve)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import collections
+import multiprocessing
+import selectors
+import socket
+import time
+from array import array
+from dataclasses import dataclass, field
+
+from ._scenarios import Scenario
+from ._results import LoadResult
+
+
+RECV_SIZE = 64 * 1024
+# how often requests in flight are checked for having gone unanswered for too long
+TIMEOUT_CHECK = 0.1
+
+
+@dataclass(eq=False)
+class _Client:
+    """one connection, keeping depth requests in flight on it at all times"""
+
+    socket: socket.socket
+    buffer: bytearray = field(default_factory=bytearray)
+    # when each request in flight was sent, oldest first - the responses come back in that order
+    sent: collections.deque[float] = field(default_factory=collections.deque)
+    # the end, status and whether the server closes after it, of the response whose head is in already
+    head: tuple[int, int, bool] | None = None
+
+    def take(self) -> tuple[int, bool] | None:
+        """the status of the response at the front of the buffer and whether it is the connection's last, once it is all here"""
+
+        if self.head is None and (head := _head(self.buffer)) is None:
+            return None
+        elif self.head is None:
+            self.head = head
+
+        end, status, closes = self.head
+
+        if end == -1 and (end := _chunked_end(self.buffer)) == -1:
+            return None
+        if end > len(self.buffer):
+            return None
+
+        del self.buffer[:end]
+        self.head = None
+
+        return status, closes
+
+
+def _head(buffer: bytearray) -> tuple[int, int, bool] | None:
+    """-1 for the end of a chunked one, it is only known once the last chunk is in"""
+
+    if (head_end := buffer.find(b'\r\n\r\n')) == -1:
+        return None
+
+    status_line, *lines = bytes(buffer[:head_end]).split(b'\r\n')
+    length, chunked, closes = 0, False, False
+
+    for line in lines:
+        name, _, value = line.partition(b':')
+        name, value = name.strip().lower(), value.strip().lower()
+
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'transfer-encoding':
+            chunked = value.endswith(b'chunked')
+        elif name == b'connection':
+            closes = value == b'close'
+
+    return -1 if chunked else head_end + 4 + length, int(status_line.split(b' ', 2)[1]), closes
+
+
+def _chunked_end(buffer: bytearray) -> int:
+    end = buffer.find(b'\r\n\r\n') + 4
+
+    while (line_end := buffer.find(b'\r\n', end)) != -1:
+        size = int(bytes(buffer[end:line_end]).partition(b';')[0], 16)
+        end = line_end + 2 + size + 2
+
+        if size == 0:
+            return end if end <= len(buffer) else -1
+
+    return -1
+
+
+def _generate(address: tuple[str, int], request: bytes, status: int, connections: int, depth: int, warmup: float, duration: float, timeout: float) -> tuple[array, int, int, int]:
+    """keeps the connections busy for warmup and then duration seconds, only what happened during the latter counts"""
+
+    selector = selectors.DefaultSelector()
+
+    latencies = array('d')
+    unexpected = errors = timeouts = 0
+
+    measuring_from = time.perf_counter() + warmup
+    until = measuring_from + duration
+
+    def connect() -> _Client:
+        s = socket.create_connection(address, timeout=timeout)
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        client = _Client(s)
+        selector.register(s, selectors.EVENT_READ, client)
+
+        s.sendall(request * depth)
+        client.sent.extend([time.perf_counter()] * depth)
+
+        return client
+
+    def reconnect(client: _Client) -> None:
+        selector.unregister(client.socket)
+        client.socket.close()
+        clients[clients.index(client)] = connect()
+
+    clients = [connect() for _ in range(connections)]
+    checked = time.perf_counter()
+
+    while (now := time.perf_counter()) < until:
+        for key, _ in selector.select(TIMEOUT_CHECK):
+            client: _Client = key.data
+
+            try:
+                received = client.socket.recv(RECV_SIZE)
+            except OSError:
+                received = b''
+
+            if not received:
+                # closed or reset with requests still in flight, they are never getting an answer - pipelining past the
+                # server's keep-alive limit does that now and then, the reset throwing away its last response unread
+                errors += now >= measuring_from
+                reconnect(client)
+                continue
+
+            client.buffer += received
+
+            while (response := client.take()) is not None:
+                answered, (got, closes) = time.perf_counter(), response
+                sent = client.sent.popleft()
+
+                if sent >= measuring_from:
+                    latencies.append(answered - sent)
+                    unexpected += got != status
+
+                if closes:
+                    # the requests pipelined behind it were dropped, not failed, they are just sent again on a new one
+                    reconnect(client)
+                    break
+
+                try:
+                    client.socket.sendall(request)
+                except OSError:
+                    # the server closed it at its keep-alive limit, and the response saying so is yet to be read
+                    reconnect(client)
+                    break
+
+                client.sent.append(time.perf_counter())
+
+        if now - checked >= TIMEOUT_CHECK:
+            checked = now
+
+            for client in list(clients):
+                if client.sent and now - client.sent[0] > timeout:
+                    timeouts += client.sent[0] >= measuring_from
+                    reconnect(client)
+
+    for client in clients:
+        client.socket.close()
+
+    selector.close()
+
+    return latencies, unexpected, errors, timeouts
+
+
+def run_load(address: tuple[str, int], scenario: Scenario, engine: str = '-', connections: int = 16, depth: int = 1, warmup: float = 1.0, duration: float = 5.0, timeout: float = 5.0, processes: int = 1) -> LoadResult:
+    """hammers the server at the address with the scenario's request from that many connections, spread over that many processes"""
+
+    request = scenario.to_bytes(f"{address[0]}:{address[1]}")
+    shares = [connections // processes + (i < connections % processes) for i in range(processes)]
+    jobs = [(address, request, scenario.status, share, depth, warmup, duration, timeout) for share in shares if share]
+
+    if len(jobs) == 1:
+        outcomes = [_generate(*jobs[0])]
+    else:
+        # a single python process can't keep up with a server using more than a core, it takes a few
+        with multiprocessing.Pool(len(jobs)) as pool:
+            outcomes = pool.starmap(_generate, jobs)
+
+    latencies = [latency for outcome in outcomes for latency in outcome[0]]
+
+    return LoadResult.summarize(
+        scenario.name, engine, connections, depth, duration, latencies,
+        sum(outcome[1] for outcome in outcomes), sum(outcome[2] for outcome in outcomes), sum(outcome[3] for outcome in outcomes),
+    )
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import socket
+import timeit
+from typing import Callable, TYPE_CHECKING
+
+from .._config import RunConfig
+from .._handling import handle
+from .._packet import Packet, Connection, Requester, IP
+from ..http import HTTPRequest
+from ..http.path.encoder import decode
+from ._scenarios import Scenario
+from ._results import MicroResult
+
+if TYPE_CHECKING:
+    from .. import Server
+
+
+REPEAT = 5
+
+
+def _request(target: str) -> bytes:
+    return f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode()
+
+
+# the heads that once took milliseconds to parse, and the usual one for comparison
+_PARSER_CASES = {
+    'short path': _request('/circle/7'),
+    '2k path, all escapes': _request('/files/' + '%E2%9C%93%20' * 170),
+    '4k path, 280 segments': _request('/' + '/'.join(['segment-name_0'] * 280)),
+    '4k query, 200 params': _request('/search?' + '&'.join(f'k{i}=caf%C3%A9%20%26%3D' for i in range(200))),
+}
+
+
+def _best(call: Callable[[], object]) -> tuple[float, int]:
+    """seconds per call, the best of the repeats, each of them running for at least a fifth of a second"""
+
+    timer = timeit.Timer(call)
+    number, _ = timer.autorange()
+
+    return min(timer.repeat(REPEAT, number)) / number, number
+
+
+def _handled(server: Server, scenario: Scenario, connection: Connection, run_config: RunConfig) -> Callable[[], object] | None:
+    """the request going through everything the server does with it, short of the socket - None for async routes"""
+
+    raw = scenario.to_bytes()
+    request = HTTPRequest.from_bytes(raw)
+
+    try:
+        callback, _ = server.dispatcher.dispatch(request.path, request.method)
+    except LookupError:
+        pass
+    else:
+        if callback.is_async:
+            return None  # they need an event loop running, which would be most of what's measured
+
+    def call() -> bytes:
+        connection.served, connection.keep_alive = 0, True
+
+        handle(packet := Packet(connection, _req_body=raw), server.dispatcher, run_config)
+        return packet.response_http.to_bytes()
+
+    return call
+
+
+def run_micro(server: Server | None = None, scenarios: list[Scenario] = ()) -> list[MicroResult]:
+    """the parser on its own, and with a server, its router and the whole of handling each scenario's request"""
+
+    results = []
+
+    for name, raw in _PARSER_CASES.items():
+        results.append(MicroResult(f"parse {name}", *_best(lambda raw=raw: HTTPRequest.from_bytes(raw))))
+
+    escaped = 'x%20y' * 2000
+    results.append(MicroResult("decode 10k chars", *_best(lambda: decode(escaped))))
+
+    if server is None:
+        return results
+
+    server.dispatcher.compile()
+    run_config = RunConfig(0, access_log=None)
+    # never read from nor written to, it only has to be there
+    connection = Connection(socket.socket(), Requester(IP((127, 0, 0, 1)), 0))
+
+    for scenario in scenarios:
+        request = HTTPRequest.from_bytes(scenario.to_bytes())
+        results.append(MicroResult(f"dispatch {scenario.name}", *_best(lambda request=request: _dispatch(server, request))))
+
+    for scenario in scenarios:
+        if (call := _handled(server, scenario, connection, run_config)) is not None:
+            results.append(MicroResult(f"handle {scenario.name}", *_best(call)))
+
+    connection.socket.close()
+
+    return results
+
+
+def _dispatch(server: Server, request: HTTPRequest) -> None:
+    try:
+        server.dispatcher.dispatch(request.path, request.method)
+    except LookupError:
+        pass  # not found is as much of an answer
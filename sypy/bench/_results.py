@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, asdict
+from typing import Any
+
+
+# what each kind of result is judged by, and whether more of it is better
+_MEASURES = {
+    'load': (('throughput', True), ('p50', False), ('p99', False), ('p999', False)),
+    'micro': (('per_op', False),),
+}
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    """nearest-rank, so it is always a latency that actually happened"""
+
+    if not ordered:
+        return 0.0
+
+    return ordered[min(len(ordered), max(1, math.ceil(q * len(ordered)))) - 1]
+
+
+@dataclass
+class LoadResult:
+    scenario: str
+    engine: str
+    connections: int
+    depth: int
+    seconds: float
+    requests: int
+    # answered with something other than the scenario's status
+    unexpected: int
+    # connections reset or closed with a request unanswered
+    errors: int
+    # requests that got nothing back at all within the timeout
+    timeouts: int
+    throughput: float
+    mean: float
+    p50: float
+    p99: float
+    p999: float
+    max: float
+
+    kind = 'load'
+
+    @staticmethod
+    def summarize(scenario: str, engine: str, connections: int, depth: int, seconds: float, latencies: list[float], unexpected: int, errors: int, timeouts: int) -> LoadResult:
+        latencies.sort()
+
+        return LoadResult(
+            scenario, engine, connections, depth, seconds,
+            len(latencies), unexpected, errors, timeouts,
+            len(latencies) / seconds if seconds else 0.0,
+            sum(latencies) / len(latencies) if latencies else 0.0,
+            percentile(latencies, 0.5), percentile(latencies, 0.99), percentile(latencies, 0.999),
+            latencies[-1] if latencies else 0.0,
+        )
+
+    @property
+    def key(self) -> str:
+        return f"{self.scenario} {self.engine} c{self.connections} d{self.depth}"
+
+    def __str__(self) -> str:
+        failed = self.unexpected + self.errors + self.timeouts
+
+        return (f"{self.key:32} {self.throughput:9.0f} req/s  "
+                f"p50 {self.p50 * 1000:7.2f}ms  p99 {self.p99 * 1000:7.2f}ms  p999 {self.p999 * 1000:7.2f}ms  max {self.max * 1000:7.2f}ms"
+                f"{f'  {failed} failed ({self.unexpected} unexpected, {self.errors} errors, {self.timeouts} timeouts)' if failed else ''}")
+
+
+@dataclass
+class MicroResult:
+    name: str
+    # seconds, the best of the repeats
+    per_op: float
+    ops: int
+
+    kind = 'micro'
+
+    @property
+    def key(self) -> str:
+        return self.name
+
+    def __str__(self) -> str:
+        return f"{self.name:40} {self.per_op * 1e6:10.2f}us"
+
+
+def _revision() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(path: str, results: list[LoadResult | MicroResult], **settings: Any) -> None:
+    """writes the results along with what they were measured on, to be compared against later"""
+
+    with open(path, 'w') as f:
+        json.dump({
+            'time': time.time(),
+            'revision': _revision(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'settings': settings,
+            'results': [{'kind': result.kind, **asdict(result)} for result in results],
+        }, f, indent=2)
+        f.write('\n')
+
+
+def load(path: str) -> dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(before: dict[str, Any], after: dict[str, Any], threshold: float = 0.1) -> tuple[list[str], int]:
+    """a line per result both runs have, and how many of them got worse by more than the threshold"""
+
+    lines, regressions = [], 0
+    earlier = {(result['kind'], _key(result)): result for result in before['results']}
+
+    for result in after['results']:
+        if (old := earlier.get((result['kind'], _key(result)))) is None:
+            continue
+
+        changes = []
+        for measure, higher_is_better in _MEASURES[result['kind']]:
+            if not old[measure]:
+                continue
+
+            change = result[measure] / old[measure] - 1
+            worse = -change if higher_is_better else change
+
+            if worse > threshold:
+                regressions += 1
+
+            changes.append(f"{measure} {change:+7.1%}{' !' if worse > threshold else '  '}")
+
+        lines.append(f"{_key(result):40} {'  '.join(changes)}")
+
+    return lines, regressions
+
+
+def _key(result: dict[str, Any]) -> str:
+    fields = dict(result)
+    return _KINDS[fields.pop('kind')](**fields).key
+
+
+_KINDS = {
+    'load': LoadResult,
+    'micro': MicroResult,
+}
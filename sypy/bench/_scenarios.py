@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """a request sent over and over, and the status it should be answered with"""
+
+    name: str
+    method: str
+    target: str
+    headers: dict[str, str] = field(default_factory=dict)
+    body: bytes = b''
+    # anything else counts as an error, whatever made it that
+    status: int = 200
+
+    def to_bytes(self, host: str = 'localhost') -> bytes:
+        headers = {'host': host, **self.headers}
+
+        if self.body or self.method in ('POST', 'PUT', 'PATCH'):
+            headers['content-length'] = str(len(self.body))
+
+        return f"{self.method} {self.target} HTTP/1.1\r\n{''.join(f'{name}: {value}\r\n' for name, value in headers.items())}\r\n".encode('latin-1') + self.body
+
+
+def _json(value: Any) -> dict[str, Any]:
+    return {'headers': {'content-type': 'application/json'}, 'body': json.dumps(value).encode()}
+
+
+# the routes of example.py, each one going down a different path through the server
+SCENARIOS: dict[str, Scenario] = {scenario.name: scenario for scenario in (
+    # a path param and a cache hit, about as little as a request can cost
+    Scenario('circle', 'GET', '/circle/7'),
+    Scenario('echo', 'POST', '/echo', body=b"hello there, general kenobi"),
+    Scenario('json-dict', 'POST', '/smth', **_json({'a': 1, 'b': "two", 'c': [3]})),
+    Scenario('json-dataclass', 'POST', '/message', **_json({'sender': 1, 'receiver': 2, 'contents': "are you there? it's me"})),
+    Scenario('depends', 'GET', '/is_it', headers={'the-thing': "fastapi"}),
+    Scenario('exception', 'GET', '/faulty', status=500),
+    Scenario('redirect', 'GET', '/redirect?where=google', status=308),
+    Scenario('not-found', 'GET', '/nowhere/to/be/found', status=404),
+    Scenario('streamed', 'GET', '/count?up_to=20'),
+    Scenario('compressed', 'GET', '/squares?up_to=200', headers={'accept-encoding': "gzip"}),
+    # asleep on the awaiter for the tenth of a second its dependency takes, what matters is how many of them overlap
+    Scenario('async', 'GET', '/later', headers={'patience': "0"}),
+)}
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
-from ._frames import Headers, QueryParams, HTTPRequest, HTTPResponse
+from ._frames import Headers, QueryParams, HTTPRequest, HTTPResponse, FileBody
 from ._status import HTTPStatus
-from ._errors import HTTPException, EmptyPacket, InvalidPath, InvalidMethod
+from ._errors import HTTPException, EmptyPacket, InvalidPath, InvalidQuery, InvalidMethod, InvalidContentLength, HeadTooLarge, MalformedHead, ContentTooLarge, MalformedChunk, IncompleteBody, InvalidHTTPPacket
 from ._method import HTTPMethod
 from .path import Path
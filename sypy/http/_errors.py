@@ -2,9 +2,12 @@ from __future__ import annotations
 
 import json
 from dataclasses import dataclass
+from typing import TYPE_CHECKING
 
 from ._status import HTTPStatus
-from ._frames.parts import Headers
+
+if TYPE_CHECKING:
+    from ._frames.parts import Headers
 
 
 class HTTPException(RuntimeError):
@@ -60,6 +63,14 @@ class InvalidPath(InvalidHTTPPacket):
         return f"invalid path - {self.path}"
 
 
+@dataclass
+class InvalidQuery(InvalidHTTPPacket):
+    query: str
+
+    def __str__(self) -> str:
+        return f"invalid query - {self.query}"
+
+
 @dataclass
 class InvalidMethod(InvalidHTTPPacket):
     method: str
@@ -72,3 +83,49 @@ class InvalidMethod(InvalidHTTPPacket):
 class EmptyPacket(InvalidHTTPPacket):
     def __str__(self) -> str:
         return "packet is empty"
+
+
+@dataclass
+class MalformedHead(InvalidHTTPPacket):
+    line: str
+
+    def __str__(self) -> str:
+        return f"malformed request head - {self.line}"
+
+
+@dataclass
+class InvalidContentLength(InvalidHTTPPacket):
+    value: str
+
+    def __str__(self) -> str:
+        return f"invalid content-length - {self.value}"
+
+
+@dataclass
+class HeadTooLarge(InvalidHTTPPacket):
+    limit: int
+
+    def __str__(self) -> str:
+        return f"request head is longer than {self.limit} bytes"
+
+
+@dataclass
+class ContentTooLarge(InvalidHTTPPacket):
+    limit: int
+
+    def __str__(self) -> str:
+        return f"request body is longer than {self.limit} bytes"
+
+
+@dataclass
+class MalformedChunk(InvalidHTTPPacket):
+    line: str
+
+    def __str__(self) -> str:
+        return f"malformed body chunk - {self.line}"
+
+
+@dataclass
+class IncompleteBody(InvalidHTTPPacket):
+    def __str__(self) -> str:
+        return "request body was cut short"
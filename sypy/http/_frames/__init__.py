@@ -1,13 +1,15 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Iterable, Iterator, TYPE_CHECKING
 
 from .parts import Headers, QueryParams
 from .._method import HTTPMethod
-from .._errors import HTTPException, InvalidPath, InvalidMethod, EmptyPacket
+from .._errors import HTTPException, InvalidPath, InvalidQuery, InvalidMethod, EmptyPacket, MalformedHead
 from .._status import HTTPStatus
 from ..path import Path
-from ..path.encoder import encode
-from ..._utils import autofilling_split, fillingin
+
+if TYPE_CHECKING:
+    from ..._body import BodyStream
 
 
 @dataclass
@@ -16,38 +18,34 @@ class HTTPRequest:
     method: HTTPMethod
     headers: Headers
     query_params: QueryParams
-    body: bytes
+    body: bytes | memoryview | BodyStream
+    path_params: dict[str, Any] = field(default_factory=dict)
 
     @staticmethod
     def from_bytes(raw: bytes) -> HTTPRequest:
         if not raw:
             raise EmptyPacket()
 
-        buff = ""
-        endseq_combo = 0
-        for b in raw:
-            buff += chr(b)
+        if (head_end := raw.find(b'\r\n\r\n')) != -1:
+            body_start = head_end + 4
+        else:
+            # cut short, only the lines that made it whole count
+            head_end = body_start = len(raw)
+            if (last_line := raw.rfind(b'\r\n')) != -1:
+                head_end = last_line
 
-            if endseq_combo == 0 and b == ord('\r'):
-                endseq_combo = 1
-            elif endseq_combo == 1 and b == ord('\n'):
-                endseq_combo = 2
-            elif endseq_combo == 2 and b == ord('\r'):
-                endseq_combo = 3
-            elif endseq_combo == 3 and b == ord('\n'):
-                break
-            else:
-                endseq_combo = 0
+        magic, *headers_raw = raw[:head_end].split(b'\r\n')
 
-        magic, *headers_raw = fillingin(buff.splitlines(), 2, "")
-        headers_raw.pop()
+        method_raw, _, rest = magic.partition(b' ')
+        path_unparsed, sep, version = rest.partition(b' ')
 
-        method_raw, path_unparsed, version = magic.split(' ', 2)
+        if not sep:
+            raise MalformedHead(magic.decode('latin-1'))
 
-        if version != 'HTTP/1.1':
-            raise HTTPException(HTTPStatus.HTTPVersionNotSupported, f"nuh uh, not supported: {version}")
+        if version != b'HTTP/1.1':
+            raise HTTPException(HTTPStatus.HTTPVersionNotSupported, f"nuh uh, not supported: {version.decode('latin-1')}")
 
-        path_raw, query_params_raw = autofilling_split(path_unparsed, '?', 1)
+        path_raw, _, query_params_raw = path_unparsed.decode('latin-1').partition('?')
 
         try:
             path = Path(path_raw)
@@ -55,24 +53,112 @@ class HTTPRequest:
             raise InvalidPath(path_raw) from None
 
         try:
-            method = HTTPMethod(method_raw)
+            method = HTTPMethod(method_raw.decode('latin-1'))
+        except ValueError:
+            raise InvalidMethod(method_raw.decode('latin-1')) from None
+
+        try:
+            query_params = QueryParams.from_string(query_params_raw)
         except ValueError:
-            raise InvalidMethod(method_raw) from None
+            raise InvalidQuery(query_params_raw) from None
+
+        return HTTPRequest(path, method, Headers.from_lines(headers_raw), query_params, memoryview(raw)[body_start:])
+
+
+# heads of responses with no headers but the connection one, which is what every plain callback gives back
+_BLOCKS: dict[tuple[HTTPStatus, str | None], bytes] = {}
+_PLAIN = {'connection'}
+
+# set by the server itself, whatever a callback put in there instead is ignored
+_FRAMING = {'content-length', 'transfer-encoding', 'server'}
+
+# these never have a body, and a content-length on them would mean something else entirely
+_BODILESS = {HTTPStatus.NoContent, HTTPStatus.NotModified}
+
+
+@dataclass(eq=False)
+class FileBody:
+    """count bytes of an open file from offset on, sent by the kernel straight from the file - or only their length, without a file"""
+
+    file: BinaryIO | None
+    offset: int
+    count: int
+
+    def __len__(self) -> int:
+        return self.count
+
+    def read(self) -> bytes:
+        if self.file is None:
+            return b''
+
+        self.file.seek(self.offset)
+        return self.file.read(self.count)
 
-        return HTTPRequest(path, method, Headers.from_string(headers_raw), QueryParams.from_string(query_params_raw), raw[len(buff):])
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
 
 
 @dataclass
 class HTTPResponse:
     status: HTTPStatus
     headers: Headers
-    body: bytes
+    body: bytes | Iterable[bytes] | FileBody
 
-    def _prepare(self) -> None:
-        self.headers['content-length'] = len(self.body)
-        self.headers['server'] = 'sypy'
+    @property
+    def streaming(self) -> bool:
+        return not isinstance(self.body, (bytes, bytearray, memoryview, FileBody))
 
-    def to_bytes(self) -> bytes:
-        self._prepare()  # XXX should it be caller's responsibility?
+    def _block(self) -> bytes:
+        """the head up to the framing header, the headers dict itself is left as is"""
+
+        if self.headers.keys() <= _PLAIN:
+            if (block := _BLOCKS.get(key := (self.status, self.headers.get('connection')))) is None:
+                block = _BLOCKS[key] = self._build_block()
+
+            return block
+
+        return self._build_block()
+
+    def _build_block(self) -> bytes:
+        return (f"HTTP/1.1 {self.status}\r\n"
+                f"{''.join(f"{Headers._prepare_index(field)}: {value}\r\n" for field, value in self.headers.items() if field not in _FRAMING)}"
+                f"Server: sypy\r\n").encode('latin-1')
+
+    def head(self) -> bytes:
+        if self.status < 200 or self.status in _BODILESS:
+            return self._block() + b'\r\n'
+        elif self.streaming:
+            return self._block() + b'Transfer-Encoding: chunked\r\n\r\n'
+
+        return self._block() + b'Content-Length: %d\r\n\r\n' % len(self.body)
+
+    def parts(self) -> Iterator[tuple[bytes | memoryview, ...] | FileBody]:
+        """what to write, each part in a single go - the body is never glued onto the head, nor a chunk onto its framing"""
 
-        return f"HTTP/1.1 {self.status}\r\n{self.headers.to_string()}\r\n\r\n".encode('ascii') + self.body
+        if isinstance(self.body, FileBody):
+            # closed however the sending ends, a generator dropped halfway through runs the finally too
+            try:
+                yield self.head(),
+
+                if self.body.file is not None and self.body.count:
+                    yield self.body
+            finally:
+                self.body.close()
+
+            return
+        elif not self.streaming:
+            yield self.head(), self.body
+            return
+
+        # nothing is held onto in between, every chunk is framed only once it is produced
+        yield self.head(),
+
+        for chunk in self.body:
+            if chunk:  # an empty one would end the body early
+                yield b'%x\r\n' % len(chunk), chunk, b'\r\n'
+
+        yield b'0\r\n\r\n',
+
+    def to_bytes(self) -> bytes:
+        return b''.join(buffer for part in self.parts() for buffer in (part if isinstance(part, tuple) else (part.read(),)))
@@ -1,7 +1,9 @@
 from __future__ import annotations
+import functools
 import string
 
-from ..path.encoder import encode
+from ..path.encoder import encode, decode
+from .._errors import MalformedHead
 from ..._utils import autofilling_split
 
 
@@ -11,7 +13,9 @@ class Headers(dict[str, str]):
         return index.lower().replace('_', '-')
 
     @staticmethod
+    @functools.lru_cache(maxsize=1024)
     def _prepare_index(index: str) -> str:
+        # the same few names over and over, capwords on every response adds up
         return string.capwords(index, '-')
 
     def __setitem__(self, key: str, value):
@@ -27,6 +31,21 @@ class Headers(dict[str, str]):
     def from_string(s: str) -> Headers:
         return Headers({Headers._process_index(field): value.strip() for field, value in map(lambda h_raw: h_raw.split(':', 1), s)})
 
+    @staticmethod
+    def from_lines(lines: list[bytes]) -> Headers:
+        headers = Headers()
+
+        for line in lines:
+            field, sep, value = line.partition(b':')
+
+            if not sep:
+                raise MalformedHead(line.decode('latin-1'))
+
+            # already processed, skip the overridden __setitem__
+            dict.__setitem__(headers, field.decode('latin-1').lower().replace('_', '-'), value.decode('latin-1').strip())
+
+        return headers
+
     def to_string(self) -> str:
         return '\r\n'.join(f"{self._prepare_index(field)}: {value}" for field, value in self.items())
 
@@ -34,7 +53,7 @@ class Headers(dict[str, str]):
 class QueryParams(dict[str, str]):
     @staticmethod
     def from_string(s: str) -> QueryParams:
-        return QueryParams({param: value for param, value in map(lambda h_raw: autofilling_split(h_raw, '=', 1), s.removeprefix('&').split('&')) if param})
+        return QueryParams({decode(param): decode(value) for param, value in map(lambda h_raw: autofilling_split(h_raw, '=', 1), s.removeprefix('&').split('&')) if param})
 
     def to_string(self) -> str:
         return '&'.join(f"{encode(field)}={encode(value)}" for field, value in self.items())
@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 from typing import overload
 
-from .characters import RESERVED, UNRESERVED
+from .characters import INVALID
 from .encoder import decode
 
 
@@ -12,19 +12,19 @@ class Path:
     def _validate_path(path: str) -> None:
         # TODO add check for `/` in the beginning
 
-        for c in path:
-            if c not in RESERVED + UNRESERVED + '%':
-                raise ValueError(f"invalid path, unexpected char: {c}")
+        if invalid := path.translate(INVALID):
+            raise ValueError(f"invalid path, unexpected char: {invalid[0]}")
 
     def __init__(self, path: str | list[str]) -> None:
-        path_parts = path.removesuffix('/').removeprefix('/').split('/') if isinstance(path, str) else path
+        whole = path if isinstance(path, str) else '/'.join(path)
 
-        # TODO combine 2 for-loops
-        for part in path_parts:
-            self._validate_path(part)
+        # '/' is allowed anyway, so all the parts are checked in one go
+        self._validate_path(whole)
 
-        # TODO remove the inner if-statement at all (ie move the check out)
-        self.parts = [part if '%' not in part else decode(part) for part in path_parts]
+        path_parts = path.removesuffix('/').removeprefix('/').split('/') if isinstance(path, str) else list(path)
+
+        # escapes are decoded only after splitting, so an escaped '/' stays inside its part
+        self.parts = path_parts if '%' not in whole else list(map(decode, path_parts))
 
     def __str__(self) -> str:
         return f"/{'/'.join(self.parts)}"
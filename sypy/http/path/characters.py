@@ -2,3 +2,6 @@ import string
 
 RESERVED = "!*'();:@&=+$,/?#[]"
 UNRESERVED = string.ascii_letters + string.digits + "-_.~"
+
+# deletes every allowed char, whatever survives str.translate is what is wrong with the path
+INVALID = str.maketrans('', '', RESERVED + UNRESERVED + '%')
@@ -1,47 +1,33 @@
 from .characters import UNRESERVED
 
 
-def _encode_char(c: str) -> str:
-    # if not isinstance(c, str):
-    #     raise TypeError(f"expected an ASCII 1-char long 'str' ('char'), got {type(c).__name__} instead")
-    # if not c.isascii():
-    #     raise TypeError(f"expected an ASCII 1-char long 'str' ('char'), got non-ASCII instead")
-    # if (c_len := len(c)) != 1:
-    #     raise TypeError(f"expected an ASCII 1-char long 'str' ('char'), got {c_len}-char long instead")
+# byte -> what it is in a url, the unreserved ones stay as they are
+_ENCODED = tuple(chr(b) if chr(b) in UNRESERVED else f"%{b:02X}" for b in range(256))
+_KEPT = frozenset(UNRESERVED)
 
-    return f"%{c:0>2X}"
+# both hex digits, in any case -> the byte they stand for, as a latin-1 char so it all can be joined as a str
+_HEX = {f"{hi}{lo}": chr(int(hi + lo, 16)) for hi in "0123456789abcdefABCDEF" for lo in "0123456789abcdefABCDEF"}
 
 
 def encode(s: str) -> str:
-    return ''.join(c if c in UNRESERVED else _encode_char(c) for c in s)
+    if _KEPT.issuperset(s):
+        return s
 
+    return ''.join(map(_ENCODED.__getitem__, s.encode('utf-8')))
 
-def _decode_char(c: str) -> str:
-    # if not isinstance(c, str):
-    #     raise TypeError(f"expected an ASCII 3-char long 'str' starting with '%' (percent-encoded byte), got {type(c).__name__} instead")
-    # if not c.isascii():
-    #     raise TypeError(f"expected an ASCII 3-char long 'str' starting with '%' (percent-encoded byte), got non-ASCII instead")
-    # if (c_len := len(c)) != 3:
-    #     raise TypeError(f"expected an ASCII 3-char long 'str' starting with '%' (percent-encoded byte), got {c_len}-char long instead")
-    # if not c.startswith('%'):
-    #     raise ValueError(f"expected an ASCII 3-char long 'str' starting with '%' (percent-encoded byte), got starting with '{c[0]}' instead")
 
-    return chr(int(c[1:], base=16))
+def decode_bytes(s: str) -> bytes:
+    """a single pass over the escapes, a '%' not followed by two hex digits is kept as is"""
+
+    first, *rest = s.split('%')
+    get = _HEX.get
+
+    return (first + ''.join([byte + part[2:] if (byte := get(part[:2])) is not None else '%' + part for part in rest])).encode('latin-1')
 
 
 def decode(s: str) -> str:
-    buffer = ""
-
-    while s:
-        if (c := s[0]) != '%':
-            buffer += c
-            s = s[1:]
-        else:
-            try:
-                buffer += _decode_char(s[0:3])
-                s = s[3:]
-            except ValueError:
-                buffer += c
-                s = s[1:]
-
-    return buffer
+    if '%' not in s and s.isascii():
+        return s
+
+    # escapes of a multibyte char only make sense together, hence the bytes first
+    return decode_bytes(s).decode('utf-8')
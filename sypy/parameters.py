@@ -1,7 +1,10 @@
 from __future__ import annotations
 from dataclasses import dataclass
+from enum import StrEnum
 from typing import Callable, TYPE_CHECKING
 
+from ._body import BodyStream
+
 if TYPE_CHECKING:
     from ._dispatcher import Callback
 
@@ -18,10 +21,21 @@ class Header:
     pass
 
 
+class Scope(StrEnum):
+    # once per request, however many times it is depended on
+    Request = 'request'
+    # once per worker thread, for things that can't be shared between threads
+    Worker = 'worker'
+    # once per process, for the expensive and thread-safe ones
+    App = 'app'
+
+
 class Depends:
     dependency: Callback
+    scope: Scope
 
-    def __init__(self, dependency: Callable) -> None:
+    def __init__(self, dependency: Callable, scope: Scope = Scope.Request) -> None:
         from ._dispatcher import Callback
 
         self.dependency = Callback(dependency, raw=True)
+        self.scope = scope
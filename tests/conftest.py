@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import socket
+import time
+from typing import Callable, Iterator
+
+import pytest
+
+from sypy import Server, RunConfig, Engine
+from sypy._packet import Connection, Requester, IP
+
+
+# how long anything over a real socket gets before the test gives up on it
+TIMEOUT = 5.0
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def exchange(address: tuple[str, int], raw: bytes, responses: int = 1) -> bytes:
+    """sends raw at once, and reads until that many responses are in or the server closes"""
+
+    with socket.create_connection(address, timeout=TIMEOUT) as s:
+        s.sendall(raw)
+        return read_responses(s, responses)
+
+
+def read_responses(s: socket.socket, responses: int) -> bytes:
+    received = b''
+
+    while received.count(b'HTTP/1.1 ') < responses or not _complete(received):
+        if not (chunk := s.recv(65536)):
+            break
+
+        received += chunk
+
+    return received
+
+
+def _complete(received: bytes) -> bool:
+    # the last one's head and as much body as it says, good enough for the responses these tests get
+    if (last := received.rfind(b'HTTP/1.1 ')) == -1 or (head_end := received.find(b'\r\n\r\n', last)) == -1:
+        return False
+
+    head = received[last:head_end].lower()
+    if b'transfer-encoding: chunked' in head:
+        return received.endswith(b'0\r\n\r\n')
+
+    length = int(head.partition(b'content-length: ')[2].partition(b'\r\n')[0] or 0)
+    return len(received) >= head_end + 4 + length
+
+
+@pytest.fixture
+def connection() -> Iterator[tuple[Connection, socket.socket]]:
+    """a connection the way the server sees it, and the client's end of it"""
+
+    server_end, client_end = socket.socketpair()
+    server_end.settimeout(TIMEOUT)
+
+    yield Connection(server_end, Requester(IP((127, 0, 0, 1)), 0)), client_end
+
+    server_end.close()
+    client_end.close()
+
+
+@pytest.fixture(params=list(Engine))
+def serve(request: pytest.FixtureRequest) -> Iterator[Callable[..., tuple[str, int]]]:
+    """starts the server on both engines, with the run config's fields given, and stops it after the test"""
+
+    started: list[Server] = []
+
+    def start(server: Server, **fields) -> tuple[str, int]:
+        port = free_port()
+        server.start(RunConfig(port, engine=request.param, access_log=None, **{'workers': 2, **fields}))
+        started.append(server)
+
+        until = time.monotonic() + TIMEOUT
+        while not server.is_working and time.monotonic() < until:
+            time.sleep(0.01)
+
+        return '127.0.0.1', port
+
+    yield start
+
+    for server in started:
+        server.stop(TIMEOUT)
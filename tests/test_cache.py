@@ -0,0 +1,112 @@
+import time
+from typing import Annotated
+
+import pytest
+
+from sypy import Cache
+from sypy._dispatcher import Dispatcher
+from sypy.http import HTTPRequest, HTTPResponse, HTTPStatus, HTTPMethod, Headers, Path
+from sypy.parameters import Header
+
+
+def _cache(config=Cache()):
+    dispatcher = Dispatcher()
+
+    def report(kind: str = 'short', accept_language: Annotated[str, Header] = 'en') -> str:
+        return kind
+
+    dispatcher.register_callback('/report', HTTPMethod.GET, report, config)
+    callback, _ = dispatcher.dispatch(Path('/report'), HTTPMethod.GET)
+
+    return callback.cache
+
+
+def _request(target='/report', **headers):
+    lines = ''.join(f"{name.replace('_', '-')}: {value}\r\n" for name, value in headers.items())
+    return HTTPRequest.from_bytes(f"GET {target} HTTP/1.1\r\n{lines}\r\n".encode())
+
+
+def _stored(cache, request, body=b"fresh", status=HTTPStatus.OK):
+    return cache.store(cache.key(request), request, HTTPResponse(status, Headers({'connection': 'keep-alive'}), body))
+
+
+def test_hit_after_store():
+    cache, request = _cache(), _request()
+
+    assert cache.respond(cache.key(request), request) is None
+
+    stored = _stored(cache, request)
+    hit = cache.respond(cache.key(request), request)
+
+    assert hit.body == stored.body == b"fresh"
+    assert hit.headers['etag'] == stored.headers['etag']
+    assert 'connection' not in hit.headers
+
+
+def test_keyed_by_declared_params_only():
+    cache = _cache()
+    _stored(cache, _request('/report?kind=long&ignored=1', accept_language='de'))
+
+    assert cache.respond(cache.key(r := _request('/report?kind=long&ignored=2', accept_language='de')), r) is not None
+    assert cache.respond(cache.key(r := _request('/report?kind=short', accept_language='de')), r) is None
+    assert cache.respond(cache.key(r := _request('/report?kind=long', accept_language='fr')), r) is None
+
+
+def test_vary_names_the_declared_headers():
+    assert _stored(_cache(Cache(vary=('x-tenant',))), _request()).headers['vary'] == 'Accept-Language, X-Tenant'
+
+
+@pytest.mark.parametrize('if_none_match', ['{etag}', 'W/{etag}', '"other", {etag}', '*'])
+def test_not_modified(if_none_match):
+    cache = _cache()
+    etag = _stored(cache, _request()).headers['etag']
+
+    request = _request(if_none_match=if_none_match.format(etag=etag))
+    response = cache.respond(cache.key(request), request)
+
+    assert response.status == HTTPStatus.NotModified
+    assert response.body == b''
+    assert response.headers['etag'] == etag
+
+
+def test_etag_follows_the_body():
+    cache, request = _cache(), _request()
+
+    assert _stored(cache, request, b"one").headers['etag'] != _stored(cache, request, b"two").headers['etag']
+    assert _stored(cache, request, b"one").headers['etag'] == _stored(_cache(), request, b"one").headers['etag']
+
+
+def test_expires():
+    cache, request = _cache(Cache(ttl=0.05)), _request()
+    _stored(cache, request)
+    time.sleep(0.1)
+
+    assert cache.respond(cache.key(request), request) is None
+
+
+def test_least_recently_used_goes_first():
+    cache = _cache(Cache(size=2))
+    first, second, third = (_request(f'/report?kind={kind}') for kind in ('a', 'b', 'c'))
+
+    _stored(cache, first)
+    _stored(cache, second)
+    cache.respond(cache.key(first), first)
+    _stored(cache, third)
+
+    assert cache.respond(cache.key(first), first) is not None
+    assert cache.respond(cache.key(second), second) is None
+
+
+@pytest.mark.parametrize('status', [HTTPStatus.InternalServerError, HTTPStatus.Created])
+def test_not_cacheable_statuses(status):
+    cache, request = _cache(), _request()
+    _stored(cache, request, status=status)
+
+    assert cache.respond(cache.key(request), request) is None
+
+
+def test_streamed_responses_are_not_kept():
+    cache, request = _cache(), _request()
+    cache.store(cache.key(request), request, HTTPResponse(HTTPStatus.OK, Headers(), iter([b"a", b"b"])))
+
+    assert cache.respond(cache.key(request), request) is None
@@ -0,0 +1,105 @@
+import gzip
+import os
+import zlib
+
+import pytest
+
+from sypy import Compress
+from sypy._compression import Compressor, _negotiate
+from sypy.http import HTTPRequest, HTTPResponse, HTTPStatus, Headers
+
+
+BODY = b"the same few words over and over, " * 100
+
+
+def _request(accept_encoding=None):
+    header = f"Accept-Encoding: {accept_encoding}\r\n" if accept_encoding is not None else ''
+    return HTTPRequest.from_bytes(f"GET /text HTTP/1.1\r\n{header}\r\n".encode())
+
+
+def _response(body=BODY, status=HTTPStatus.OK, **headers):
+    return HTTPResponse(status, Headers({name.replace('_', '-'): value for name, value in headers.items()}), body)
+
+
+@pytest.mark.parametrize('accept_encoding, coding', [
+    ('gzip', 'gzip'),
+    ('deflate', 'deflate'),
+    ('gzip, deflate, br', 'gzip'),
+    ('deflate;q=1, gzip;q=0.5', 'deflate'),
+    ('gzip;q=0, deflate;q=0', None),
+    ('*', 'gzip'),
+    ('br', None),
+    ('', None),
+])
+def test_negotiated(accept_encoding, coding):
+    assert _negotiate(accept_encoding) == coding
+
+
+def test_gzip():
+    response = Compressor(Compress()).apply(_request('gzip'), _response())
+
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.headers['vary'] == 'Accept-Encoding'
+    assert gzip.decompress(response.body) == BODY
+
+
+def test_deflate_is_the_zlib_container():
+    response = Compressor(Compress()).apply(_request('deflate'), _response())
+
+    assert zlib.decompress(response.body) == BODY
+
+
+def test_not_asked_for():
+    response = Compressor(Compress()).apply(_request(), _response())
+
+    assert response.body == BODY
+    assert 'content-encoding' not in response.headers
+    assert response.headers['vary'] == 'Accept-Encoding'
+
+
+@pytest.mark.parametrize('response', [
+    _response(content_type='image/png'),
+    _response(content_encoding='br'),
+    _response(status=HTTPStatus.PartialContent),
+    _response(iter([BODY])),
+])
+def test_left_alone(response):
+    body = response.body
+
+    assert Compressor(Compress()).apply(_request('gzip'), response).body is body
+
+
+@pytest.mark.parametrize('response', [
+    _response(b'short'),
+    _response(content_type='image/png'),
+    _response(iter([BODY])),
+])
+def test_uncompressed_ones_say_what_they_vary_on_too(response):
+    assert Compressor(Compress()).apply(_request('gzip'), response).headers['vary'] == 'Accept-Encoding'
+
+
+def test_svg_is_compressed():
+    assert Compressor(Compress()).apply(_request('gzip'), _response(content_type='image/svg+xml')).headers['content-encoding'] == 'gzip'
+
+
+def test_incompressible_body_goes_out_as_it_is():
+    body = os.urandom(4096)
+
+    assert Compressor(Compress()).apply(_request('gzip'), _response(body)).body == body
+
+
+def test_variants_are_kept_by_etag():
+    compressor = Compressor(Compress(size=1))
+    first = compressor.apply(_request('gzip'), _response(etag='"abc"'))
+
+    assert first.headers['etag'] == 'W/"abc"'
+    assert compressor.apply(_request('gzip'), _response(b"something else entirely " * 100, etag='"abc"')).body == first.body
+
+
+def test_not_modified_says_what_it_varies_on():
+    assert Compressor(Compress()).apply(_request('gzip'), _response(b'', HTTPStatus.NotModified)).headers['vary'] == 'Accept-Encoding'
+
+
+def test_invalid_level():
+    with pytest.raises(ValueError):
+        Compressor(Compress(level=10))
@@ -0,0 +1,92 @@
+import pytest
+
+from sypy._dispatcher import Dispatcher, DispatcherNotFound, DispatcherNotAllowed
+from sypy.http import HTTPMethod, Path
+
+
+def _named(name):
+    def callback() -> str:
+        return name
+
+    return callback
+
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = Dispatcher()
+
+    for method, path, callback in [
+        (HTTPMethod.GET, '/', _named('root')),
+        (HTTPMethod.GET, '/users/me', _named('me')),
+        (HTTPMethod.GET, '/users/{id:int}', lambda id: id),
+        (HTTPMethod.GET, '/users/{name}', lambda name: name),
+        (HTTPMethod.GET, '/users/{id:int}/posts/{slug}', lambda id, slug: slug),
+        (HTTPMethod.GET, '/files/{rest:path}', lambda rest: rest),
+        (HTTPMethod.POST, '/users', _named('new user')),
+        (HTTPMethod.POST, '/users/{name}', lambda name: name),
+        (HTTPMethod.GET, '/files/readme', _named('readme')),
+        (HTTPMethod.PUT, '/files/{rest:path}', lambda rest: rest),
+    ]:
+        dispatcher.register_callback(path, method, callback, raw=True)
+
+    return dispatcher
+
+
+def _route(dispatcher, path, method=HTTPMethod.GET):
+    callback, params = dispatcher.dispatch(Path(path), method)
+    return callback.route, params
+
+
+@pytest.mark.parametrize('path, route, params', [
+    ('/', '/', {}),
+    ('/users/me', '/users/me', {}),
+    ('/users/42', '/users/{id:int}', {'id': 42}),
+    ('/users/bob', '/users/{name}', {'name': 'bob'}),
+    ('/users/7/posts/hello', '/users/{id:int}/posts/{slug}', {'id': 7, 'slug': 'hello'}),
+    ('/files/a/b/c.txt', '/files/{rest:path}', {'rest': 'a/b/c.txt'}),
+    ('/files/', '/files/{rest:path}', {'rest': ''}),
+    ('/users/a%2Fb', '/users/{name}', {'name': 'a/b'}),
+])
+def test_matched(dispatcher, path, route, params):
+    assert _route(dispatcher, path) == (route, params)
+
+
+@pytest.mark.parametrize('path', ['/nowhere', '/users/7/posts', '/users/me/too'])
+def test_not_found(dispatcher, path):
+    with pytest.raises(DispatcherNotFound):
+        _route(dispatcher, path)
+
+
+def test_not_allowed(dispatcher):
+    with pytest.raises(DispatcherNotAllowed):
+        _route(dispatcher, '/users', HTTPMethod.GET)
+    with pytest.raises(DispatcherNotAllowed):
+        _route(dispatcher, '/users/42', HTTPMethod.DELETE)
+    with pytest.raises(DispatcherNotAllowed):
+        _route(dispatcher, '/users/me', HTTPMethod.DELETE)
+    with pytest.raises(DispatcherNotAllowed):
+        _route(dispatcher, '/files/readme', HTTPMethod.POST)
+
+
+@pytest.mark.parametrize('path, method, route, params', [
+    # a static route, or a param route, of the same path that doesn't take the method doesn't shadow one that does
+    ('/users/me', HTTPMethod.POST, '/users/{name}', {'name': 'me'}),
+    ('/users/42', HTTPMethod.POST, '/users/{name}', {'name': '42'}),
+    ('/files/readme', HTTPMethod.PUT, '/files/{rest:path}', {'rest': 'readme'}),
+    ('/files/a/b', HTTPMethod.PUT, '/files/{rest:path}', {'rest': 'a/b'}),
+])
+def test_matched_by_method(dispatcher, path, method, route, params):
+    assert _route(dispatcher, path, method) == (route, params)
+
+
+def test_registering_after_dispatching_recompiles(dispatcher):
+    _route(dispatcher, '/')
+    dispatcher.register_callback('/late', HTTPMethod.GET, _named('late'), raw=True)
+
+    assert _route(dispatcher, '/late') == ('/late', {})
+
+
+@pytest.mark.parametrize('template', ['/{1st}', '/{x:complex}', '/{rest:path}/more'])
+def test_invalid_templates(template):
+    with pytest.raises(ValueError):
+        Dispatcher().register_callback(template, HTTPMethod.GET, lambda rest: rest, raw=True)
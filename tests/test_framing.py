@@ -0,0 +1,158 @@
+import pytest
+
+from sypy import RunConfig
+from sypy._body import BodyStream
+from sypy._handling import negotiate_connection
+from sypy._packet import Packet
+from sypy.http import HTTPRequest, HTTPResponse, HTTPStatus, Headers, InvalidContentLength, HeadTooLarge, ContentTooLarge, MalformedChunk, IncompleteBody
+
+
+def _body(connection, limit=1024):
+    request = HTTPRequest.from_bytes(connection.receive())
+    return BodyStream(request.body, connection if connection.unread != 0 else None, limit)
+
+
+def test_pipelined_requests_are_split(connection):
+    connection, client = connection
+    client.sendall(b"POST /a HTTP/1.1\r\nContent-Length: 3\r\n\r\nabcGET /b HTTP/1.1\r\n\r\n")
+
+    assert connection.receive() == b"POST /a HTTP/1.1\r\nContent-Length: 3\r\n\r\nabc"
+    assert connection.buffered
+    assert connection.next_request() == b"GET /b HTTP/1.1\r\n\r\n"
+    assert connection.next_request() is None
+
+
+def test_body_arriving_late_is_read_off_the_socket(connection):
+    connection, client = connection
+    client.sendall(b"POST / HTTP/1.1\r\nContent-Length: 10\r\n\r\n")
+
+    body = _body(connection)
+    client.sendall(b"0123456789")
+
+    assert body.read() == b"0123456789"
+    assert connection.unread == 0
+
+
+def test_chunked_body(connection):
+    connection, client = connection
+    client.sendall(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+                   b"4;name=value\r\nWiki\r\nA\r\npedia in 1\r\n0\r\nTrailer: x\r\n\r\n"
+                   b"GET /next HTTP/1.1\r\n\r\n")
+
+    assert _body(connection).read() == b"Wikipedia in 1"
+    assert connection.next_request() == b"GET /next HTTP/1.1\r\n\r\n"
+
+
+@pytest.mark.parametrize('size', [b"0x5", b"+5", b"-5", b"5_0", b" 5", b"5 ", b"\t5", b"", b"g", b"1" * 17])
+def test_invalid_chunk_size(connection, size):
+    connection, client = connection
+    client.sendall(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n" + size + b"\r\nhello\r\n0\r\n\r\n")
+
+    with pytest.raises(MalformedChunk):
+        _body(connection).read()
+
+
+def test_whitespace_only_before_an_extension(connection):
+    connection, client = connection
+    client.sendall(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n5 \t;ext\r\nhello\r\n000\r\n\r\n")
+
+    assert _body(connection).read() == b"hello"
+
+
+def test_chunk_without_its_crlf(connection):
+    connection, client = connection
+    client.sendall(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nabcX\r\n0\r\n\r\n")
+
+    with pytest.raises(MalformedChunk):
+        _body(connection).read()
+
+
+def test_chunked_body_over_the_limit(connection):
+    connection, client = connection
+    client.sendall(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n800\r\n")
+
+    with pytest.raises(ContentTooLarge):
+        _body(connection, limit=1024).read()
+
+
+def test_body_cut_short(connection):
+    connection, client = connection
+    client.sendall(b"POST / HTTP/1.1\r\nContent-Length: 10\r\n\r\nabc")
+    body = _body(connection)
+    client.close()
+
+    with pytest.raises(IncompleteBody):
+        body.read()
+
+
+@pytest.mark.parametrize('value', [b"-1", b"ten", b"1_0", b"+5", b"0x5", b"5, 5", b"5\x0b", b""])
+def test_invalid_content_length(connection, value):
+    connection, client = connection
+    client.sendall(b"POST / HTTP/1.1\r\nContent-Length: " + value + b"\r\n\r\n")
+
+    with pytest.raises(InvalidContentLength):
+        connection.receive()
+
+
+def test_conflicting_content_lengths(connection):
+    connection, client = connection
+    client.sendall(b"POST / HTTP/1.1\r\nContent-Length: 5\r\nContent-Length: 50\r\n\r\nhello")
+
+    with pytest.raises(InvalidContentLength):
+        connection.receive()
+
+
+def test_repeated_content_length(connection):
+    connection, client = connection
+    client.sendall(b"POST / HTTP/1.1\r\nContent-Length: 5\r\nContent-Length:\t5 \r\n\r\nhello")
+
+    assert _body(connection).read() == b"hello"
+
+
+def test_head_too_large(connection):
+    connection, client = connection
+    connection.head_limit = 1024
+    client.sendall(b"GET / HTTP/1.1\r\nX: " + b"a" * 2048)
+
+    with pytest.raises(HeadTooLarge):
+        connection.receive()
+
+
+def test_content_length_over_the_limit_before_reading_it(connection):
+    connection, client = connection
+    connection.max_body_size = 1024
+    client.sendall(b"POST / HTTP/1.1\r\nContent-Length: 2048\r\n\r\n")
+
+    with pytest.raises(ContentTooLarge):
+        connection.receive()
+
+
+def _negotiated(connection, raw, run_config=RunConfig(0)):
+    client_end = connection[1]
+    client_end.sendall(raw)
+
+    packet = Packet(connection[0])
+    packet.request_http
+    packet.response_http = HTTPResponse(HTTPStatus.OK, Headers(), b'')
+    negotiate_connection(packet, run_config)
+
+    return packet.response_http.headers['connection']
+
+
+def test_kept_alive_by_default(connection):
+    assert _negotiated(connection, b"GET / HTTP/1.1\r\n\r\n") == 'keep-alive'
+
+
+def test_closed_when_asked(connection):
+    assert _negotiated(connection, b"GET / HTTP/1.1\r\nConnection: Keep-Alive, Close\r\n\r\n") == 'close'
+
+
+def test_closed_after_as_many_requests_as_allowed(connection):
+    run_config = RunConfig(0, keep_alive_requests=2)
+
+    assert _negotiated(connection, b"GET / HTTP/1.1\r\n\r\n", run_config) == 'keep-alive'
+    assert _negotiated(connection, b"GET / HTTP/1.1\r\n\r\n", run_config) == 'close'
+
+
+def test_closed_with_the_body_left_unread(connection):
+    assert _negotiated(connection, b"POST / HTTP/1.1\r\nContent-Length: 100000\r\n\r\n") == 'close'
@@ -0,0 +1,63 @@
+import pytest
+
+from sypy.http import HTTPRequest, HTTPMethod, HTTPException, HTTPStatus, Path, InvalidPath, InvalidMethod, MalformedHead, EmptyPacket
+from sypy.http.path.encoder import encode, decode
+
+
+def test_request_line_headers_and_body():
+    request = HTTPRequest.from_bytes(b"POST /a/b?x=1&y=two HTTP/1.1\r\nHost: here\r\nX_Thing:  spaced  \r\n\r\nbody")
+
+    assert request.method == HTTPMethod.POST
+    assert request.path.parts == ['a', 'b']
+    assert request.query_params == {'x': '1', 'y': 'two'}
+    assert request.headers == {'host': 'here', 'x-thing': 'spaced'}
+    assert bytes(request.body) == b"body"
+
+
+def test_head_cut_short_keeps_the_whole_lines():
+    request = HTTPRequest.from_bytes(b"GET / HTTP/1.1\r\nHost: here\r\nX-Cut")
+
+    assert request.headers == {'host': 'here'}
+
+
+@pytest.mark.parametrize('raw, error', [
+    (b"", EmptyPacket),
+    (b"GET\r\n\r\n", MalformedHead),
+    (b"GET / HTTP/1.1\r\nno colon\r\n\r\n", MalformedHead),
+    (b"FETCH / HTTP/1.1\r\n\r\n", InvalidMethod),
+    (b"GET /a b HTTP/1.1\r\n\r\n", HTTPException),
+    (b"GET /<script> HTTP/1.1\r\n\r\n", InvalidPath),
+    (b"GET /caf\xe9 HTTP/1.1\r\n\r\n", InvalidPath),
+])
+def test_rejected(raw, error):
+    with pytest.raises(error):
+        HTTPRequest.from_bytes(raw)
+
+
+def test_only_http_1_1():
+    with pytest.raises(HTTPException) as caught:
+        HTTPRequest.from_bytes(b"GET / HTTP/1.0\r\n\r\n")
+
+    assert caught.value.status_code == HTTPStatus.HTTPVersionNotSupported
+
+
+def test_escapes_are_decoded_per_segment():
+    # an escaped '/' is part of its segment, not a separator
+    assert Path('/a%2Fb/caf%C3%A9/%20').parts == ['a/b', 'café', ' ']
+
+
+def test_broken_escapes_are_kept():
+    assert decode('100%') == '100%'
+    assert decode('%zz%4') == '%zz%4'
+    assert decode('%41%62') == 'Ab'
+
+
+def test_query_params_are_decoded():
+    request = HTTPRequest.from_bytes(b"GET /?na%20me=caf%C3%A9&flag&&empty= HTTP/1.1\r\n\r\n")
+
+    assert request.query_params == {'na me': 'café', 'flag': '', 'empty': ''}
+
+
+def test_encode_round_trips():
+    for s in ('plain', 'with space', 'café/ünïcode', '%'):
+        assert decode(encode(s)) == s
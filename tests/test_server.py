@@ -0,0 +1,164 @@
+import socket
+import threading
+import time
+from typing import Annotated, Iterator
+
+import pytest
+
+from sypy import Server, RunConfig, Engine, Scheduling
+from sypy.parameters import Body
+
+from .conftest import TIMEOUT, free_port, exchange, read_responses
+
+
+@pytest.fixture
+def app():
+    server = Server()
+
+    @server.get('/hello/{name}')
+    def hello(name: str) -> str:
+        return f"hello {name}"
+
+    @server.post('/echo')
+    def echo(body: Annotated[bytes, Body]) -> bytes:
+        return body
+
+    @server.get('/slow')
+    def slow(ms: int = 300) -> str:
+        time.sleep(ms / 1000)
+        return "done"
+
+    @server.get('/numbers')
+    def numbers(up_to: int = 3) -> Iterator[str]:
+        for n in range(up_to):
+            yield f"{n}\n"
+
+    return server
+
+
+def test_answers(serve, app):
+    response = exchange(serve(app), b"GET /hello/you HTTP/1.1\r\nHost: x\r\n\r\n")
+
+    assert response.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert b"Connection: keep-alive\r\n" in response
+    assert response.endswith(b"\r\n\r\nhello you")
+
+
+def test_round_robin_unless_asked_otherwise():
+    assert RunConfig(8000).scheduling == Scheduling.RoundRobin
+
+
+@pytest.mark.parametrize('scheduling', list(Scheduling))
+def test_every_scheduling_answers(serve, app, scheduling):
+    response = exchange(serve(app, scheduling=scheduling), b"GET /hello/you HTTP/1.1\r\nHost: x\r\n\r\n" * 4, responses=4)
+
+    assert response.count(b"HTTP/1.1 200 OK\r\n") == 4
+
+
+def test_connection_is_kept_alive(serve, app):
+    address = serve(app)
+
+    with socket.create_connection(address, timeout=TIMEOUT) as s:
+        for name in ('a', 'b', 'c'):
+            s.sendall(f"GET /hello/{name} HTTP/1.1\r\n\r\n".encode())
+            assert read_responses(s, 1).endswith(f"hello {name}".encode())
+
+
+def test_closed_after_keep_alive_requests(serve, app):
+    address = serve(app, keep_alive_requests=2)
+
+    with socket.create_connection(address, timeout=TIMEOUT) as s:
+        s.sendall(b"GET /hello/a HTTP/1.1\r\n\r\n" * 2)
+        responses = read_responses(s, 2)
+
+        assert responses.count(b"Connection: keep-alive") == 1
+        assert responses.count(b"Connection: close") == 1
+        assert s.recv(1) == b''
+
+
+def test_pipelined_responses_come_back_in_order(serve, app):
+    # the slow one first, the quick ones behind it are worked on at once but wait for it to be written
+    raw = b"GET /slow HTTP/1.1\r\n\r\n" + b"".join(f"GET /hello/{i} HTTP/1.1\r\n\r\n".encode() for i in range(5))
+    responses = exchange(serve(app), raw, 6)
+
+    bodies = [response.rpartition(b"\r\n\r\n")[2] for response in responses.split(b"HTTP/1.1 ")[1:]]
+    assert bodies == [b"done"] + [f"hello {i}".encode() for i in range(5)]
+
+
+def test_post_body(serve, app):
+    response = exchange(serve(app), b"POST /echo HTTP/1.1\r\nContent-Length: 5\r\n\r\nhello")
+
+    assert response.endswith(b"\r\n\r\nhello")
+
+
+def test_chunked_post_body(serve, app):
+    response = exchange(serve(app), b"POST /echo HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n2\r\nhe\r\n3\r\nllo\r\n0\r\n\r\n")
+
+    assert response.endswith(b"\r\n\r\nhello")
+
+
+def test_body_too_large(serve, app):
+    response = exchange(serve(app, max_body_size=16), b"POST /echo HTTP/1.1\r\nContent-Length: 17\r\n\r\n" + b"x" * 17)
+
+    assert response.startswith(b"HTTP/1.1 413 ")
+    assert b"Connection: close\r\n" in response
+
+
+@pytest.mark.parametrize('raw, status', [
+    (b"GET /nowhere HTTP/1.1\r\n\r\n", b"404"),
+    (b"DELETE /hello/you HTTP/1.1\r\n\r\n", b"405"),
+    (b"GET /hello/<you> HTTP/1.1\r\n\r\n", b"400"),
+    (b"POST /echo HTTP/1.1\r\nContent-Length: x\r\n\r\n", b"400"),
+])
+def test_errors(serve, app, raw, status):
+    assert exchange(serve(app), raw).startswith(b"HTTP/1.1 " + status + b" ")
+
+
+def test_streamed_response(serve, app):
+    response = exchange(serve(app), b"GET /numbers?up_to=3 HTTP/1.1\r\n\r\n")
+
+    assert b"Transfer-Encoding: chunked\r\n" in response
+    assert response.endswith(b"\r\n\r\n2\r\n0\n\r\n2\r\n1\n\r\n2\r\n2\n\r\n0\r\n\r\n")
+
+
+def test_stop_waits_for_requests_in_flight(serve, app):
+    address = serve(app)
+    responses = []
+
+    def slow():
+        responses.append(exchange(address, b"GET /slow?ms=500 HTTP/1.1\r\n\r\n"))
+
+    (client := threading.Thread(target=slow)).start()
+    time.sleep(0.2)
+
+    app.stop(TIMEOUT)
+    client.join(TIMEOUT)
+
+    assert responses and responses[0].endswith(b"done")
+    assert not app.is_working
+
+    with pytest.raises(ConnectionRefusedError):
+        socket.create_connection(address, timeout=TIMEOUT)
+
+
+@pytest.mark.parametrize('engine, offloads', [(Engine.Threaded, False), (Engine.EventLoop, True)])
+def test_offload_threads_only_for_the_event_loop(app, engine, offloads):
+    before = threading.active_count()
+    app.start(RunConfig(free_port(), engine=engine, workers=2, offload_workers=50, access_log=None))
+
+    try:
+        assert (threading.active_count() - before >= 50) == offloads
+    finally:
+        app.stop(TIMEOUT)
+
+
+def test_profiles_are_written_out(serve, app, tmp_path):
+    address = serve(app, profile=str(tmp_path), profile_sample=1.0, profile_routes=('/hello/{name}',))
+    exchange(address, b"GET /hello/you HTTP/1.1\r\nHost: x\r\n\r\n" * 3 + b"GET /numbers HTTP/1.1\r\nHost: x\r\n\r\n", responses=4)
+
+    until = time.monotonic() + TIMEOUT
+    while not list(tmp_path.glob('hello_name-*.pstats')) and time.monotonic() < until:
+        time.sleep(0.01)
+
+    assert list(tmp_path.glob('hello_name-*.pstats'))
+    assert not list(tmp_path.glob('numbers-*'))
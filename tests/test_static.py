@@ -0,0 +1,169 @@
+import email.utils
+
+import pytest
+
+from sypy import Server, StaticFiles
+from sypy._static import SMALL_FILE
+from sypy.http import HTTPException, HTTPStatus, FileBody
+
+from .conftest import exchange
+
+
+CONTENTS = b"0123456789" * 10
+
+
+@pytest.fixture
+def files(tmp_path):
+    tmp_path /= 'root'
+    tmp_path.mkdir()
+
+    (tmp_path / 'index.html').write_bytes(b"<h1>root</h1>")
+    (tmp_path / 'data.txt').write_bytes(CONTENTS)
+    (tmp_path / 'big.bin').write_bytes(b"x" * (SMALL_FILE + 1))
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'sub' / 'index.html').write_bytes(b"<h1>sub</h1>")
+
+    return StaticFiles(tmp_path)
+
+
+def _serve(files, path, head=False, range_=None, if_none_match=None, if_modified_since=None, if_range=None):
+    return files.serve(path, head, range_, if_none_match, if_modified_since, if_range)
+
+
+def _body(response):
+    return response.body.read() if isinstance(response.body, FileBody) else bytes(response.body)
+
+
+def test_whole_file(files):
+    response = _serve(files, 'data.txt')
+
+    assert response.status == HTTPStatus.OK
+    assert _body(response) == CONTENTS
+    assert response.headers['content-type'] == 'text/plain'
+    assert response.headers['accept-ranges'] == 'bytes'
+
+
+def test_big_file_is_sent_off_the_disk(files):
+    response = _serve(files, 'big.bin')
+
+    assert isinstance(response.body, FileBody)
+    assert len(response.body) == SMALL_FILE + 1
+    response.body.close()
+
+
+def test_head_has_the_length_but_no_file(files):
+    response = _serve(files, 'data.txt', head=True)
+
+    assert len(response.body) == len(CONTENTS)
+    assert response.body.file is None
+
+
+def test_directory_index(files):
+    assert _body(_serve(files, 'sub')) == b"<h1>sub</h1>"
+
+
+def test_root_index(files):
+    assert _body(_serve(files, '')) == b"<h1>root</h1>"
+
+
+def test_symlinks_inside_are_followed(files, tmp_path):
+    (tmp_path / 'root' / 'alias.txt').symlink_to(tmp_path / 'root' / 'data.txt')
+
+    assert _body(_serve(files, 'alias.txt')) == CONTENTS
+
+
+@pytest.mark.parametrize('name', ['secret.txt', 'elsewhere'])
+def test_symlinks_out_are_not(files, tmp_path, name):
+    (tmp_path / 'secret.txt').write_bytes(b"secret")
+    (tmp_path / 'elsewhere').mkdir()
+    (tmp_path / 'elsewhere' / 'index.html').write_bytes(b"secret")
+    (tmp_path / 'root' / 'escape').symlink_to(tmp_path / name)
+
+    with pytest.raises(HTTPException) as caught:
+        _serve(files, 'escape')
+
+    assert caught.value.status_code == HTTPStatus.NotFound
+
+
+def test_mounted_root(files, serve):
+    server = Server()
+    server.static('/s', files._root)
+    address = serve(server)
+
+    for target in ('/s', '/s/'):
+        assert exchange(address, f"GET {target} HTTP/1.1\r\n\r\n".encode()).endswith(b"\r\n\r\n<h1>root</h1>")
+
+
+@pytest.mark.parametrize('path', ['missing.txt', '../etc/passwd', 'sub/../data.txt', 'a//b', 'sub/./index.html', 'nul\0byte'])
+def test_not_found(files, path):
+    with pytest.raises(HTTPException) as caught:
+        _serve(files, path)
+
+    assert caught.value.status_code == HTTPStatus.NotFound
+
+
+@pytest.mark.parametrize('range_, first, last', [
+    ('bytes=0-9', 0, 9),
+    ('bytes=90-', 90, 99),
+    ('bytes=-5', 95, 99),
+    ('bytes=95-1000', 95, 99),
+])
+def test_range(files, range_, first, last):
+    response = _serve(files, 'data.txt', range_=range_)
+
+    assert response.status == HTTPStatus.PartialContent
+    assert response.headers['content-range'] == f"bytes {first}-{last}/{len(CONTENTS)}"
+    assert _body(response) == CONTENTS[first:last + 1]
+
+
+@pytest.mark.parametrize('range_', ['bytes=0-1,5-6', 'lines=1-2', 'bytes=a-b', 'bytes=5-3', 'bytes=+1-2', 'bytes=1-+2', 'bytes=-', 'bytes=1', 'bytes=--5', 'bytes=1 -2'])
+def test_unsupported_range_gets_the_whole_file(files, range_):
+    response = _serve(files, 'data.txt', range_=range_)
+
+    assert response.status == HTTPStatus.OK
+    assert _body(response) == CONTENTS
+
+
+@pytest.mark.parametrize('range_', ['bytes=100-', 'bytes=100-200', 'bytes=-0'])
+def test_range_past_the_end(files, range_):
+    response = _serve(files, 'data.txt', range_=range_)
+
+    assert response.status == HTTPStatus.RangeNotSatisfiable
+    assert response.headers['content-range'] == f"bytes */{len(CONTENTS)}"
+
+
+def test_stale_if_range_gets_the_whole_file(files):
+    assert _serve(files, 'data.txt', range_='bytes=0-9', if_range='"stale"').status == HTTPStatus.OK
+
+
+def test_current_if_range_gets_the_range(files):
+    etag = _serve(files, 'data.txt').headers['etag']
+
+    assert _serve(files, 'data.txt', range_='bytes=0-9', if_range=etag).status == HTTPStatus.PartialContent
+
+
+def test_if_none_match(files):
+    etag = _serve(files, 'data.txt').headers['etag']
+
+    assert _serve(files, 'data.txt', if_none_match=etag).status == HTTPStatus.NotModified
+    assert _serve(files, 'data.txt', if_none_match='"other"').status == HTTPStatus.OK
+
+
+def test_if_modified_since(files):
+    last_modified = _serve(files, 'data.txt').headers['last-modified']
+    earlier = email.utils.formatdate(email.utils.parsedate_to_datetime(last_modified).timestamp() - 60, usegmt=True)
+
+    assert _serve(files, 'data.txt', if_modified_since=last_modified).status == HTTPStatus.NotModified
+    assert _serve(files, 'data.txt', if_modified_since=earlier).status == HTTPStatus.OK
+    assert _serve(files, 'data.txt', if_modified_since='not a date').status == HTTPStatus.OK
+
+
+def test_if_none_match_wins_over_if_modified_since(files):
+    last_modified = _serve(files, 'data.txt').headers['last-modified']
+
+    assert _serve(files, 'data.txt', if_none_match='"other"', if_modified_since=last_modified).status == HTTPStatus.OK
+
+
+def test_not_a_directory(tmp_path):
+    with pytest.raises(ValueError):
+        StaticFiles(tmp_path / 'missing')
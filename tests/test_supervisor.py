@@ -0,0 +1,134 @@
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from .conftest import TIMEOUT, free_port, exchange, read_responses
+
+
+pytestmark = pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason="worker processes need fork")
+
+APP = """
+import os, sys, time
+from sypy import Server, RunConfig
+
+server = Server()
+
+@server.get('/pid')
+def pid() -> str:
+    return str(os.getpid())
+
+@server.get('/slow')
+def slow() -> str:
+    time.sleep(1.5)
+    return str(os.getpid())
+
+server.start(RunConfig(int(sys.argv[1]), processes=2, workers=4, access_log=None, stop_timeout=2.0))
+"""
+
+
+@pytest.fixture
+def supervised():
+    port = free_port()
+    supervisor = subprocess.Popen([sys.executable, '-c', APP, str(port)], cwd=os.path.dirname(os.path.dirname(__file__)))
+
+    yield supervisor, ('127.0.0.1', port)
+
+    if supervisor.poll() is None:
+        supervisor.kill()
+        supervisor.wait()
+
+
+def _pids(address, wanted=2, until=TIMEOUT):
+    """the workers answering, asked over new connections until that many of them did or the time is up"""
+
+    pids, deadline = set(), time.monotonic() + until
+
+    while len(pids) < wanted and time.monotonic() < deadline:
+        try:
+            pids.add(int(exchange(address, b"GET /pid HTTP/1.1\r\n\r\n").rpartition(b"\r\n\r\n")[2]))
+        except (OSError, ValueError):
+            time.sleep(0.05)  # not listening yet, or in between workers
+
+    return pids
+
+
+def test_workers_share_the_port(supervised):
+    supervisor, address = supervised
+    pids = _pids(address)
+
+    assert len(pids) == 2
+    assert supervisor.pid not in pids
+
+
+def test_dead_worker_is_respawned(supervised):
+    supervisor, address = supervised
+    pids = _pids(address)
+
+    os.kill(killed := next(iter(pids)), signal.SIGKILL)
+
+    # the one left keeps answering, and the new one does too once it is up
+    respawned, deadline = set(), time.monotonic() + TIMEOUT * 2
+    while not respawned - pids and time.monotonic() < deadline:
+        respawned |= _pids(address, until=0.5)
+
+    assert respawned - pids
+    assert killed not in respawned
+    assert supervisor.poll() is None
+
+
+def test_reload_replaces_the_workers(supervised):
+    supervisor, address = supervised
+    old = _pids(address)
+
+    supervisor.send_signal(signal.SIGHUP)
+    time.sleep(0.5)
+
+    assert _pids(address).isdisjoint(old)
+
+
+def _cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as stat:
+        fields = stat.read().rpartition(')')[2].split()
+
+    # utime and stime, in clock ticks
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/stat'), reason="reads the supervisor's cpu time off /proc")
+def test_reload_drains_without_spinning(supervised):
+    supervisor, address = supervised
+    _pids(address)
+
+    # enough of them that both workers are very likely busy, and both have to drain
+    connections = [socket.create_connection(address, timeout=TIMEOUT) for _ in range(8)]
+    for connection in connections:
+        connection.sendall(b"GET /slow HTTP/1.1\r\n\r\n")
+    time.sleep(0.2)
+
+    before = _cpu_seconds(supervisor.pid)
+    supervisor.send_signal(signal.SIGHUP)
+    time.sleep(1.0)
+    spent = _cpu_seconds(supervisor.pid) - before
+
+    for connection in connections:
+        with connection:
+            print(read_responses(connection, 1)[:40])
+
+    assert spent < 0.5
+
+
+def test_stopped_with_sigterm(supervised):
+    supervisor, address = supervised
+    _pids(address)
+
+    supervisor.send_signal(signal.SIGTERM)
+
+    assert supervisor.wait(TIMEOUT) == 0
+    with pytest.raises(ConnectionRefusedError):
+        exchange(address, b"GET /pid HTTP/1.1\r\n\r\n")